@@ -14,8 +14,14 @@
 #  limitations under the License.
 #
 import logging
+import os
 import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from functools import partial
+
+import xxhash
+
 from agentic_reasoning.prompts import BEGIN_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT, MAX_SEARCH_LIMIT, \
     END_SEARCH_QUERY, REASON_PROMPT, RELEVANT_EXTRACTION_PROMPT
 from api.db.services.llm_service import LLMBundle
@@ -23,18 +29,44 @@ from rag.nlp import extract_between
 from rag.prompts import kb_prompt
 from rag.utils.tavily_conn import Tavily
 
+# Seconds a retrieval source is waited for, per search query. A source timing out contributes no chunks.
+DEEP_RESEARCH_SOURCE_TIMEOUTS = {
+    "kb": float(os.environ.get("DEEP_RESEARCH_KB_TIMEOUT", "30")),
+    "web": float(os.environ.get("DEEP_RESEARCH_WEB_TIMEOUT", "15")),
+    "kg": float(os.environ.get("DEEP_RESEARCH_KG_TIMEOUT", "30")),
+}
+DEEP_RESEARCH_RETRIEVAL_WORKERS = int(os.environ.get("DEEP_RESEARCH_RETRIEVAL_WORKERS", "8"))
+# Seconds between two looks at the retrievals still queued for a worker
+DEEP_RESEARCH_QUEUED_POLL = 0.2
+
+
+def _chunk_keys(ck):
+    """
+    A chunk is retrieved before when its content is, whatever the source. Knowledge base chunks are also
+    told apart by id, web and knowledge graph chunks get a fresh id per retrieval.
+    """
+    keys = ["content:" + xxhash.xxh64_hexdigest(ck["content_with_weight"].encode("utf-8", "surrogatepass"))]
+    if ck.get("kb_id") and ck.get("doc_id"):
+        keys.append("id:" + ck["chunk_id"])
+    return keys
+
 
 class DeepResearcher:
     def __init__(self,
                  chat_mdl: LLMBundle,
                  prompt_config: dict,
                  kb_retrieve: partial = None,
-                 kg_retrieve: partial = None
+                 kg_retrieve: partial = None,
+                 web_retrieve: partial = None,
+                 source_timeouts: dict = None
                  ):
         self.chat_mdl = chat_mdl
         self.prompt_config = prompt_config
         self._kb_retrieve = kb_retrieve
         self._kg_retrieve = kg_retrieve
+        # Tavily, when its API key is configured, unless another web search is given
+        self._web_retrieve = web_retrieve
+        self._source_timeouts = {**DEEP_RESEARCH_SOURCE_TIMEOUTS, **(source_timeouts or {})}
 
     @staticmethod
     def _remove_query_tags(text):
@@ -92,26 +124,107 @@ class DeepResearcher:
         
         return truncated_prev_reasoning.strip('\n')
 
-    def _retrieve_information(self, search_query):
-        """Retrieve information from different sources"""
-        # 1. Knowledge base retrieval
-        kbinfos = self._kb_retrieve(question=search_query) if self._kb_retrieve else {"chunks": [], "doc_aggs": []}
-        
-        # 2. Web retrieval (if Tavily API is configured)
-        if self.prompt_config.get("tavily_api_key"):
-            tav = Tavily(self.prompt_config["tavily_api_key"])
-            tav_res = tav.retrieve_chunks(search_query)
-            kbinfos["chunks"].extend(tav_res["chunks"])
-            kbinfos["doc_aggs"].extend(tav_res["doc_aggs"])
-        
-        # 3. Knowledge graph retrieval (if configured)
+    def _sources(self):
+        """{name: retrieve(question=...)} of the configured retrieval sources."""
+        sources = {}
+        if self._kb_retrieve:
+            sources["kb"] = self._kb_retrieve
+        if self._web_retrieve:
+            sources["web"] = self._web_retrieve
+        elif self.prompt_config.get("tavily_api_key"):
+            sources["web"] = Tavily(self.prompt_config["tavily_api_key"]).retrieve_chunks
         if self.prompt_config.get("use_kg") and self._kg_retrieve:
-            ck = self._kg_retrieve(question=search_query)
-            if ck["content_with_weight"]:
-                kbinfos["chunks"].insert(0, ck)
-                
+            sources["kg"] = self._kg_retrieve
+        return sources
+
+    @staticmethod
+    def _merge_results(results):
+        """
+        Merge the results of the sources for one query: the knowledge graph chunk first, then the
+        knowledge base chunks, then the web ones, each chunk once.
+        """
+        kbinfos = dict(results.get("kb") or {"chunks": [], "doc_aggs": []})
+        chunks = []
+        if results.get("kg") and results["kg"]["content_with_weight"]:
+            chunks.append(results["kg"])
+        chunks.extend((results.get("kb") or {}).get("chunks", []))
+        chunks.extend((results.get("web") or {}).get("chunks", []))
+
+        kbinfos["chunks"], seen = [], set()
+        for ck in chunks:
+            keys = _chunk_keys(ck)
+            if seen.isdisjoint(keys):
+                seen.update(keys)
+                kbinfos["chunks"].append(ck)
+        kept_doc_ids = {ck["doc_id"] for ck in kbinfos["chunks"]}
+        kbinfos["doc_aggs"] = list(kbinfos.get("doc_aggs", [])) + \
+            [d for d in (results.get("web") or {}).get("doc_aggs", []) if d["doc_id"] in kept_doc_ids]
         return kbinfos
 
+    def _retrieve_concurrently(self, search_queries):
+        """
+        Query every source for every search query at once, and yield (search_query, kbinfos) as soon as all
+        the sources of a query answered or timed out, so that the reasoning goes on with the first results
+        while the others are still being retrieved.
+        """
+        sources = self._sources()
+        if not sources:
+            for search_query in search_queries:
+                yield search_query, {"chunks": [], "doc_aggs": []}
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(len(search_queries) * len(sources), DEEP_RESEARCH_RETRIEVAL_WORKERS),
+                                      thread_name_prefix="deep_research")
+        # the timeout of a source runs from the moment a worker starts it, not while it is queued
+        started = {}
+
+        def run(i, retrieve, search_query):
+            started[i] = time.monotonic()
+            return retrieve(question=search_query)
+
+        def deadline(future):
+            i, _, name = futures[future]
+            return started[i] + self._source_timeouts.get(name, 30) if i in started else None
+
+        try:
+            futures = {}
+            for search_query in search_queries:
+                for name, retrieve in sources.items():
+                    i = len(futures)
+                    futures[executor.submit(run, i, retrieve, search_query)] = (i, search_query, name)
+            results = {search_query: {} for search_query in search_queries}
+            pending = set(futures)
+            while pending:
+                deadlines = [d for d in map(deadline, pending) if d is not None]
+                timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                if len(deadlines) < len(pending):
+                    # a queued retrieval may start at any time, look again at its deadline shortly
+                    timeout = min(timeout, DEEP_RESEARCH_QUEUED_POLL) if timeout is not None else DEEP_RESEARCH_QUEUED_POLL
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                expired = {f for f in pending if deadline(f) is not None and deadline(f) <= now}
+                pending -= expired
+                for future in done | expired:
+                    _, search_query, name = futures[future]
+                    if future in expired:
+                        logging.warning(f"[THINK]Retrieval from {name} timed out for: {search_query}")
+                        future.cancel()
+                        results[search_query][name] = None
+                    elif future.exception():
+                        logging.error(f"[THINK]Retrieval from {name} failed for: {search_query}", exc_info=future.exception())
+                        results[search_query][name] = None
+                    else:
+                        results[search_query][name] = future.result()
+                    if len(results[search_query]) == len(sources):
+                        yield search_query, self._merge_results(results.pop(search_query))
+        finally:
+            # sources still running are not waited for
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retrieve_information(self, search_query):
+        """Retrieve information from different sources"""
+        return next(self._retrieve_concurrently([search_query]))[1]
+
     def _update_chunk_info(self, chunk_info, kbinfos):
         """Update chunk information for citations"""
         if not chunk_info["chunks"]:
@@ -120,14 +233,17 @@ class DeepResearcher:
                 chunk_info[k] = kbinfos[k]
         else:
             # Merge newly retrieved information, avoiding duplicates
-            cids = [c["chunk_id"] for c in chunk_info["chunks"]]
+            cids = {key for c in chunk_info["chunks"] for key in _chunk_keys(c)}
             for c in kbinfos["chunks"]:
-                if c["chunk_id"] not in cids:
+                keys = _chunk_keys(c)
+                if cids.isdisjoint(keys):
+                    cids.update(keys)
                     chunk_info["chunks"].append(c)
                     
-            dids = [d["doc_id"] for d in chunk_info["doc_aggs"]]
+            dids = {d["doc_id"] for d in chunk_info["doc_aggs"]}
             for d in kbinfos["doc_aggs"]:
                 if d["doc_id"] not in dids:
+                    dids.add(d["doc_id"])
                     chunk_info["doc_aggs"].append(d)
 
     def _extract_relevant_info(self, truncated_prev_reasoning, search_query, kbinfos):
@@ -180,30 +296,32 @@ class DeepResearcher:
                 # If not the first step and no queries, end the search process
                 break
 
-            # Process each search query
+            # Queries searched before are answered right away, the others are retrieved all at once
+            new_queries = []
             for search_query in queries:
+                if search_query not in executed_search_queries and search_query not in new_queries:
+                    new_queries.append(search_query)
+                    continue
+                logging.info(f"[THINK]Query: {step_index}. {search_query}")
+                msg_history.append({"role": "assistant", "content": search_query})
+                think += f"\n\n> {step_index + 1}. {search_query}\n\n"
+                summary_think = f"\n{BEGIN_SEARCH_RESULT}\nYou have searched this query. Please refer to previous results.\n{END_SEARCH_RESULT}\n"
+                yield {"answer": think + summary_think + "</think>", "reference": {}, "audio_binary": None}
+                all_reasoning_steps.append(summary_think)
+                msg_history.append({"role": "user", "content": summary_think})
+                think += summary_think
+            executed_search_queries.extend(new_queries)
+
+            # Step 3: Retrieve information, the queries being handled in the order their results arrive
+            for search_query, kbinfos in self._retrieve_concurrently(new_queries):
                 logging.info(f"[THINK]Query: {step_index}. {search_query}")
                 msg_history.append({"role": "assistant", "content": search_query})
                 think += f"\n\n> {step_index + 1}. {search_query}\n\n"
                 yield {"answer": think + "</think>", "reference": {}, "audio_binary": None}
 
-                # Check if the query has already been executed
-                if search_query in executed_search_queries:
-                    summary_think = f"\n{BEGIN_SEARCH_RESULT}\nYou have searched this query. Please refer to previous results.\n{END_SEARCH_RESULT}\n"
-                    yield {"answer": think + summary_think + "</think>", "reference": {}, "audio_binary": None}
-                    all_reasoning_steps.append(summary_think)
-                    msg_history.append({"role": "user", "content": summary_think})
-                    think += summary_think
-                    continue
-                
-                executed_search_queries.append(search_query)
-                
-                # Step 3: Truncate previous reasoning steps
+                # Step 4: Truncate previous reasoning steps
                 truncated_prev_reasoning = self._truncate_previous_reasoning(all_reasoning_steps)
                 
-                # Step 4: Retrieve information
-                kbinfos = self._retrieve_information(search_query)
-                
                 # Step 5: Update chunk information
                 self._update_chunk_info(chunk_info, kbinfos)
                 
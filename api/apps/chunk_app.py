@@ -20,14 +20,15 @@ from flask import request
 from flask_login import login_required, current_user
 from rag.app.qa import rmPrefix, beAdoc
 from rag.nlp import search, rag_tokenizer
-from rag.settings import PAGERANK_FLD
-from rag.utils import rmSpace
+from rag.settings import PAGERANK_FLD, TOKEN_NUM_FLD
+from rag.utils import num_tokens_from_string, rmSpace
 from api.db import LLMType, ParserType
 from api.db.services.knowledgebase_service import KnowledgebaseService
 from api.db.services.llm_service import LLMBundle
 from api.db.services.user_service import UserTenantService
 from api.utils.api_utils import server_error_response, get_data_error_result, validate_request
 from api.db.services.document_service import DocumentService
+from api.db.services.task_service import TaskService
 from api import settings
 from api.utils.api_utils import get_json_result
 
@@ -152,6 +153,7 @@ def set():
             print(f"[DEBUG] Updating only img_id: {req['img_id']} for chunk: {req['chunk_id']}")
             update_data = {"id": req["chunk_id"], "img_id": req["img_id"]}
             settings.docStoreConn.update({"id": req["chunk_id"]}, update_data, search.index_name(tenant_id), doc.kb_id)
+            TaskService.release_chunk_store(doc_id=doc.id)
             return get_json_result(data=True)
 
         # 正常的更新流程，需要重新计算嵌入
@@ -163,10 +165,12 @@ def set():
             q, a = rmPrefix(arr[0]), rmPrefix("\n".join(arr[1:]))
             d = beAdoc(d, q, a, not any([rag_tokenizer.is_chinese(t) for t in q + a]))
 
+        d[TOKEN_NUM_FLD] = num_tokens_from_string(d["content_with_weight"])
         v, c = embd_mdl.encode([doc.name, req["content_with_weight"] if not d.get("question_kwd") else "\n".join(d["question_kwd"])])
         v = 0.1 * v[0] + 0.9 * v[1] if doc.parser_id != ParserType.QA else v[1]
         d["q_%d_vec" % len(v)] = v.tolist()
         settings.docStoreConn.update({"id": req["chunk_id"]}, d, search.index_name(tenant_id), doc.kb_id)
+        TaskService.release_chunk_store(doc_id=doc.id)
         return get_json_result(data=True)
     except Exception as e:
         return server_error_response(e)
@@ -205,6 +209,7 @@ def rm():
         deleted_chunk_ids = req["chunk_ids"]
         chunk_number = len(deleted_chunk_ids)
         DocumentService.decrement_chunk_num(doc.id, doc.kb_id, 1, chunk_number, 0)
+        TaskService.release_chunk_store(doc_id=doc.id)
         for cid in deleted_chunk_ids:
             if STORAGE_IMPL.obj_exist(doc.kb_id, cid):
                 STORAGE_IMPL.rm(doc.kb_id, cid)
@@ -227,6 +232,7 @@ def create():
     d["question_tks"] = rag_tokenizer.tokenize("\n".join(req.get("question_kwd", [])))
     d["create_time"] = str(datetime.datetime.now()).replace("T", " ")[:19]
     d["create_timestamp_flt"] = datetime.datetime.now().timestamp()
+    d[TOKEN_NUM_FLD] = num_tokens_from_string(d["content_with_weight"])
 
     try:
         e, doc = DocumentService.get_by_id(req["doc_id"])
@@ -256,6 +262,7 @@ def create():
         settings.docStoreConn.insert([d], search.index_name(tenant_id), doc.kb_id)
 
         DocumentService.increment_chunk_num(doc.id, doc.kb_id, c, 1, 0)
+        TaskService.release_chunk_store(doc_id=doc.id)
         return get_json_result(data={"chunk_id": chunck_id})
     except Exception as e:
         return server_error_response(e)
@@ -43,6 +43,7 @@ from api.utils import get_uuid
 from api import settings
 from api.utils.api_utils import get_json_result
 from rag.utils.storage_factory import STORAGE_IMPL
+from rag.utils.task_queue import BULK, INTERACTIVE
 from api.utils.file_utils import filename_type, thumbnail, get_project_base_directory
 from api.utils.web_utils import html2pdf, is_valid_url
 from api.constants import IMG_BASE64_PREFIX
@@ -331,6 +332,9 @@ def run():
 
             # 更新文档状态
             DocumentService.update_by_id(id, info)
+            # 取消解析时通知正在执行的任务停止
+            if str(req["run"]) == TaskStatus.CANCEL.value:
+                DocumentService.set_canceled(id)
             # 获取租户ID
             tenant_id = DocumentService.get_tenant_id(id)
             if not tenant_id:
@@ -354,8 +358,8 @@ def run():
                 doc["tenant_id"] = tenant_id
                 # 获取文档存储位置
                 bucket, name = File2DocumentService.get_storage_address(doc_id=doc["id"])
-                # 将任务加入队列
-                queue_tasks(doc, bucket, name)
+                # 将任务加入队列，单个文档的解析优先于批量解析
+                queue_tasks(doc, bucket, name, INTERACTIVE if len(req["doc_ids"]) == 1 else BULK)
 
         return get_json_result(data=True)
     except Exception as e:
@@ -559,7 +563,7 @@ def set_meta():
         if not e:
             return get_data_error_result(message="Document not found!")
 
-        if not DocumentService.update_by_id(req["doc_id"], {"meta_fields": meta}):
+        if not DocumentService.update_meta_fields(req["doc_id"], meta):
             return get_data_error_result(message="Database error (meta updates)!")
 
         return get_json_result(data=True)
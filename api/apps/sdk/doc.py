@@ -15,6 +15,7 @@
 #
 import pathlib
 import datetime
+from urllib.parse import unquote
 
 from rag.app.qa import rmPrefix, beAdoc
 from rag.nlp import rag_tokenizer
@@ -40,8 +41,10 @@ from api.utils.api_utils import construct_json_result, get_parser_config
 from rag.nlp import search
 from rag.prompts import keyword_extraction
 from rag.app.tag import label_question
-from rag.utils import rmSpace
+from rag.settings import TOKEN_NUM_FLD
+from rag.utils import num_tokens_from_string, rmSpace
 from rag.utils.storage_factory import STORAGE_IMPL
+from rag.utils.task_queue import BULK, INTERACTIVE
 
 from pydantic import BaseModel, Field, validator
 
@@ -156,23 +159,72 @@ def upload(dataset_id, tenant_id):
     err, files = FileService.upload_document(kb, file_objs, tenant_id)
     if err:
         return get_result(message="\n".join(err), code=settings.RetCode.SERVER_ERROR)
-    # rename key's name
-    renamed_doc_list = []
-    for file in files:
-        doc = file[0]
-        key_mapping = {
-            "chunk_num": "chunk_count",
-            "kb_id": "dataset_id",
-            "token_num": "token_count",
-            "parser_id": "chunk_method",
-        }
-        renamed_doc = {}
-        for key, value in doc.items():
-            new_key = key_mapping.get(key, key)
-            renamed_doc[new_key] = value
-        renamed_doc["run"] = "UNSTART"
-        renamed_doc_list.append(renamed_doc)
-    return get_result(data=renamed_doc_list)
+    return get_result(data=[rename_uploaded_doc(file[0]) for file in files])
+
+
+@manager.route("/datasets/<dataset_id>/documents/stream", methods=["POST"])  # noqa: F821
+@token_required
+def upload_stream(dataset_id, tenant_id):
+    """
+    Upload one document sent as the raw request body.
+    The body is written to the storage while it is received, it may use chunked transfer encoding.
+    ---
+    tags:
+      - Documents
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - in: path
+        name: dataset_id
+        type: string
+        required: true
+        description: ID of the dataset.
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer token for authentication.
+      - in: header
+        name: X-File-Name
+        type: string
+        required: true
+        description: URL-encoded name of the document.
+      - in: body
+        name: body
+        required: true
+        description: Content of the document.
+    responses:
+      200:
+        description: Successfully uploaded the document, same fields as a document of `upload`.
+    """
+    filename = unquote(request.headers.get("X-File-Name", ""))
+    if not filename:
+        return get_error_data_result(
+            message="`X-File-Name` header is required!", code=settings.RetCode.ARGUMENT_ERROR
+        )
+    e, kb = KnowledgebaseService.get_by_id(dataset_id)
+    if not e:
+        raise LookupError(f"Can't find the dataset with ID {dataset_id}!")
+    try:
+        doc = FileService.upload_document_stream(kb, filename, request.stream, tenant_id)
+    except Exception as e:
+        return get_result(message=f"{filename}: {e}", code=settings.RetCode.SERVER_ERROR)
+    return get_result(data=[rename_uploaded_doc(doc)])
+
+
+def rename_uploaded_doc(doc):
+    key_mapping = {
+        "chunk_num": "chunk_count",
+        "kb_id": "dataset_id",
+        "token_num": "token_count",
+        "parser_id": "chunk_method",
+    }
+    renamed_doc = {}
+    for key, value in doc.items():
+        new_key = key_mapping.get(key, key)
+        renamed_doc[new_key] = value
+    renamed_doc["run"] = "UNSTART"
+    return renamed_doc
 
 
 @manager.route("/datasets/<dataset_id>/documents/<document_id>", methods=["PUT"])  # noqa: F821
@@ -680,7 +732,7 @@ def parse(tenant_id, dataset_id):
         doc = doc.to_dict()
         doc["tenant_id"] = tenant_id
         bucket, name = File2DocumentService.get_storage_address(doc_id=doc["id"])
-        queue_tasks(doc, bucket, name)
+        queue_tasks(doc, bucket, name, INTERACTIVE if len(req["document_ids"]) == 1 else BULK)
     return get_result()
 
 
@@ -738,6 +790,7 @@ def stop_parsing(tenant_id, dataset_id):
             )
         info = {"run": "2", "progress": 0, "chunk_num": 0}
         DocumentService.update_by_id(id, info)
+        DocumentService.set_canceled(id)
         settings.docStoreConn.delete({"doc_id": doc[0].id}, search.index_name(tenant_id), dataset_id)
     return get_result()
 
@@ -1005,6 +1058,7 @@ def add_chunk(tenant_id, dataset_id, document_id):
         "content_with_weight": req["content"],
     }
     d["content_sm_ltks"] = rag_tokenizer.fine_grained_tokenize(d["content_ltks"])
+    d[TOKEN_NUM_FLD] = num_tokens_from_string(d["content_with_weight"])
     d["important_kwd"] = req.get("important_keywords", [])
     d["important_tks"] = rag_tokenizer.tokenize(
         " ".join(req.get("important_keywords", []))
@@ -1028,6 +1082,7 @@ def add_chunk(tenant_id, dataset_id, document_id):
     settings.docStoreConn.insert([d], search.index_name(tenant_id), dataset_id)
 
     DocumentService.increment_chunk_num(doc.id, doc.kb_id, c, 1, 0)
+    TaskService.release_chunk_store(doc_id=doc.id)
     # rename keys
     key_mapping = {
         "id": "id",
@@ -1105,6 +1160,7 @@ def rm_chunk(tenant_id, dataset_id, document_id):
     chunk_number = settings.docStoreConn.delete(condition, search.index_name(tenant_id), dataset_id)
     if chunk_number != 0:
         DocumentService.decrement_chunk_num(document_id, dataset_id, 1, chunk_number, 0)
+        TaskService.release_chunk_store(doc_id=document_id)
     if "chunk_ids" in req and chunk_number != len(req["chunk_ids"]):
         return get_error_data_result(message=f"rm_chunk deleted chunks {chunk_number}, expect {len(req['chunk_ids'])}")
     return get_result(message=f"deleted {chunk_number} chunks")
@@ -1213,10 +1269,12 @@ def update_chunk(tenant_id, dataset_id, document_id, chunk_id):
             d, arr[0], arr[1], not any([rag_tokenizer.is_chinese(t) for t in q + a])
         )
 
+    d[TOKEN_NUM_FLD] = num_tokens_from_string(d["content_with_weight"])
     v, c = embd_mdl.encode([doc.name, d["content_with_weight"] if not d.get("question_kwd") else "\n".join(d["question_kwd"])])
     v = 0.1 * v[0] + 0.9 * v[1] if doc.parser_id != ParserType.QA else v[1]
     d["q_%d_vec" % len(v)] = v.tolist()
     settings.docStoreConn.update({"id": chunk_id}, d, search.index_name(tenant_id), dataset_id)
+    TaskService.release_chunk_store(doc_id=document_id)
     return get_result()
 
 
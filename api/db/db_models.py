@@ -751,6 +751,7 @@ class Document(DataBaseModel):
         help_text="where dose it store",
         index=True)
     size = IntegerField(default=0, index=True)
+    page_num = IntegerField(null=True, default=0, help_text="number of pages of a PDF, 0 until read by a task executor")
     token_num = IntegerField(default=0, index=True)
     chunk_num = IntegerField(default=0, index=True)
     progress = FloatField(default=0, index=True)
@@ -857,6 +858,7 @@ class Task(DataBaseModel):
     retry_count = IntegerField(default=0)
     digest = TextField(null=True, help_text="task digest", default="")
     chunk_ids = LongTextField(null=True, help_text="chunk ids", default="")
+    content_digest = CharField(max_length=32, null=True, help_text="digest of the source file and chunking settings", default="", index=True)
 
 
 class Dialog(DataBaseModel):
@@ -1122,3 +1124,18 @@ def migrate_db():
             )
         except Exception:
             pass
+        try:
+            migrate(
+                migrator.add_column("task", "content_digest",
+                                    CharField(max_length=32, null=True, help_text="digest of the source file and chunking settings",
+                                              default="", index=True))
+            )
+        except Exception:
+            pass
+        try:
+            migrate(
+                migrator.add_column("document", "page_num",
+                                    IntegerField(null=True, default=0, help_text="number of pages of a PDF, 0 until read by a task executor"))
+            )
+        except Exception:
+            pass
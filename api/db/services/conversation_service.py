@@ -75,8 +75,26 @@ def structure_answer(conv, ans, message_id, session_id):
     return ans
 
 
+def delta_answer(ans, last_answer):
+    """
+    Event of the delta stream format: when the cumulative `answer` only grew since `last_answer`,
+    it is replaced by the appended `delta`, and the reference is dropped until it has chunks.
+    """
+    ans = dict(ans)
+    answer = ans.pop("answer")
+    if answer.startswith(last_answer):
+        ans["delta"] = answer[len(last_answer):]
+    else:
+        ans["answer"] = answer
+    if not ans.get("reference", {}).get("chunks"):
+        ans.pop("reference", None)
+    return ans
+
+
 def completion(tenant_id, chat_id, question, name="New session", session_id=None, stream=True, **kwargs):
     assert name, "`name` can not be empty."
+    # stream deltas of the answer instead of the cumulative answer, requested by the SDK
+    delta = kwargs.pop("delta", False)
     dia = DialogService.query(id=chat_id, tenant_id=tenant_id, status=StatusEnum.VALID.value)
     assert dia, "You do not own the chat."
 
@@ -130,8 +148,11 @@ def completion(tenant_id, chat_id, question, name="New session", session_id=None
 
     if stream:
         try:
+            last_answer = ""
             for ans in chat(dia, msg, True, **kwargs):
                 ans = structure_answer(conv, ans, message_id, session_id)
+                if delta:
+                    ans, last_answer = delta_answer(ans, last_answer), ans["answer"]
                 yield "data:" + json.dumps({"code": 0, "data": ans}, ensure_ascii=False) + "\n\n"
             ConversationService.update_by_id(conv.id, conv.to_dict())
         except Exception as e:
@@ -14,23 +14,29 @@
 #  limitations under the License.
 #
 import logging
+import os
 import xxhash
 import json
 import random
 import re
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
 from io import BytesIO
 import trio
+from cachetools import LRUCache
 
 from peewee import fn
 
 from api.db.db_utils import bulk_insert_into_db
 from api import settings
 from api.utils import current_timestamp, get_format_time, get_uuid
-from rag.settings import SVR_QUEUE_NAME
+from rag.settings import SVR_PROGRESS_QUEUE_NAME, SVR_PROGRESS_QUEUE_MAX_LEN
+from rag.utils.redis_conn import REDIS_CONN
+from rag.utils.file_cache import evict as evict_file
 from rag.utils.storage_factory import STORAGE_IMPL
+from rag.utils.task_queue import BACKGROUND, queue_task
 from rag.nlp import search, rag_tokenizer
 
 from api.db import FileType, TaskStatus, ParserType, LLMType
@@ -39,7 +45,17 @@ from api.db.db_models import Document
 from api.db.services.common_service import CommonService
 from api.db.services.knowledgebase_service import KnowledgebaseService
 from api.db import StatusEnum
-from rag.utils.redis_conn import REDIS_CONN
+
+# Meta fields of the documents cited in the chat prompts, doc_id -> (version, meta_fields), per process.
+# An entry is trusted while the version kept in Redis for the document is unchanged.
+DOC_META_CACHE_SIZE = int(os.environ.get("DOC_META_CACHE_SIZE", 10000))
+DOC_META_VERSION_TTL = 7 * 24 * 3600
+_doc_meta_cache = LRUCache(maxsize=DOC_META_CACHE_SIZE)
+_doc_meta_cache_lock = threading.Lock()
+
+
+def _doc_meta_version_key(doc_id):
+    return f"doc_meta_version:{doc_id}"
 
 
 class DocumentService(CommonService):
@@ -94,6 +110,13 @@ class DocumentService(CommonService):
     @classmethod
     @DB.connection_context()
     def remove_document(cls, doc, tenant_id):
+        from api.db.services.file2document_service import File2DocumentService
+
+        # a document uploaded later at the same location must not be parsed from the cached source file
+        try:
+            evict_file(*File2DocumentService.get_storage_address(doc_id=doc.id))
+        except Exception:
+            logging.exception(f"remove_document({doc.id}) evicting the cached file got exception")
         cls.clear_chunk_num(doc.id)
         try:
             settings.docStoreConn.delete({"doc_id": doc.id}, search.index_name(tenant_id), doc.kb_id)
@@ -109,6 +132,8 @@ class DocumentService(CommonService):
             )
         except Exception:
             pass
+        # the tasks hold the chunk store references of the document
+        Task.delete().where(Task.doc_id == doc.id).execute()
         return cls.delete_by_id(doc.id)
 
     @classmethod
@@ -146,9 +171,11 @@ class DocumentService(CommonService):
 
     @classmethod
     @DB.connection_context()
-    def get_unfinished_docs(cls):
+    def get_unfinished_docs(cls, doc_ids=None):
         fields = [cls.model.id, cls.model.process_begin_at, cls.model.parser_config, cls.model.progress_msg, cls.model.run, cls.model.parser_id]
         docs = cls.model.select(*fields).where(cls.model.status == StatusEnum.VALID.value, ~(cls.model.type == FileType.VIRTUAL.value), cls.model.progress < 1, cls.model.progress > 0)
+        if doc_ids is not None:
+            docs = docs.where(cls.model.id.in_(doc_ids))
         return list(docs.dicts())
 
     @classmethod
@@ -323,66 +350,130 @@ class DocumentService(CommonService):
     @classmethod
     @DB.connection_context()
     def begin2parse(cls, docid):
+        cls.set_canceled(docid, False)
         cls.update_by_id(docid, {"progress": random.random() * 1 / 100.0, "progress_msg": "Task is queued...", "process_begin_at": get_format_time()})
 
+    @classmethod
+    def set_canceled(cls, doc_id, canceled=True):
+        """Raise or clear the flag telling the task executors to stop the running tasks of a document."""
+        if canceled:
+            return REDIS_CONN.set(f"{doc_id}-cancel", "x", 24 * 3600)
+        return REDIS_CONN.delete(f"{doc_id}-cancel")
+
+    @classmethod
+    def has_canceled(cls, doc_id):
+        return bool(REDIS_CONN.exist(f"{doc_id}-cancel"))
+
     @classmethod
     @DB.connection_context()
     def update_meta_fields(cls, doc_id, meta_fields):
-        return cls.update_by_id(doc_id, {"meta_fields": meta_fields})
+        res = cls.update_by_id(doc_id, {"meta_fields": meta_fields})
+        # bumped after the update, a reader seeing the new version reads the new meta fields
+        REDIS_CONN.set(_doc_meta_version_key(doc_id), get_uuid(), DOC_META_VERSION_TTL)
+        with _doc_meta_cache_lock:
+            _doc_meta_cache.pop(doc_id, None)
+        return res
+
+    @classmethod
+    @DB.connection_context()
+    def _load_meta_fields(cls, doc_ids):
+        docs = cls.model.select(cls.model.id, cls.model.meta_fields).where(cls.model.id.in_(doc_ids))
+        return {d.id: d.meta_fields or {} for d in docs}
+
+    @classmethod
+    def get_meta_fields(cls, doc_ids) -> dict:
+        """
+        {doc_id: meta_fields}, from the per process cache when the version of the document in Redis
+        still matches, otherwise in a single query. Without Redis, everything is read from the database.
+        """
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
+            return {}
+        versions = REDIS_CONN.mget([_doc_meta_version_key(doc_id) for doc_id in doc_ids])
+        if versions is None:
+            return cls._load_meta_fields(doc_ids)
+
+        res, missing = {}, {}
+        with _doc_meta_cache_lock:
+            for doc_id, version in zip(doc_ids, versions):
+                cached = _doc_meta_cache.get(doc_id)
+                if cached and cached[0] == version:
+                    res[doc_id] = cached[1]
+                else:
+                    missing[doc_id] = version
+        if not missing:
+            return res
+        loaded = cls._load_meta_fields(list(missing.keys()))
+        with _doc_meta_cache_lock:
+            for doc_id, meta in loaded.items():
+                _doc_meta_cache[doc_id] = (missing[doc_id], meta)
+        res.update(loaded)
+        return res
 
     @classmethod
     @DB.connection_context()
     def update_progress(cls):
+        """Recompute the progress of every unfinished document from its tasks, see DocumentProgressAggregator."""
         docs = cls.get_unfinished_docs()
         for d in docs:
             try:
                 tsks = Task.query(doc_id=d["id"], order_by=Task.create_time)
                 if not tsks:
                     continue
-                msg = []
-                prg = 0
-                finished = True
-                bad = 0
-                has_raptor = False
-                has_graphrag = False
-                e, doc = DocumentService.get_by_id(d["id"])
-                status = doc.run  # TaskStatus.RUNNING.value
+                progress = DocumentProgress(d)
                 for t in tsks:
-                    if 0 <= t.progress < 1:
-                        finished = False
-                    if t.progress == -1:
-                        bad += 1
-                    prg += t.progress if t.progress >= 0 else 0
-                    msg.append(t.progress_msg)
-                    if t.task_type == "raptor":
-                        has_raptor = True
-                    elif t.task_type == "graphrag":
-                        has_graphrag = True
-                prg /= len(tsks)
-                if finished and bad:
-                    prg = -1
-                    status = TaskStatus.FAIL.value
-                elif finished:
-                    if d["parser_config"].get("raptor", {}).get("use_raptor") and not has_raptor:
-                        queue_raptor_o_graphrag_tasks(d, "raptor")
-                        prg = 0.98 * len(tsks) / (len(tsks) + 1)
-                    elif d["parser_config"].get("graphrag", {}).get("use_graphrag") and not has_graphrag:
-                        queue_raptor_o_graphrag_tasks(d, "graphrag")
-                        prg = 0.98 * len(tsks) / (len(tsks) + 1)
-                    else:
-                        status = TaskStatus.DONE.value
-
-                msg = "\n".join(sorted(msg))
-                info = {"process_duation": datetime.timestamp(datetime.now()) - d["process_begin_at"].timestamp(), "run": status}
-                if prg != 0:
-                    info["progress"] = prg
-                if msg:
-                    info["progress_msg"] = msg
-                cls.update_by_id(d["id"], info)
+                    progress.set_task(t.id, t.progress, t.progress_msg, t.task_type)
+                cls.sync_progress(progress)
             except Exception as e:
                 if str(e).find("'0'") < 0:
                     logging.exception("fetch task exception")
 
+    @classmethod
+    @DB.connection_context()
+    def sync_progress(cls, progress):
+        """Write the progress of a document aggregated from its tasks. Returns whether it got new tasks or finished."""
+        d = progress.doc
+        tsks = progress.tasks
+        e, doc = DocumentService.get_by_id(d["id"])
+        status = doc.run  # TaskStatus.RUNNING.value
+        finished = progress.running == 0
+        prg = progress.prg_sum / len(tsks)
+        has_raptor = any(t["task_type"] == "raptor" for t in tsks.values())
+        has_graphrag = any(t["task_type"] == "graphrag" for t in tsks.values())
+        changed = finished
+        if finished and progress.bad:
+            prg = -1
+            status = TaskStatus.FAIL.value
+            cls.set_canceled(d["id"])
+        elif finished:
+            if d["parser_config"].get("raptor", {}).get("use_raptor") and not has_raptor:
+                queue_raptor_o_graphrag_tasks(d, "raptor")
+                prg = 0.98 * len(tsks) / (len(tsks) + 1)
+            elif d["parser_config"].get("graphrag", {}).get("use_graphrag") and not has_graphrag:
+                queue_raptor_o_graphrag_tasks(d, "graphrag")
+                prg = 0.98 * len(tsks) / (len(tsks) + 1)
+            else:
+                status = TaskStatus.DONE.value
+
+        msg = "\n".join(sorted(t["progress_msg"] for t in tsks.values()))
+        info = {"process_duation": datetime.timestamp(datetime.now()) - d["process_begin_at"].timestamp(), "run": status}
+        if prg != 0:
+            info["progress"] = prg
+        if msg:
+            info["progress_msg"] = msg
+        cls.update_by_id(d["id"], info)
+        return changed
+
+    @classmethod
+    def publish_progress(cls, doc_id, task_id=None, progress=None):
+        """
+        Tell the progress aggregator that a task of a document progressed. Without task_id, the
+        aggregator reloads all the tasks of the document, e.g. after they were (re)created.
+        The progress logs are not published, the aggregator reads them from the tasks.
+        """
+        message = {"doc_id": doc_id, "task_id": task_id, "progress": progress}
+        return REDIS_CONN.queue_product(SVR_PROGRESS_QUEUE_NAME, message, maxlen=SVR_PROGRESS_QUEUE_MAX_LEN)
+
     @classmethod
     @DB.connection_context()
     def get_kb_doc_count(cls, kb_id):
@@ -399,6 +490,106 @@ class DocumentService(CommonService):
         return False
 
 
+class DocumentProgress:
+    """Progress of the tasks of a document, with the counters it is aggregated from kept up to date."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.tasks = {}
+        # tasks with 0 <= progress < 1
+        self.running = 0
+        # failed tasks, progress == -1
+        self.bad = 0
+        self.prg_sum = 0.0
+
+    def _count(self, t, sign):
+        if 0 <= t["progress"] < 1:
+            self.running += sign
+        if t["progress"] == -1:
+            self.bad += sign
+        self.prg_sum += sign * max(t["progress"], 0)
+
+    def set_task(self, task_id, progress=None, progress_msg=None, task_type=None):
+        old = self.tasks.get(task_id)
+        if old:
+            self._count(old, -1)
+        t = {
+            "progress": progress if progress is not None else old["progress"],
+            "progress_msg": progress_msg if progress_msg is not None else old["progress_msg"],
+            "task_type": task_type if task_type is not None else old["task_type"],
+        }
+        self.tasks[task_id] = t
+        self._count(t, 1)
+
+
+class DocumentProgressAggregator:
+    """
+    Keeps the progress of the documents being parsed up to date from the events published by the
+    task executors. Only the documents concerned by a batch of events are written, once per batch,
+    from counters updated incrementally. Documents are loaded from the database when first seen.
+    """
+
+    GROUP_NAME = "rag_flow_progress_aggregator"
+    CONSUMER_NAME = "progress_aggregator"
+    BATCH_SIZE = 256
+
+    def __init__(self):
+        self.docs = {}
+        self._backlog = "0"
+        REDIS_CONN.queue_create_group(SVR_PROGRESS_QUEUE_NAME, self.GROUP_NAME)
+
+    def reset(self):
+        self.docs = {}
+        self._backlog = "0"
+
+    def _load(self, doc_ids):
+        for doc_id in doc_ids:
+            self.docs.pop(doc_id, None)
+        docs = DocumentService.get_unfinished_docs(doc_ids)
+        if not docs:
+            return
+        tsks = Task.select(Task.id, Task.doc_id, Task.progress, Task.progress_msg, Task.task_type).where(Task.doc_id.in_([d["id"] for d in docs])).order_by(Task.create_time)
+        for d in docs:
+            self.docs[d["id"]] = DocumentProgress(d)
+        for t in tsks:
+            self.docs[t.doc_id].set_task(t.id, t.progress, t.progress_msg, t.task_type)
+
+    @DB.connection_context()
+    def consume(self, block=1000):
+        """Handle one batch of events, waiting at most `block` ms for it."""
+        msg_id = self._backlog or ">"
+        msgs = REDIS_CONN.queue_consumer_batch(self.GROUP_NAME, self.CONSUMER_NAME, [(SVR_PROGRESS_QUEUE_NAME, msg_id, self.BATCH_SIZE)])
+        if self._backlog:
+            self._backlog = msgs[-1].get_msg_id() if msgs else None
+        elif not msgs:
+            msgs = REDIS_CONN.queue_consumer_batch(self.GROUP_NAME, self.CONSUMER_NAME, [(SVR_PROGRESS_QUEUE_NAME, ">", self.BATCH_SIZE)], block=block)
+        if not msgs:
+            return 0
+
+        events = [m.get_message() for m in msgs]
+        reload = {e["doc_id"] for e in events if e["doc_id"] not in self.docs or not e.get("task_id") or e["task_id"] not in self.docs[e["doc_id"]].tasks}
+        if reload:
+            self._load(list(reload))
+        updated = [e for e in events if e["doc_id"] in self.docs and e.get("task_id") in self.docs[e["doc_id"]].tasks]
+        msgs_by_task = {}
+        if updated:
+            tsks = Task.select(Task.id, Task.progress_msg).where(Task.id.in_(list({e["task_id"] for e in updated})))
+            msgs_by_task = {t.id: t.progress_msg for t in tsks}
+        touched = {e["doc_id"] for e in events if e["doc_id"] in self.docs}
+        for e in updated:
+            self.docs[e["doc_id"]].set_task(e["task_id"], e.get("progress"), msgs_by_task.get(e["task_id"]))
+        for doc_id in touched:
+            try:
+                if DocumentService.sync_progress(self.docs[doc_id]):
+                    # finished, or the RAPTOR/GraphRAG task was queued and will be loaded with its first event
+                    self.docs.pop(doc_id, None)
+            except Exception:
+                logging.exception(f"DocumentProgressAggregator sync {doc_id} got exception")
+                self.docs.pop(doc_id, None)
+        REDIS_CONN.queue_ack(self.GROUP_NAME, {SVR_PROGRESS_QUEUE_NAME: [m.get_msg_id() for m in msgs]})
+        return len(msgs)
+
+
 def queue_raptor_o_graphrag_tasks(doc, ty):
     chunking_config = DocumentService.get_chunking_config(doc["id"])
     hasher = xxhash.xxh64()
@@ -415,7 +606,7 @@ def queue_raptor_o_graphrag_tasks(doc, ty):
     hasher.update(ty.encode("utf-8"))
     task["digest"] = hasher.hexdigest()
     bulk_insert_into_db(Task, [task], True)
-    assert REDIS_CONN.queue_product(SVR_QUEUE_NAME, message=task), "Can't access Redis. Please check the Redis' status."
+    assert queue_task(task, chunking_config["tenant_id"], BACKGROUND), "Can't access Redis. Please check the Redis' status."
 
 
 def doc_upload_and_parse(conversation_id, file_objs, user_id):
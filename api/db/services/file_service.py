@@ -33,6 +33,19 @@ from api.utils.file_utils import filename_type, thumbnail_img
 from rag.utils.storage_factory import STORAGE_IMPL
 
 
+class _CountingReader:
+    """File-like wrapper counting the bytes read through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.size += len(data)
+        return data
+
+
 class FileService(CommonService):
     model = File
 
@@ -339,23 +352,7 @@ class FileService(CommonService):
         err, files = [], []
         for file in file_objs:
             try:
-                MAX_FILE_NUM_PER_USER = int(os.environ.get('MAX_FILE_NUM_PER_USER', 0))
-                if MAX_FILE_NUM_PER_USER > 0 and DocumentService.get_doc_count(kb.tenant_id) >= MAX_FILE_NUM_PER_USER:
-                    raise RuntimeError("Exceed the maximum file number of a free user!")
-                if len(file.filename) >= 128:
-                    raise RuntimeError("Exceed the maximum length of file name!")
-
-                filename = duplicate_name(
-                    DocumentService.query,
-                    name=file.filename,
-                    kb_id=kb.id)
-                filetype = filename_type(filename)
-                if filetype == FileType.OTHER.value:
-                    raise RuntimeError("This type of file has not been supported yet!")
-
-                location = filename
-                while STORAGE_IMPL.obj_exist(kb.id, location):
-                    location += "_"
+                filename, filetype, location = self._new_document_location(kb, file.filename)
                 blob = file.read()
                 STORAGE_IMPL.put(kb.id, location, blob)
 
@@ -367,27 +364,75 @@ class FileService(CommonService):
                     thumbnail_location = f'thumbnail_{doc_id}.png'
                     STORAGE_IMPL.put(kb.id, thumbnail_location, img)
 
-                doc = {
-                    "id": doc_id,
-                    "kb_id": kb.id,
-                    "parser_id": self.get_parser(filetype, filename, kb.parser_id),
-                    "parser_config": kb.parser_config,
-                    "created_by": user_id,
-                    "type": filetype,
-                    "name": filename,
-                    "location": location,
-                    "size": len(blob),
-                    "thumbnail": thumbnail_location
-                }
-                DocumentService.insert(doc)
-
-                FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
+                doc = self._insert_document(kb, kb_folder, user_id, doc_id, filetype, filename, location,
+                                            len(blob), thumbnail_location)
                 files.append((doc, blob))
             except Exception as e:
                 err.append(file.filename + ": " + str(e))
 
         return err, files
 
+    @classmethod
+    @DB.connection_context()
+    def upload_document_stream(cls, kb, filename, stream, user_id):
+        """
+        Upload one document whose content is read from the file-like `stream` and written to the storage
+        as it arrives, so the file is never held in memory. No thumbnail is generated.
+        When the upload fails, the object written so far is removed.
+        """
+        root_folder = cls.get_root_folder(user_id)
+        cls.init_knowledgebase_docs(root_folder["id"], user_id)
+        kb_folder = cls.new_a_file_from_kb(kb.tenant_id, kb.name, cls.get_kb_folder(user_id)["id"])
+
+        filename, filetype, location = cls._new_document_location(kb, filename)
+        counter = _CountingReader(stream)
+        try:
+            STORAGE_IMPL.put_stream(kb.id, location, counter)
+            return cls._insert_document(kb, kb_folder, user_id, get_uuid(), filetype, filename, location, counter.size, "")
+        except Exception:
+            STORAGE_IMPL.rm(kb.id, location)
+            raise
+
+    @classmethod
+    def _new_document_location(cls, kb, name):
+        MAX_FILE_NUM_PER_USER = int(os.environ.get('MAX_FILE_NUM_PER_USER', 0))
+        if MAX_FILE_NUM_PER_USER > 0 and DocumentService.get_doc_count(kb.tenant_id) >= MAX_FILE_NUM_PER_USER:
+            raise RuntimeError("Exceed the maximum file number of a free user!")
+        if len(name) >= 128:
+            raise RuntimeError("Exceed the maximum length of file name!")
+
+        filename = duplicate_name(
+            DocumentService.query,
+            name=name,
+            kb_id=kb.id)
+        filetype = filename_type(filename)
+        if filetype == FileType.OTHER.value:
+            raise RuntimeError("This type of file has not been supported yet!")
+
+        location = filename
+        while STORAGE_IMPL.obj_exist(kb.id, location):
+            location += "_"
+        return filename, filetype, location
+
+    @classmethod
+    def _insert_document(cls, kb, kb_folder, user_id, doc_id, filetype, filename, location, size, thumbnail_location):
+        doc = {
+            "id": doc_id,
+            "kb_id": kb.id,
+            "parser_id": cls.get_parser(filetype, filename, kb.parser_id),
+            "parser_config": kb.parser_config,
+            "created_by": user_id,
+            "type": filetype,
+            "name": filename,
+            "location": location,
+            "size": size,
+            "thumbnail": thumbnail_location
+        }
+        DocumentService.insert(doc)
+
+        FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
+        return doc
+
     @staticmethod
     def parse_docs(file_objs, user_id):
         from rag.app import presentation, picture, naive, audio, email
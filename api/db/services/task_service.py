@@ -13,7 +13,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-import os
+import json
 import random
 import xxhash
 from datetime import datetime
@@ -26,9 +26,9 @@ from api.db.db_models import Task, Document, Knowledgebase, Tenant
 from api.db.services.common_service import CommonService
 from api.db.services.document_service import DocumentService
 from api.utils import current_timestamp, get_uuid
-from rag.settings import SVR_QUEUE_NAME
 from rag.utils.storage_factory import STORAGE_IMPL
-from rag.utils.redis_conn import REDIS_CONN
+from rag.utils.task_queue import BULK, queue_task
+from rag.utils.task_split import adaptive_split_enabled, cost_key, page_size as adaptive_page_size
 from api import settings
 from rag.nlp import search
 
@@ -62,6 +62,7 @@ class TaskService(CommonService):
             Document.type,
             Document.location,
             Document.size,
+            Document.page_num,
             Knowledgebase.tenant_id,
             Knowledgebase.language,
             Knowledgebase.embd_id,
@@ -106,9 +107,11 @@ class TaskService(CommonService):
         fields = [
             cls.model.id,
             cls.model.from_page,
+            cls.model.to_page,
             cls.model.progress,
             cls.model.digest,
             cls.model.chunk_ids,
+            cls.model.content_digest,
         ]
         tasks = cls.model.select(*fields).order_by(cls.model.from_page.asc(), cls.model.create_time.desc()).where(cls.model.doc_id == doc_id)
         tasks = list(tasks.dicts())
@@ -121,12 +124,42 @@ class TaskService(CommonService):
     def update_chunk_ids(cls, id: str, chunk_ids: str):
         cls.model.update(chunk_ids=chunk_ids).where(cls.model.id == id).execute()
 
+    @classmethod
+    @DB.connection_context()
+    def get_chunk_sources(cls, content_digest: str, limit: int = 3):
+        """
+        The chunk store entry of `content_digest`: the finished tasks holding a copy of its chunks, one reference
+        each, the most recent first.
+        """
+        fields = [cls.model.id, cls.model.doc_id, cls.model.chunk_ids, Document.kb_id, Knowledgebase.tenant_id]
+        tasks = (
+            cls.model.select(*fields)
+            .join(Document, on=(cls.model.doc_id == Document.id))
+            .join(Knowledgebase, on=(Document.kb_id == Knowledgebase.id))
+            .where(cls.model.content_digest == content_digest, cls.model.progress >= 1, cls.model.chunk_ids != "")
+            .order_by(cls.model.update_time.desc())
+            .limit(limit)
+        )
+        return list(tasks.dicts())
+
+    @classmethod
+    @DB.connection_context()
+    def update_content_digest(cls, id: str, content_digest: str):
+        cls.model.update(content_digest=content_digest).where(cls.model.id == id).execute()
+
+    @classmethod
+    @DB.connection_context()
+    def release_chunk_store(cls, doc_id: str = None, task_id: str = None):
+        """Drops the chunk store references of a document whose chunks no longer match its source file, or of one task."""
+        cond = cls.model.id == task_id if task_id else cls.model.doc_id == doc_id
+        cls.model.update(content_digest="").where(cond).execute()
+
     @classmethod
     @DB.connection_context()
     def get_ongoing_doc_name(cls):
         with DB.lock("get_task", -1):
             docs = (
-                cls.model.select(*[Document.id, Document.kb_id, Document.location, File.parent_id])
+                cls.model.select(*[Document.id, Document.kb_id, Document.location, Document.size, File.parent_id])
                 .join(Document, on=(cls.model.doc_id == Document.id))
                 .join(
                     File2Document,
@@ -145,17 +178,20 @@ class TaskService(CommonService):
                     cls.model.progress < 1,
                     cls.model.create_time >= current_timestamp() - 1000 * 600,
                 )
+                .order_by(cls.model.create_time)
             )
             docs = list(docs.dicts())
             if not docs:
                 return []
 
+            # (bucket, location, size) in the order the tasks were queued
             return list(
-                set(
+                dict.fromkeys(
                     [
                         (
                             d["parent_id"] if d["parent_id"] else d["kb_id"],
                             d["location"],
+                            d["size"],
                         )
                         for d in docs
                     ]
@@ -172,25 +208,14 @@ class TaskService(CommonService):
     @classmethod
     @DB.connection_context()
     def update_progress(cls, id, info):
-        if os.environ.get("MACOS"):
-            if info["progress_msg"]:
-                task = cls.model.get_by_id(id)
-                progress_msg = trim_header_by_lines(task.progress_msg + "\n" + info["progress_msg"], 3000)
-                cls.model.update(progress_msg=progress_msg).where(cls.model.id == id).execute()
-            if "progress" in info:
-                cls.model.update(progress=info["progress"]).where(cls.model.id == id).execute()
-            return
-
-        with DB.lock("update_progress", -1):
-            if info["progress_msg"]:
-                task = cls.model.get_by_id(id)
-                progress_msg = trim_header_by_lines(task.progress_msg + "\n" + info["progress_msg"], 3000)
-                cls.model.update(progress_msg=progress_msg).where(cls.model.id == id).execute()
-            if "progress" in info:
-                cls.model.update(progress=info["progress"]).where(cls.model.id == id).execute()
-
-
-def queue_tasks(doc: dict, bucket: str, name: str):
+        """
+        Overwrite the progress of a task. The executor running the task keeps its whole progress log
+        and passes it in progress_msg, so the update needs neither a read nor a lock.
+        """
+        cls.model.update(**info).where(cls.model.id == id).execute()
+
+
+def queue_tasks(doc: dict, bucket: str, name: str, priority: str = BULK):
     """
     将文档解析任务分割并加入队列处理。
 
@@ -201,14 +226,15 @@ def queue_tasks(doc: dict, bucket: str, name: str):
         doc (dict): 文档信息字典，包含id、type、parser_id、parser_config等信息
         bucket (str): 存储桶名称
         name (str): 文件名称
+        priority (str): 调度优先级，单个文档解析为 interactive，批量解析为 bulk
 
     流程:
-        1. 根据文档类型(PDF/表格)将文档分割成多个子任务
+        1. 根据文档类型(PDF/表格)将文档分割成多个子任务，PDF的任务页数根据历史耗时和执行器负载自适应确定
         2. 为每个任务生成唯一摘要(digest)
         3. 尝试重用之前任务的处理结果
         4. 清理旧任务并更新文档状态
         5. 将新任务批量插入数据库
-        6. 将未完成的任务加入Redis队列
+        6. 将未完成的任务加入该租户和优先级对应的Redis队列
     """
 
     def new_task():
@@ -225,63 +251,43 @@ def queue_tasks(doc: dict, bucket: str, name: str):
 
     # PDF文档处理逻辑
     if doc["type"] == FileType.PDF.value:
-        # 获取布局识别方式，默认为"DeepDOC"
-        do_layout = doc["parser_config"].get("layout_recognize", "DeepDOC")
-        # 获取PDF总页数
-        pages = 1
-        # 获取每个任务处理的页数，默认为12页
-        page_size = doc["parser_config"].get("task_page_size", 12)
-        # 对于学术论文类型，默认任务页数为22
-        if doc["parser_id"] == "paper":
-            page_size = doc["parser_config"].get("task_page_size", 22)
-        # 对于特定解析器或非DeepDOC布局识别，将整个文档作为一个任务处理
-        if doc["parser_id"] in ["one", "knowledge_graph"] or do_layout != "DeepDOC":
-            page_size = 10**9
         # 获取需要处理的页面范围，默认为全部页面
         page_ranges = doc["parser_config"].get("pages") or [(1, 10**5)]
-        # 根据页面范围和任务页数分割任务
-        for s, e in page_ranges:
-            # 调整页码（从0开始）
-            s -= 1
-            s = max(0, s)
-            # 确保结束页不超过文档总页数
-            e = min(e - 1, pages)
-            # 按照任务页数分割任务
-            for p in range(s, e, page_size):
-                task = new_task()
-                task["from_page"] = p
-                task["to_page"] = min(p + page_size, e)
-                parse_task_array.append(task)
+        # PDF总页数由任务执行器首次读取文件时记录，页数未知时每个页面范围先作为一个任务，由任务执行器按页数分割
+        if doc.get("page_num"):
+            ranges = pdf_page_ranges(doc, doc["page_num"], page_ranges)
+        else:
+            ranges = [(max(0, s - 1), e - 1) for s, e in page_ranges if e - 1 > max(0, s - 1)]
+        for from_page, to_page in ranges:
+            task = new_task()
+            task["from_page"] = from_page
+            task["to_page"] = to_page
+            parse_task_array.append(task)
 
     # 其他类型文档，整个文档作为一个任务处理
     else:
         parse_task_array.append(new_task())
 
+    # 获取文档之前的任务记录
+    prev_tasks = TaskService.get_tasks(doc["id"])
+    # 重新解析时，若之前的任务覆盖相同的页面，则沿用之前的分割方式，以便复用之前任务的分块
+    if doc["type"] == FileType.PDF.value and prev_tasks:
+        prev_ranges = [(t["from_page"], t["to_page"]) for t in prev_tasks if t["from_page"] < 100000000]
+        if merge_page_ranges(prev_ranges) == merge_page_ranges([(t["from_page"], t["to_page"]) for t in parse_task_array]):
+            parse_task_array = []
+            for from_page, to_page in sorted(prev_ranges):
+                task = new_task()
+                task["from_page"] = from_page
+                task["to_page"] = to_page
+                parse_task_array.append(task)
+
     # 获取文档的分块配置
     chunking_config = DocumentService.get_chunking_config(doc["id"])
-    # 为每个任务生成唯一摘要(digest)
+    # 为每个任务生成唯一摘要(digest)并设置初始进度
     for task in parse_task_array:
-        # 创建哈希对象
-        hasher = xxhash.xxh64()
-        # 对分块配置中的每个字段进行哈希
-        for field in sorted(chunking_config.keys()):
-            if field == "parser_config":
-                # 移除不需要参与哈希计算的特定配置项
-                for k in ["raptor", "graphrag"]:
-                    if k in chunking_config[field]:
-                        del chunking_config[field][k]
-            # 将配置字段添加到哈希计算中
-            hasher.update(str(chunking_config[field]).encode("utf-8"))
-        # 将任务特定字段添加到哈希计算中
-        for field in ["doc_id", "from_page", "to_page"]:
-            hasher.update(str(task.get(field, "")).encode("utf-8"))
-        # 生成任务摘要并设置初始进度
-        task_digest = hasher.hexdigest()
-        task["digest"] = task_digest
+        task["digest"] = task_digest(chunking_config, task)
         task["progress"] = 0.0
 
-    # 获取文档之前的任务记录
-    prev_tasks = TaskService.get_tasks(doc["id"])
     # 记录重用的块数量
     ck_num = 0
     if prev_tasks:
@@ -310,7 +316,100 @@ def queue_tasks(doc: dict, bucket: str, name: str):
     unfinished_task_array = [task for task in parse_task_array if task["progress"] < 1.0]
     # 将未完成的任务加入Redis队列
     for unfinished_task in unfinished_task_array:
-        assert REDIS_CONN.queue_product(SVR_QUEUE_NAME, message=unfinished_task), "Can't access Redis. Please check the Redis' status."
+        assert queue_task(unfinished_task, chunking_config["tenant_id"], priority), "Can't access Redis. Please check the Redis' status."
+    # 通知进度聚合器重新加载该文档的任务
+    DocumentService.publish_progress(doc["id"])
+
+
+def task_digest(chunking_config: dict, task: dict) -> str:
+    """Digest of a parse task, a previous task of the document with the same one can give its chunks."""
+    hasher = xxhash.xxh64()
+    for field in sorted(chunking_config.keys()):
+        value = chunking_config[field]
+        if field == "parser_config":
+            # 移除不需要参与哈希计算的特定配置项
+            value = {k: v for k, v in value.items() if k not in ["raptor", "graphrag"]}
+        hasher.update(str(value).encode("utf-8"))
+    for field in ["doc_id", "from_page", "to_page"]:
+        hasher.update(str(task.get(field, "")).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def pdf_page_ranges(doc: dict, pages: int, page_ranges: list) -> list[tuple[int, int]]:
+    """
+    将PDF的页面范围按任务页数分割，返回从0开始的 [from_page, to_page) 列表。
+
+    参数:
+        doc (dict): 包含parser_id、parser_config的文档或任务信息
+        pages (int): PDF总页数
+        page_ranges (list): 需要处理的页面范围，页码从1开始
+    """
+    # 获取布局识别方式，默认为"DeepDOC"
+    do_layout = doc["parser_config"].get("layout_recognize", "DeepDOC")
+    # 获取每个任务处理的页数，默认为12页
+    page_size = doc["parser_config"].get("task_page_size", 12)
+    # 对于学术论文类型，默认任务页数为22
+    if doc["parser_id"] == "paper":
+        page_size = doc["parser_config"].get("task_page_size", 22)
+    # 对于特定解析器或非DeepDOC布局识别，将整个文档作为一个任务处理
+    if doc["parser_id"] in ["one", "knowledge_graph"] or do_layout != "DeepDOC":
+        page_size = 10**9
+    # 未指定任务页数时，根据该解析方式每页的历史耗时和执行器的空闲槽位自适应确定任务页数
+    elif adaptive_split_enabled(doc["parser_id"], doc["parser_config"]):
+        total = sum(max(0, min(e - 1, pages) - max(0, s - 1)) for s, e in page_ranges)
+        page_size = adaptive_page_size(total, cost_key(doc["parser_id"], doc["parser_config"]), page_size)
+    ranges = []
+    for s, e in page_ranges:
+        # 调整页码（从0开始），确保结束页不超过文档总页数
+        s = max(0, s - 1)
+        e = min(e - 1, pages)
+        # 按照任务页数分割
+        for p in range(s, e, page_size):
+            ranges.append((p, min(p + page_size, e)))
+    return ranges
+
+
+def merge_page_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged = []
+    for from_page, to_page in sorted(ranges):
+        if merged and from_page <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], to_page))
+        else:
+            merged.append((from_page, to_page))
+    return merged
+
+
+def split_task(task: dict, cut: int, priority: str = BULK) -> dict:
+    """
+    Moves the pages of a task from `cut` on to a new task, queued right away. Only for a task which didn't start
+    chunking yet.
+    """
+    return split_task_ranges(task, [(task["from_page"], cut), (cut, task["to_page"])], priority)[0]
+
+
+def split_task_ranges(task: dict, ranges: list[tuple[int, int]], priority: str = BULK) -> list[dict]:
+    """
+    Narrows a task to the first of `ranges` and moves the others to new tasks, queued right away. Only for a
+    task which didn't start chunking yet. Returns the new tasks.
+    """
+    chunking_config = DocumentService.get_chunking_config(task["doc_id"])
+    tails = []
+    for from_page, to_page in ranges[1:]:
+        tail = {"id": get_uuid(), "doc_id": task["doc_id"], "progress": 0.0, "from_page": from_page, "to_page": to_page}
+        tail["digest"] = task_digest(chunking_config, tail)
+        tails.append(tail)
+    from_page, to_page = ranges[0]
+    head = {"doc_id": task["doc_id"], "from_page": from_page, "to_page": to_page}
+    with DB.atomic():
+        TaskService.update_by_id(task["id"], {"from_page": from_page, "to_page": to_page, "digest": task_digest(chunking_config, head)})
+        if tails:
+            bulk_insert_into_db(Task, tails, True)
+    task["from_page"], task["to_page"] = from_page, to_page
+    for tail in tails:
+        assert queue_task(tail, chunking_config["tenant_id"], priority), "Can't access Redis. Please check the Redis' status."
+    # 通知进度聚合器重新加载该文档的任务
+    DocumentService.publish_progress(task["doc_id"])
+    return tails
 
 
 def reuse_prev_task_chunks(task: dict, prev_tasks: list[dict], chunking_config: dict):
@@ -327,6 +426,7 @@ def reuse_prev_task_chunks(task: dict, prev_tasks: list[dict], chunking_config:
     if prev_task["progress"] < 1.0 or not prev_task["chunk_ids"]:
         return 0
     task["chunk_ids"] = prev_task["chunk_ids"]
+    task["content_digest"] = prev_task["content_digest"]
     task["progress"] = 1.0
     if "from_page" in task and "to_page" in task and int(task["to_page"]) - int(task["from_page"]) >= 10**6:
         task["progress_msg"] = f"Page({task['from_page']}~{task['to_page']}): "
@@ -336,3 +436,17 @@ def reuse_prev_task_chunks(task: dict, prev_tasks: list[dict], chunking_config:
     prev_task["chunk_ids"] = ""
 
     return len(task["chunk_ids"].split())
+
+
+def chunk_store_digest(task: dict, binary: bytes) -> str:
+    """
+    Content address of the chunks built by a parse task: the source file, the page range and every setting the
+    chunks and their embeddings depend on, but neither the document nor the knowledge base.
+    """
+    hasher = xxhash.xxh64(binary)
+    parser_config = {k: v for k, v in task["parser_config"].items() if k not in ["raptor", "graphrag"]}
+    kb_parser_config = {k: task["kb_parser_config"].get(k) for k in ["tag_kb_ids", "topn_tags"]}
+    for field in ["name", "parser_id", "language", "embd_id", "llm_id", "img2txt_id", "asr_id", "from_page", "to_page"]:
+        hasher.update(str(task.get(field, "")).encode("utf-8"))
+    hasher.update(json.dumps([parser_config, kb_parser_config], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return hasher.hexdigest()
@@ -14,7 +14,7 @@ from api.apps import app
 from api.db.db_models import init_database_tables as init_web_db
 from api.db.init_data import init_llm_factory
 from api.db.runtime_config import RuntimeConfig
-from api.db.services.document_service import DocumentService
+from api.db.services.document_service import DocumentService, DocumentProgressAggregator
 from api.utils import show_configs
 from api.utils.log_utils import initRootLogger
 from api.versions import get_ragflow_version
@@ -25,19 +25,36 @@ initRootLogger("ragflow_server")
 
 stop_event = threading.Event()
 
+# Seconds between two full recomputations of the unfinished documents' progress, a safety net for lost events.
+PROGRESS_RECONCILE_INTERVAL = int(os.environ.get("PROGRESS_RECONCILE_INTERVAL", "60"))
+
 
 def update_progress():
+    """
+    The server holding the lock aggregates the progress events of the task executors, and recomputes
+    every unfinished document once per PROGRESS_RECONCILE_INTERVAL.
+    """
     redis_lock = RedisDistributedLock("update_progress", timeout=60)
+    aggregator = DocumentProgressAggregator()
     while not stop_event.is_set():
         try:
             if not redis_lock.acquire():
                 continue
-            DocumentService.update_progress()
-            stop_event.wait(6)
+            try:
+                last_reconcile = 0
+                while not stop_event.is_set():
+                    aggregator.consume()
+                    if time.time() - last_reconcile > PROGRESS_RECONCILE_INTERVAL:
+                        DocumentService.update_progress()
+                        aggregator.reset()
+                        last_reconcile = time.time()
+                    redis_lock.reacquire()
+            finally:
+                aggregator.reset()
+                redis_lock.release()
         except Exception:
             logging.exception("update_progress exception")
-        finally:
-            redis_lock.release()
+            stop_event.wait(1)
 
 
 def signal_handler(sig, frame):
@@ -15,6 +15,7 @@
 #
 import base64
 import json
+import logging
 import os
 import re
 import sys
@@ -229,6 +230,19 @@ def thumbnail_img(filename, blob):
     return None
 
 
+def pdf_page_count(blob):
+    """Number of pages of a PDF, None if it can't be read."""
+    try:
+        with sys.modules[LOCK_KEY_pdfplumber]:
+            pdf = pdfplumber.open(BytesIO(blob))
+            pages = len(pdf.pages)
+        pdf.close()
+        return pages
+    except Exception:
+        logging.exception("pdf_page_count got exception")
+        return None
+
+
 def thumbnail(filename, blob):
     img = thumbnail_img(filename, blob)
     if img is not None:
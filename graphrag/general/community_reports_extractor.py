@@ -8,8 +8,9 @@ Reference:
 import logging
 import json
 import re
+from collections import defaultdict
 from typing import Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import networkx as nx
 import pandas as pd
 from graphrag.general import leiden
@@ -17,10 +18,14 @@ from graphrag.general.community_report_prompt import COMMUNITY_REPORT_PROMPT
 from graphrag.general.extractor import Extractor
 from graphrag.general.leiden import add_community_info2graph
 from rag.llm.chat_model import Base as CompletionLLM
-from graphrag.utils import perform_variable_replacements, dict_has_keys_with_types, chat_limiter
+from graphrag.utils import perform_variable_replacements, dict_has_keys_with_types, chat_limiter, run_in_process, \
+    community_key
 from rag.utils import num_tokens_from_string
 import trio
 
+# Max entity names per bulk query when prefetching community members.
+COMMUNITY_PREFETCH_BATCH = 1024
+
 
 @dataclass
 class CommunityReportsResult:
@@ -28,6 +33,8 @@ class CommunityReportsResult:
 
     output: list[str]
     structured_output: list[dict]
+    # report id -> current weight of the community it was carried over for
+    reused: dict[str, float] = field(default_factory=dict)
 
 
 class CommunityReportsExtractor(Extractor):
@@ -52,26 +59,41 @@ class CommunityReportsExtractor(Extractor):
         self._extraction_prompt = COMMUNITY_REPORT_PROMPT
         self._max_report_length = max_report_length or 1500
 
-    async def __call__(self, graph: nx.Graph, callback: Callable | None = None):
+    async def __call__(self, graph: nx.Graph, callback: Callable | None = None, existing_reports: dict[str, dict] | None = None):
+        """`existing_reports` maps `community_key` of already reported communities to their report chunk `id` and `title`.
+        Communities whose entities and relations didn't change are carried over instead of being summarized again."""
         for node_degree in graph.degree:
             graph.nodes[str(node_degree[0])]["rank"] = int(node_degree[1])
 
-        communities: dict[str, dict[str, list]] = leiden.run(graph, {})
+        communities, graph.graph[leiden.LEIDEN_CACHE_KEY] = await run_in_process(
+            leiden.run_incremental, graph, {"previous": graph.graph.get(leiden.LEIDEN_CACHE_KEY)})
         total = sum([len(comm.items()) for _, comm in communities.items()])
+        existing_reports = existing_reports or {}
+        entities, relations = await trio.to_thread.run_sync(lambda: self._prefetch(communities))
         res_str = []
         res_dict = []
+        reused = {}
         over, token_count = 0, 0
-        async def extract_community_report(community):
+        async def extract_community_report(level, community):
             nonlocal res_str, res_dict, over, token_count
             cm_id, ents = community
             weight = ents["weight"]
             ents = ents["nodes"]
-            ent_df = pd.DataFrame(self._get_entity_(ents)).dropna()
+            members = set(ents)
+            ent_list = [entities[n] for n in ents if n in entities]
+            rela_list = [r for n in ents for r in relations.get(n, []) if r["tgt_id"] in members]
+            ck = community_key(level, ent_list, rela_list)
+            report = existing_reports.get(ck)
+            if report:
+                add_community_info2graph(graph, ents, report["title"])
+                reused[report["id"]] = weight
+                return
+            ent_df = pd.DataFrame(ent_list).dropna()
             if ent_df.empty or "entity_name" not in ent_df.columns:
                 return
             ent_df["entity"] = ent_df["entity_name"]
             del ent_df["entity_name"]
-            rela_df = pd.DataFrame(self._get_relation_(list(ent_df["entity"]), list(ent_df["entity"]), 10000))
+            rela_df = pd.DataFrame(rela_list)
             if rela_df.empty:
                 return
             rela_df["source"] = rela_df["src_id"]
@@ -109,6 +131,7 @@ class CommunityReportsExtractor(Extractor):
                 return
             response["weight"] = weight
             response["entities"] = ents
+            response["hash"] = ck
             add_community_info2graph(graph, ents, response["title"])
             res_str.append(self._get_text_output(response))
             res_dict.append(response)
@@ -121,15 +144,51 @@ class CommunityReportsExtractor(Extractor):
             for level, comm in communities.items():
                 logging.info(f"Level {level}: Community: {len(comm.keys())}")
                 for community in comm.items():
-                    nursery.start_soon(lambda: extract_community_report(community))
+                    nursery.start_soon(extract_community_report, level, community)
         if callback:
-            callback(msg=f"Community reports done in {trio.current_time() - st:.2f}s, used tokens: {token_count}")
+            callback(msg=f"Community reports done in {trio.current_time() - st:.2f}s, {len(reused)} unchanged, used tokens: {token_count}")
 
         return CommunityReportsResult(
             structured_output=res_dict,
             output=res_str,
+            reused=reused,
         )
 
+    def _prefetch(self, communities: dict[int, dict[str, dict]]) -> tuple[dict[str, dict], dict[str, list[dict]]]:
+        """Fetch entities and relations of all communities with a few bulk queries instead of two per community.
+        Returns entities by name and relations by source entity."""
+        names = sorted({n for comm in communities.values() for c in comm.values() for n in c["nodes"]})
+        entities = {}
+        for i in range(0, len(names), COMMUNITY_PREFETCH_BATCH):
+            for ent in self._get_entity_(names[i:i + COMMUNITY_PREFETCH_BATCH]) or []:
+                if "entity_name" in ent:
+                    entities[ent["entity_name"]] = ent
+
+        # Relations are only needed inside a community, so a batch made of whole communities
+        # of the same level gets all of them with one query.
+        relations = {}
+        for comm in communities.values():
+            batch = []
+            for c in sorted(comm.values(), key=lambda c: len(c["nodes"])):
+                if batch and len(batch) + len(c["nodes"]) > COMMUNITY_PREFETCH_BATCH:
+                    relations.update(self._fetch_relations(batch))
+                    batch = []
+                batch.extend(c["nodes"])
+            if batch:
+                relations.update(self._fetch_relations(batch))
+
+        rels_by_src = defaultdict(list)
+        for rel in relations.values():
+            rels_by_src[rel["src_id"]].append(rel)
+        return entities, rels_by_src
+
+    def _fetch_relations(self, names: list[str]) -> dict[tuple[str, str], dict]:
+        res = {}
+        for rel in self._get_relation_(list(names), [], 10000) or []:
+            if "src_id" in rel and "tgt_id" in rel:
+                res[(rel["src_id"], rel["tgt_id"])] = rel
+        return res
+
     def _get_text_output(self, parsed_output: dict) -> str:
         title = parsed_output.get("title", "Report")
         summary = parsed_output.get("summary", "")
@@ -14,6 +14,7 @@
 #  limitations under the License.
 #
 import logging
+import os
 import re
 from collections import defaultdict, Counter
 from copy import deepcopy
@@ -25,11 +26,17 @@ from graphrag.utils import get_llm_cache, set_llm_cache, handle_single_entity_ex
     handle_single_relationship_extraction, split_string_by_multi_markers, flat_uniq_list, chat_limiter
 from rag.llm.chat_model import Base as CompletionLLM
 from rag.prompts import message_fit_in
-from rag.utils import truncate
+from rag.utils import truncate, num_tokens_from_string
 
 GRAPH_FIELD_SEP = "<SEP>"
 DEFAULT_ENTITY_TYPES = ["organization", "person", "geo", "event", "category"]
 ENTITY_EXTRACTION_MAX_GLEANINGS = 2
+# Small chunks are packed together into one extraction prompt up to this many tokens.
+ENTITY_EXTRACTION_BATCH_TOKENS = int(os.environ.get("GRAPHRAG_EXTRACTION_BATCH_TOKENS", 2048))
+# Gleaning stops once a round contributes less than this share of new entities/relations.
+ENTITY_EXTRACTION_MIN_GLEANING_YIELD = float(os.environ.get("GRAPHRAG_MIN_GLEANING_YIELD", 0.1))
+# Chat slots one document may hold at a time, so a large document can't starve the others.
+MAX_CONCURRENT_CHATS_PER_DOC = int(os.environ.get("MAX_CONCURRENT_CHATS_PER_DOC", max(1, chat_limiter.total_tokens // 2)))
 
 
 class Extractor:
@@ -52,6 +59,7 @@ class Extractor:
         self._set_entity_ = set_entity
         self._get_relation_ = get_relation
         self._set_relation_ = set_relation
+        self.token_usage = defaultdict(int)
 
     def _chat(self, system, history, gen_conf):
         hist = deepcopy(history)
@@ -92,6 +100,39 @@ class Extractor:
                 )
         return dict(maybe_nodes), dict(maybe_edges)
 
+    def _gleaning_yield(self, chunk_key: str, response: str, seen: set) -> float:
+        """Return the share of entities/relations in `response` not seen in the previous rounds.
+        Used by the graph extractors, which parse `response` with their `_parse_response`."""
+        maybe_nodes, maybe_edges = self._parse_response(chunk_key, response)
+        found = set(maybe_nodes.keys()) | set(maybe_edges.keys())
+        new = found - seen
+        seen.update(found)
+        return len(new) / max(1, len(seen))
+
+    @staticmethod
+    def _batch_chunks(chunks: list[str], batch_tokens: int, max_tokens: int) -> list[str]:
+        """Pack consecutive small chunks into prompts of at most `batch_tokens` tokens.
+        Chunks larger than that are sent on their own, truncated to `max_tokens`."""
+        batches = []
+        buf, buf_tokens = [], 0
+        for ck in chunks:
+            tks = num_tokens_from_string(ck)
+            if tks >= batch_tokens:
+                batches.append(truncate(ck, max_tokens))
+                continue
+            if buf and buf_tokens + tks > batch_tokens:
+                batches.append("\n\n".join(buf))
+                buf, buf_tokens = [], 0
+            buf.append(ck)
+            buf_tokens += tks
+        if buf:
+            batches.append("\n\n".join(buf))
+        return batches
+
+    async def _process_batch(self, chunk_key_dp: tuple[str, str], chunk_seq: int, num_chunks: int, out_results, doc_limiter):
+        async with doc_limiter:
+            await self._process_single_content(chunk_key_dp, chunk_seq, num_chunks, out_results)
+
     async def __call__(
         self, doc_id: str, chunks: list[str],
             callback: Callable | None = None
@@ -100,10 +141,12 @@ class Extractor:
         self.callback = callback
         start_ts = trio.current_time()
         out_results = []
+        max_tokens = int(self._llm.max_length*0.8)
+        batches = self._batch_chunks(chunks, min(ENTITY_EXTRACTION_BATCH_TOKENS, max_tokens), max_tokens)
+        doc_limiter = trio.CapacityLimiter(MAX_CONCURRENT_CHATS_PER_DOC)
         async with trio.open_nursery() as nursery:
-            for i, ck in enumerate(chunks):
-                ck = truncate(ck, int(self._llm.max_length*0.8))
-                nursery.start_soon(lambda: self._process_single_content((doc_id, ck), i, len(chunks), out_results))
+            for i, ck in enumerate(batches):
+                nursery.start_soon(lambda: self._process_batch((doc_id, ck), i, len(batches), out_results, doc_limiter))
 
         maybe_nodes = defaultdict(list)
         maybe_edges = defaultdict(list)
@@ -114,7 +157,9 @@ class Extractor:
             for k, v in m_edges.items():
                 maybe_edges[tuple(sorted(k))].extend(v)
             sum_token_count += token_count
+        self.token_usage[doc_id] += sum_token_count
         now = trio.current_time()
+        logging.info(f"Entities and relationships extraction of doc {doc_id}: {len(chunks)} chunks in {len(batches)} prompts, {sum_token_count} tokens.")
         if callback:
             callback(msg = f"Entities and relationships extraction done, {len(maybe_nodes)} nodes, {len(maybe_edges)} edges, {sum_token_count} tokens, {now-start_ts:.2f}s.")
         start_ts = now
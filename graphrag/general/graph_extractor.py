@@ -11,7 +11,8 @@ from dataclasses import dataclass
 import tiktoken
 import trio
 
-from graphrag.general.extractor import Extractor, ENTITY_EXTRACTION_MAX_GLEANINGS, DEFAULT_ENTITY_TYPES
+from graphrag.general.extractor import Extractor, ENTITY_EXTRACTION_MAX_GLEANINGS, DEFAULT_ENTITY_TYPES, \
+    ENTITY_EXTRACTION_MIN_GLEANING_YIELD
 from graphrag.general.graph_prompt import GRAPH_EXTRACTION_PROMPT, CONTINUE_PROMPT, LOOP_PROMPT
 from graphrag.utils import ErrorHandlerFn, perform_variable_replacements, chat_limiter
 from rag.llm.chat_model import Base as CompletionLLM
@@ -102,6 +103,13 @@ class GraphExtractor(Extractor):
             self._entity_types_key: ",".join(DEFAULT_ENTITY_TYPES),
         }
 
+    def _parse_response(self, chunk_key: str, response: str) -> tuple[dict, dict]:
+        record_delimiter = self._prompt_variables.get(self._record_delimiter_key, DEFAULT_RECORD_DELIMITER)
+        tuple_delimiter = self._prompt_variables.get(self._tuple_delimiter_key, DEFAULT_TUPLE_DELIMITER)
+        records = [re.sub(r"^\(|\)$", "", r.strip()) for r in response.split(record_delimiter)]
+        records = [r for r in records if r.strip()]
+        return self._entities_and_relations(chunk_key, records, tuple_delimiter)
+
     async def _process_single_content(self, chunk_key_dp: tuple[str, str], chunk_seq: int, num_chunks: int, out_results):
         token_count = 0
         chunk_key = chunk_key_dp[0]
@@ -118,6 +126,8 @@ class GraphExtractor(Extractor):
 
         results = response or ""
         history = [{"role": "system", "content": hint_prompt}, {"role": "user", "content": response}]
+        seen = set()
+        self._gleaning_yield(chunk_key, results, seen)
 
         # Repeat to ensure we maximize entity count
         for i in range(self._max_gleanings):
@@ -131,6 +141,9 @@ class GraphExtractor(Extractor):
             # if this is the final glean, don't bother updating the continuation flag
             if i >= self._max_gleanings - 1:
                 break
+            # the round barely added anything new, another one won't pay for its growing history
+            if self._gleaning_yield(chunk_key, response or "", seen) < ENTITY_EXTRACTION_MIN_GLEANING_YIELD:
+                break
             history.append({"role": "assistant", "content": response})
             history.append({"role": "user", "content": LOOP_PROMPT})
             async with chat_limiter:
@@ -138,11 +151,7 @@ class GraphExtractor(Extractor):
             token_count += num_tokens_from_string("\n".join([m["content"] for m in history]) + response)
             if continuation != "YES":
                 break
-        record_delimiter = variables.get(self._record_delimiter_key, DEFAULT_RECORD_DELIMITER)
-        tuple_delimiter = variables.get(self._tuple_delimiter_key, DEFAULT_TUPLE_DELIMITER)
-        records = [re.sub(r"^\(|\)$", "", r.strip()) for r in results.split(record_delimiter)]
-        records = [r for r in records if r.strip()]
-        maybe_nodes, maybe_edges = self._entities_and_relations(chunk_key, records, tuple_delimiter)
+        maybe_nodes, maybe_edges = self._parse_response(chunk_key, results)
         out_results.append((maybe_nodes, maybe_edges, token_count))
         if self.callback:
             self.callback(0.5+0.1*len(out_results)/num_chunks, msg = f"Entities extraction of chunk {chunk_seq} {len(out_results)}/{num_chunks} done, {len(maybe_nodes)} nodes, {len(maybe_edges)} edges, {token_count} tokens.")
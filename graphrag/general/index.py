@@ -173,7 +173,7 @@ async def update_graph(
         )
     )
     now = trio.current_time()
-    callback(msg=f"generated subgraph for doc {doc_id} in {now - start:.2f} seconds.")
+    callback(msg=f"generated subgraph for doc {doc_id} in {now - start:.2f} seconds, {ext.token_usage[doc_id]} tokens.")
     start = now
 
     while True:
@@ -303,7 +303,8 @@ async def extract_community(
         get_relation=partial(get_relation, tenant_id, kb_id),
         set_relation=partial(set_relation, tenant_id, kb_id, embed_bdl),
     )
-    cr = await ext(graph, callback=callback)
+    existing_reports = await get_community_reports(tenant_id, kb_id)
+    cr = await ext(graph, callback=callback, existing_reports=existing_reports)
     community_structure = cr.structured_output
     community_reports = cr.output
     working_doc_id = graphrag_task_get(tenant_id, kb_id)
@@ -319,13 +320,27 @@ async def extract_community(
         msg=f"Graph extracted {len(cr.structured_output)} communities in {now - start:.2f}s."
     )
     start = now
-    await trio.to_thread.run_sync(
-        lambda: settings.docStoreConn.delete(
-            {"knowledge_graph_kwd": "community_report", "kb_id": kb_id},
-            search.index_name(tenant_id),
-            kb_id,
+    reused = cr.reused
+    stale_ids = [r["id"] for r in existing_reports.values() if r["id"] not in reused]
+    if stale_ids:
+        await trio.to_thread.run_sync(
+            lambda: settings.docStoreConn.delete(
+                {"id": stale_ids},
+                search.index_name(tenant_id),
+                kb_id,
+            )
         )
-    )
+    # the content of a carried over community is unchanged, its weight may not be
+    for r in existing_reports.values():
+        if r["id"] in reused and r["weight"] != reused[r["id"]]:
+            await trio.to_thread.run_sync(
+                lambda: settings.docStoreConn.update(
+                    {"id": r["id"]},
+                    {"weight_flt": reused[r["id"]]},
+                    search.index_name(tenant_id),
+                    kb_id,
+                )
+            )
     for stru, rep in zip(community_structure, community_reports):
         obj = {
             "report": rep,
@@ -341,6 +356,7 @@ async def extract_community(
             "knowledge_graph_kwd": "community_report",
             "weight_flt": stru["weight"],
             "entities_kwd": stru["entities"],
+            "community_hash_kwd": stru["hash"],
             "important_kwd": stru["entities"],
             "kb_id": kb_id,
             "source_id": doc_ids,
@@ -362,6 +378,28 @@ async def extract_community(
 
     now = trio.current_time()
     callback(
-        msg=f"Graph indexed {len(cr.structured_output)} communities in {now - start:.2f}s."
+        msg=f"Graph indexed {len(cr.structured_output)} communities in {now - start:.2f}s, kept {len(reused)} unchanged reports."
     )
     return community_structure, community_reports
+
+
+async def get_community_reports(tenant_id: str, kb_id: str) -> dict[str, dict]:
+    """Existing community reports of the KB, keyed by the content hash of their community."""
+    fields = ["docnm_kwd", "community_hash_kwd", "weight_flt"]
+    res = await trio.to_thread.run_sync(
+        lambda: settings.retrievaler.search(
+            {"knowledge_graph_kwd": "community_report", "size": 10000, "fields": fields},
+            search.index_name(tenant_id),
+            [kb_id],
+        )
+    )
+    reports = {}
+    for id in res.ids:
+        # reports indexed before hashing was introduced can't be matched, they are regenerated
+        ck = res.field[id].get("community_hash_kwd") or f"unhashed:{id}"
+        # neither can the reports sharing a hash, indexed before the Leiden level was part of it
+        if ck in reports:
+            ck = f"duplicate:{id}"
+        reports[ck] = {"id": id, "title": res.field[id].get("docnm_kwd", ""),
+                       "weight": float(res.field[id].get("weight_flt") or 0)}
+    return reports
@@ -7,12 +7,19 @@ Reference:
 
 import logging
 import html
+import os
+from collections import Counter
 from typing import Any, cast
 from graspologic.partition import hierarchical_leiden
 from graspologic.utils import largest_connected_component
 import networkx as nx
 from networkx import is_empty
 
+# Key of the graph attribute holding the previous partition, used to warm start the next run.
+LEIDEN_CACHE_KEY = "leiden"
+# Relative change of nodes/edges below which the previous partition is reused as is.
+LEIDEN_DELTA_THRESHOLD = float(os.environ.get("GRAPHRAG_LEIDEN_DELTA_THRESHOLD", 0.02))
+
 
 def _stabilize_graph(graph: nx.Graph) -> nx.Graph:
     """Ensure an undirected graph with the same relationships will always be read the same way."""
@@ -69,31 +76,79 @@ def stable_largest_connected_component(graph: nx.Graph) -> nx.Graph:
     return _stabilize_graph(graph)
 
 
+def _graph_delta(graph: nx.Graph, previous: dict) -> float:
+    """Relative change of the graph since the partition in `previous` was computed."""
+    prev_nodes = set()
+    for partition in previous["levels"].values():
+        prev_nodes.update(partition.keys())
+    delta = len(prev_nodes.symmetric_difference(graph.nodes())) + abs(graph.number_of_edges() - previous["edges"])
+    return delta / max(1, len(prev_nodes) + previous["edges"])
+
+
+def _extend_partition(graph: nx.Graph, partition: dict[str, int]) -> dict[str, int]:
+    """Drop vanished nodes from `partition` and put new nodes into the most common community of their neighbours."""
+    result = {n: c for n, c in partition.items() if n in graph}
+    next_id = max(partition.values(), default=-1) + 1
+    for n in sorted(graph.nodes()):
+        if n in result:
+            continue
+        neighbours = Counter(result[nb] for nb in graph.neighbors(n) if nb in result)
+        if neighbours:
+            result[n] = neighbours.most_common(1)[0][0]
+        else:
+            result[n] = next_id
+            next_id += 1
+    return result
+
+
 def _compute_leiden_communities(
         graph: nx.Graph | nx.DiGraph,
         max_cluster_size: int,
         use_lcc: bool,
         seed=0xDEADBEEF,
-) -> dict[int, dict[str, int]]:
-    """Return Leiden root communities."""
+        previous: dict | None = None,
+) -> tuple[dict[int, dict[str, int]], dict | None]:
+    """Return Leiden root communities, together with the cache to warm start the next computation."""
     results: dict[int, dict[str, int]] = {}
     if is_empty(graph):
-        return results
+        return results, None
     if use_lcc:
         graph = stable_largest_connected_component(graph)
 
+    if previous and previous.get("max_cluster_size") == max_cluster_size and previous.get("levels"):
+        if _graph_delta(graph, previous) <= LEIDEN_DELTA_THRESHOLD:
+            logging.info("Graph barely changed, reuse the previous Leiden partition.")
+            for level, partition in previous["levels"].items():
+                results[int(level)] = _extend_partition(graph, partition)
+            return results, previous
+        starting_communities = _extend_partition(graph, previous["levels"][min(previous["levels"].keys(), key=int)])
+    else:
+        starting_communities = None
+
     community_mapping = hierarchical_leiden(
-        graph, max_cluster_size=max_cluster_size, random_seed=seed
+        graph, max_cluster_size=max_cluster_size, random_seed=seed, starting_communities=starting_communities
     )
     for partition in community_mapping:
         results[partition.level] = results.get(partition.level, {})
         results[partition.level][partition.node] = partition.cluster
 
-    return results
+    cache = {
+        "max_cluster_size": max_cluster_size,
+        "edges": graph.number_of_edges(),
+        # levels as str, the cache goes through JSON along with the graph
+        "levels": {str(level): partition for level, partition in results.items()},
+    }
+    return results, cache
 
 
 def run(graph: nx.Graph, args: dict[str, Any]) -> dict[int, dict[str, dict]]:
     """Run method definition."""
+    return run_incremental(graph, args)[0]
+
+
+def run_incremental(graph: nx.Graph, args: dict[str, Any]) -> tuple[dict[int, dict[str, dict]], dict | None]:
+    """Same as `run`, warm started from `args["previous"]`.
+    Also returns the cache to pass as `previous` next time."""
     max_cluster_size = args.get("max_cluster_size", 12)
     use_lcc = args.get("use_lcc", True)
     if args.get("verbose", False):
@@ -101,13 +156,14 @@ def run(graph: nx.Graph, args: dict[str, Any]) -> dict[int, dict[str, dict]]:
             "Running leiden with max_cluster_size=%s, lcc=%s", max_cluster_size, use_lcc
         )
     if not graph.nodes():
-        return {}
+        return {}, None
 
-    node_id_to_community_map = _compute_leiden_communities(
+    node_id_to_community_map, cache = _compute_leiden_communities(
         graph=graph,
         max_cluster_size=max_cluster_size,
         use_lcc=use_lcc,
         seed=args.get("seed", 0xDEADBEEF),
+        previous=args.get("previous"),
     )
     levels = args.get("levels")
 
@@ -137,7 +193,7 @@ def run(graph: nx.Graph, args: dict[str, Any]) -> dict[int, dict[str, dict]]:
         for _, comm in result.items():
             comm["weight"] /= max_weight
 
-    return results_by_level
+    return results_by_level, cache
 
 
 def add_community_info2graph(graph: nx.Graph, nodes: list[str], community_title):
@@ -0,0 +1,122 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+N-hop neighbourhood paths of every entity, computed on a CSR adjacency with numpy.
+
+Only depends on numpy and networkx so that it is cheap to import in a worker process.
+"""
+import os
+
+import networkx as nx
+import numpy as np
+
+# Max neighbours followed from each node, the heaviest edges first.
+N_HOP_FAN_OUT = int(os.environ.get("GRAPHRAG_N_HOP_FAN_OUT", 16))
+# Source nodes expanded at once, bounds the memory of the path arrays.
+N_HOP_BLOCK_SIZE = 4096
+
+
+def graph_to_arrays(graph: nx.Graph) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten a graph into node names and edge arrays (source index, target index, weight)."""
+    names = list(graph.nodes())
+    index = {n: i for i, n in enumerate(names)}
+    src = np.empty(graph.number_of_edges(), dtype=np.int64)
+    dst = np.empty(graph.number_of_edges(), dtype=np.int64)
+    wts = np.empty(graph.number_of_edges(), dtype=np.float64)
+    for i, (f, t, w) in enumerate(graph.edges(data="weight", default=0)):
+        src[i], dst[i], wts[i] = index[f], index[t], w
+    return names, src, dst, wts
+
+
+def _capped_adjacency(num_nodes: int, src: np.ndarray, dst: np.ndarray, wts: np.ndarray, fan_out: int):
+    """Build the symmetric CSR adjacency and keep the `fan_out` heaviest neighbours of each node,
+    as padded (num_nodes, fan_out) arrays of neighbour indices (-1 for none) and edge weights."""
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    data = np.concatenate([wts, wts])
+    keep = rows != cols
+    rows, cols, data = rows[keep], cols[keep], data[keep]
+
+    order = np.lexsort((cols, -data, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+
+    rank = np.arange(len(rows)) - indptr[rows]
+    keep = rank < fan_out
+    nbrs = np.full((num_nodes, fan_out), -1, dtype=np.int64)
+    nbr_wts = np.zeros((num_nodes, fan_out), dtype=np.float64)
+    nbrs[rows[keep], rank[keep]] = cols[keep]
+    nbr_wts[rows[keep], rank[keep]] = data[keep]
+    return nbrs, nbr_wts
+
+
+def _expand(paths: np.ndarray, weights: np.ndarray, nbrs: np.ndarray, nbr_wts: np.ndarray):
+    """Extend every path by one edge. Edges already on a path are not walked again,
+    and paths which can't be extended or already closed a cycle are kept as they are."""
+    last = paths[:, -1]
+    cand = nbrs[last]
+    cand_wts = nbr_wts[last]
+    valid = cand >= 0
+    if paths.shape[1] > 1:
+        closed = (paths[:, :-1] == last[:, None]).any(axis=1)
+        valid &= ~closed[:, None]
+        for i in range(paths.shape[1] - 1):
+            a, b = paths[:, i:i + 1], paths[:, i + 1:i + 2]
+            valid &= ~(((a == last[:, None]) & (b == cand)) | ((b == last[:, None]) & (a == cand)))
+
+    stuck = ~valid.any(axis=1)
+    row, col = np.nonzero(valid)
+    grown = np.concatenate([paths[row], cand[row, col][:, None]], axis=1)
+    grown_wts = np.concatenate([weights[row], cand_wts[row, col][:, None]], axis=1)
+    # pad the stuck ones so all paths keep the same width, padding is stripped when formatting
+    kept = np.concatenate([paths[stuck], np.full((stuck.sum(), 1), -1, dtype=np.int64)], axis=1)
+    kept_wts = np.concatenate([weights[stuck], np.zeros((stuck.sum(), 1))], axis=1)
+    return np.concatenate([grown, kept]), np.concatenate([grown_wts, kept_wts])
+
+
+def n_hop_paths(names: list[str], src: np.ndarray, dst: np.ndarray, wts: np.ndarray, n_hop: int,
+                fan_out: int = N_HOP_FAN_OUT) -> dict[str, list[dict]]:
+    """Paths of up to `n_hop` edges starting from every node, in the `n_hop_with_weight` format:
+    {node: [{"path": [node, ...], "weights": [edge weight, ...]}, ...]}"""
+    num_nodes = len(names)
+    res = {n: [] for n in names}
+    if not num_nodes or not len(src) or n_hop < 1:
+        return res
+    nbrs, nbr_wts = _capped_adjacency(num_nodes, src, dst, wts, fan_out)
+
+    for start in range(0, num_nodes, N_HOP_BLOCK_SIZE):
+        sources = np.arange(start, min(start + N_HOP_BLOCK_SIZE, num_nodes))
+        valid = nbrs[sources] >= 0
+        row, col = np.nonzero(valid)
+        paths = np.stack([sources[row], nbrs[sources][row, col]], axis=1)
+        weights = nbr_wts[sources][row, col][:, None]
+        for _ in range(n_hop - 1):
+            # padded (stuck) paths end with -1, expand only the live ones
+            live = paths[:, -1] >= 0
+            grown, grown_wts = _expand(paths[live], weights[live], nbrs, nbr_wts)
+            dead = np.concatenate([paths[~live], np.full(((~live).sum(), 1), -1, dtype=np.int64)], axis=1)
+            dead_wts = np.concatenate([weights[~live], np.zeros(((~live).sum(), 1))], axis=1)
+            paths, weights = np.concatenate([grown, dead]), np.concatenate([grown_wts, dead_wts])
+
+        for p, w in zip(paths.tolist(), weights.tolist()):
+            hops = len(p) - p.count(-1) - 1
+            res[names[p[0]]].append({"path": [names[i] for i in p[:hops + 1]], "weights": w[:hops]})
+    return res
+
+
+def graph_n_hop_paths(graph: nx.Graph, n_hop: int, fan_out: int = N_HOP_FAN_OUT) -> dict[str, list[dict]]:
+    return n_hop_paths(*graph_to_arrays(graph), n_hop, fan_out)
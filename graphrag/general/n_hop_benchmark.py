@@ -0,0 +1,102 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Benchmark of the n-hop path precomputation on a random weighted graph.
+
+    python -m graphrag.general.n_hop_benchmark --nodes 40000 --edges 100000 --n_hop 2
+
+The previous implementation (per path list scans with `deepcopy` and
+`nx.get_edge_attributes` per path) is timed on a sample of nodes and extrapolated.
+"""
+import argparse
+import random
+import time
+from copy import deepcopy
+
+import networkx as nx
+
+from graphrag.general.n_hop import graph_n_hop_paths
+
+
+def _legacy_n_neighbor(graph, id, n_hop):
+    def is_continuous_subsequence(subseq, seq):
+        for idx, v in enumerate(seq[:-1]):
+            if v == subseq[0] and seq[idx + 1] == subseq[-1]:
+                return True
+        return False
+
+    def merge_tuples(list1, list2):
+        result = []
+        for tup in list1:
+            if tup[-1] in tup[:-1]:
+                result.append(tup)
+                continue
+            matched = False
+            for match in [t for t in list2 if t[0] == tup[-1]]:
+                if is_continuous_subsequence(match, tup) or is_continuous_subsequence((match[1], match[0]), tup):
+                    continue
+                matched = True
+                result.append(tup + match[1:])
+            if not matched:
+                result.append(tup)
+        return result
+
+    source_edge = list(graph.edges(id))
+    for _ in range(n_hop - 1):
+        sc_edge = deepcopy(source_edge)
+        source_edge = []
+        for pair in sc_edge:
+            source_edge.extend(merge_tuples([pair], list(graph.edges(pair[-1]))))
+    nbrs = []
+    for path in source_edge:
+        wts = nx.get_edge_attributes(graph, "weight")
+        nbrs.append({"path": path, "weights": [wts.get((path[i], path[i + 1]), 0) for i in range(len(path) - 1)]})
+    return nbrs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=40000)
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--n_hop", type=int, default=2)
+    parser.add_argument("--fan_out", type=int, default=16)
+    parser.add_argument("--legacy_sample", type=int, default=20, help="Nodes timed with the previous implementation")
+    args = parser.parse_args()
+
+    random.seed(0)
+    graph = nx.gnm_random_graph(args.nodes, args.edges, seed=0)
+    graph = nx.relabel_nodes(graph, {i: f"ENTITY {i}" for i in graph.nodes()})
+    for f, t in graph.edges():
+        graph[f][t]["weight"] = random.randint(1, 10)
+
+    st = time.perf_counter()
+    res = graph_n_hop_paths(graph, args.n_hop, args.fan_out)
+    elapsed = time.perf_counter() - st
+    print(f"CSR n-hop: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges, "
+          f"{sum(len(v) for v in res.values())} paths in {elapsed:.2f}s")
+
+    if args.legacy_sample > 0:
+        sample = random.sample(list(graph.nodes()), min(args.legacy_sample, graph.number_of_nodes()))
+        st = time.perf_counter()
+        for n in sample:
+            _legacy_n_neighbor(graph, n, args.n_hop)
+        per_node = (time.perf_counter() - st) / len(sample)
+        print(f"Previous implementation: {per_node * 1000:.1f}ms per node, "
+              f"~{per_node * graph.number_of_nodes():.0f}s estimated for the whole graph")
+
+
+if __name__ == "__main__":
+    main()
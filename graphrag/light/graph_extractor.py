@@ -7,7 +7,7 @@ Reference:
 import re
 from typing import Any, Callable
 from dataclasses import dataclass
-from graphrag.general.extractor import Extractor, ENTITY_EXTRACTION_MAX_GLEANINGS
+from graphrag.general.extractor import Extractor, ENTITY_EXTRACTION_MAX_GLEANINGS, ENTITY_EXTRACTION_MIN_GLEANING_YIELD
 from graphrag.light.graph_prompt import PROMPTS
 from graphrag.utils import pack_user_ass_to_openai_messages, split_string_by_multi_markers, chat_limiter
 from rag.llm.chat_model import Base as CompletionLLM
@@ -82,6 +82,19 @@ class GraphExtractor(Extractor):
         )
         self._left_token_count = max(llm_invoker.max_length * 0.6, self._left_token_count)
 
+    def _parse_response(self, chunk_key: str, response: str) -> tuple[dict, dict]:
+        records = split_string_by_multi_markers(
+            response,
+            [self._context_base["record_delimiter"], self._context_base["completion_delimiter"]],
+        )
+        rcds = []
+        for record in records:
+            record = re.search(r"\((.*)\)", record)
+            if record is None:
+                continue
+            rcds.append(record.group(1))
+        return self._entities_and_relations(chunk_key, rcds, self._context_base["tuple_delimiter"])
+
     async def _process_single_content(self, chunk_key_dp: tuple[str, str], chunk_seq: int, num_chunks: int, out_results):
         token_count = 0
         chunk_key = chunk_key_dp[0]
@@ -95,6 +108,8 @@ class GraphExtractor(Extractor):
             final_result = await trio.to_thread.run_sync(lambda: self._chat(hint_prompt, [{"role": "user", "content": "Output:"}], gen_conf))
         token_count += num_tokens_from_string(hint_prompt + final_result)
         history = pack_user_ass_to_openai_messages("Output:", final_result, self._continue_prompt)
+        seen = set()
+        self._gleaning_yield(chunk_key, final_result, seen)
         for now_glean_index in range(self._max_gleanings):
             async with chat_limiter:
                 glean_result = await trio.to_thread.run_sync(lambda: self._chat(hint_prompt, history, gen_conf))
@@ -103,6 +118,9 @@ class GraphExtractor(Extractor):
             final_result += glean_result
             if now_glean_index == self._max_gleanings - 1:
                 break
+            # the round barely added anything new, another one won't pay for its growing history
+            if self._gleaning_yield(chunk_key, glean_result, seen) < ENTITY_EXTRACTION_MIN_GLEANING_YIELD:
+                break
 
             async with chat_limiter:
                 if_loop_result = await trio.to_thread.run_sync(lambda: self._chat(self._if_loop_prompt, history, gen_conf))
@@ -111,18 +129,7 @@ class GraphExtractor(Extractor):
             if if_loop_result != "yes":
                 break
 
-        records = split_string_by_multi_markers(
-            final_result,
-            [self._context_base["record_delimiter"], self._context_base["completion_delimiter"]],
-        )
-        rcds = []
-        for record in records:
-            record = re.search(r"\((.*)\)", record)
-            if record is None:
-                continue
-            rcds.append(record.group(1))
-        records = rcds
-        maybe_nodes, maybe_edges = self._entities_and_relations(chunk_key, records, self._context_base["tuple_delimiter"])
+        maybe_nodes, maybe_edges = self._parse_response(chunk_key, final_result)
         out_results.append((maybe_nodes, maybe_edges, token_count))
         if self.callback:
             self.callback(0.5+0.1*len(out_results)/num_chunks, msg = f"Entities extraction of chunk {chunk_seq} {len(out_results)}/{num_chunks} done, {len(maybe_nodes)} nodes, {len(maybe_edges)} edges, {token_count} tokens.")
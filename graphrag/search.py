@@ -15,7 +15,9 @@
 #
 import json
 import logging
+import os
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import json_repair
 import pandas as pd
@@ -24,10 +26,13 @@ from api.utils import get_uuid
 from graphrag.query_analyze_prompt import PROMPTS
 from graphrag.utils import get_entity_type2sampels, get_llm_cache, set_llm_cache, get_relation
 from rag.utils import num_tokens_from_string
-from rag.utils.doc_store_conn import OrderByExpr
+from rag.utils.doc_store_conn import OrderByExpr, MatchDenseExpr
 
 from rag.nlp.search import Dealer, index_name
 
+# Shared by all KG retrievals to run their independent searches concurrently.
+_search_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("KG_SEARCH_THREADS", 16)))
+
 
 class KGSearch(Dealer):
     def _chat(self, llm_bdl, system, history, gen_conf):
@@ -102,23 +107,25 @@ class KGSearch(Dealer):
             }
         return res
 
-    def get_relevant_ents_by_keywords(self, keywords, filters, idxnms, kb_ids, emb_mdl, sim_thr=0.3, N=56):
+    def get_relevant_ents_by_keywords(self, keywords, filters, idxnms, kb_ids, emb_mdl, sim_thr=0.3, N=56, matchDense=None):
         if not keywords:
             return {}
         filters = deepcopy(filters)
         filters["knowledge_graph_kwd"] = "entity"
-        matchDense = self.get_vector(", ".join(keywords), emb_mdl, topk=1024, similarity=sim_thr)
-        es_res = self.dataStore.search(["content_with_weight", "entity_kwd", "rank_flt"], [], filters, [matchDense],
+        if matchDense is None:
+            matchDense = self.get_vector(", ".join(keywords), emb_mdl, topk=1024, similarity=sim_thr)
+        es_res = self.dataStore.search(["content_with_weight", "entity_kwd", "rank_flt", "n_hop_with_weight"], [], filters, [matchDense],
                                        OrderByExpr(), 0, N,
                                        idxnms, kb_ids)
         return self._ent_info_from_(es_res, sim_thr)
 
-    def get_relevant_relations_by_txt(self, txt, filters, idxnms, kb_ids, emb_mdl, sim_thr=0.3, N=56):
+    def get_relevant_relations_by_txt(self, txt, filters, idxnms, kb_ids, emb_mdl, sim_thr=0.3, N=56, matchDense=None):
         if not txt:
             return {}
         filters = deepcopy(filters)
         filters["knowledge_graph_kwd"] = "relation"
-        matchDense = self.get_vector(txt, emb_mdl, topk=1024, similarity=sim_thr)
+        if matchDense is None:
+            matchDense = self.get_vector(txt, emb_mdl, topk=1024, similarity=sim_thr)
         es_res = self.dataStore.search(
             ["content_with_weight", "_score", "from_entity_kwd", "to_entity_kwd", "weight_int"],
             [], filters, [matchDense], OrderByExpr(), 0, N, idxnms, kb_ids)
@@ -153,18 +160,34 @@ class KGSearch(Dealer):
         if isinstance(tenant_ids, str):
             tenant_ids = tenant_ids.split(",")
         idxnms = [index_name(tid) for tid in tenant_ids]
+
+        def question_relations():
+            qv = self.get_vector(qst, emb_mdl, topk=1024, similarity=rel_sim_threshold)
+            return qv, self.get_relevant_relations_by_txt(qst, filters, idxnms, kb_ids, emb_mdl, rel_sim_threshold, matchDense=qv)
+
+        # Doesn't depend on the query rewriting, so it runs along with the LLM call.
+        rels_future = _search_pool.submit(question_relations)
         ty_kwds = []
         try:
-            ty_kwds, ents = self.query_rewrite(llm, qst, [index_name(tid) for tid in tenant_ids], kb_ids)
+            ty_kwds, ents = self.query_rewrite(llm, qst, idxnms, kb_ids)
             logging.info(f"Q: {qst}, Types: {ty_kwds}, Entities: {ents}")
         except Exception as e:
             logging.exception(e)
             ents = [qst]
             pass
 
-        ents_from_query = self.get_relevant_ents_by_keywords(ents, filters, idxnms, kb_ids, emb_mdl, ent_sim_threshold)
-        ents_from_types = self.get_relevant_ents_by_types(ty_kwds, filters, idxnms, kb_ids, 10000)
-        rels_from_txt = self.get_relevant_relations_by_txt(qst, filters, idxnms, kb_ids, emb_mdl, rel_sim_threshold)
+        ent_vector = None
+        if ents == [qst]:
+            # same text as the question, reuse its embedding
+            qv, _ = rels_future.result()
+            ent_vector = MatchDenseExpr(qv.vector_column_name, qv.embedding_data, "float", "cosine", 1024,
+                                        {"similarity": ent_sim_threshold})
+        ents_future = _search_pool.submit(self.get_relevant_ents_by_keywords, ents, filters, idxnms, kb_ids, emb_mdl,
+                                          ent_sim_threshold, matchDense=ent_vector)
+        types_future = _search_pool.submit(self.get_relevant_ents_by_types, ty_kwds, filters, idxnms, kb_ids, 10000)
+        ents_from_query = ents_future.result()
+        ents_from_types = types_future.result()
+        _, rels_from_txt = rels_future.result()
         nhop_pathes = defaultdict(dict)
         for _, ent in ents_from_query.items():
             nhops = ent.get("n_hop_ents", [])
@@ -235,15 +258,10 @@ class KGSearch(Dealer):
                 ents = ents[:-1]
                 break
 
+        self._fill_relation_descriptions(rels_from_txt, tenant_ids, kb_ids)
         for (f, t), rel in rels_from_txt:
             if not rel.get("description"):
-                for tid in tenant_ids:
-                    rela = get_relation(tid, kb_ids, f, t)
-                    if rela:
-                        break
-                else:
-                    continue
-                rel["description"] = rela["description"]
+                continue
             desc = rel["description"]
             try:
                 desc = json.loads(desc).get("description", "")
@@ -286,6 +304,20 @@ class KGSearch(Dealer):
                 "positions": [],
             }
 
+    def _fill_relation_descriptions(self, rels, tenant_ids, kb_ids):
+        """Fetch the descriptions of relations found only through n-hop paths, with one query per tenant."""
+        missing = {tuple(sorted(pair)): rel for pair, rel in rels if not rel.get("description")}
+        if not missing:
+            return
+        ents = list(set([e for pair in missing.keys() for e in pair]))
+        for tid in tenant_ids:
+            for rela in get_relation(tid, kb_ids, list(ents), [], min(10000, max(2, len(ents) * len(ents)))):
+                pair = tuple(sorted([rela.get("src_id", ""), rela.get("tgt_id", "")]))
+                if pair in missing:
+                    missing.pop(pair)["description"] = rela["description"]
+            if not missing:
+                break
+
     def _community_retrival_(self, entities, condition, kb_ids, idxnms, topn, max_token):
         ## Community retrieval
         fields = ["docnm_kwd", "content_with_weight"]
@@ -9,10 +9,11 @@ Reference:
 import html
 import json
 import logging
+import multiprocessing
 import re
 import time
 from collections import defaultdict
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import md5
 from typing import Any, Callable
 import os
@@ -24,6 +25,7 @@ import xxhash
 from networkx.readwrite import json_graph
 
 from api import settings
+from graphrag.general.n_hop import n_hop_paths, graph_to_arrays
 from rag.nlp import search, rag_tokenizer
 from rag.utils.doc_store_conn import OrderByExpr
 from rag.utils.redis_conn import REDIS_CONN
@@ -31,6 +33,21 @@ from rag.utils.redis_conn import REDIS_CONN
 ErrorHandlerFn = Callable[[BaseException | None, str | None, dict | None], None]
 
 chat_limiter = trio.CapacityLimiter(int(os.environ.get('MAX_CONCURRENT_CHATS', 10)))
+graph_process_limiter = trio.CapacityLimiter(int(os.environ.get('MAX_GRAPH_PROCESSES', 2)))
+_graph_process_pool = None
+
+
+async def run_in_process(fn, *args):
+    """Run a CPU heavy graph computation in a worker process without blocking the trio loop.
+    `fn` and `args` must be picklable."""
+    global _graph_process_pool
+    if _graph_process_pool is None:
+        _graph_process_pool = ProcessPoolExecutor(max_workers=graph_process_limiter.total_tokens,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+    async with graph_process_limiter:
+        future = _graph_process_pool.submit(fn, *args)
+        return await trio.to_thread.run_sync(future.result)
+
 
 def perform_variable_replacements(
     input: str, history: list[dict] | None = None, variables: dict | None = None
@@ -149,6 +166,8 @@ def set_tags_to_cache(kb_ids, tags):
 
 def graph_merge(g1, g2):
     g = g2.copy()
+    # keep graph level attributes of the existing graph, e.g. the cached community partition
+    g.graph.update({k: v for k, v in g1.graph.items() if k not in g.graph})
     for n, attr in g1.nodes(data=True):
         if n not in g2.nodes():
             g.add_node(n, **attr)
@@ -165,6 +184,20 @@ def graph_merge(g1, g2):
     return g
 
 
+def community_key(level, entities: list[dict], relations: list[dict]) -> str:
+    """
+    Content hash of a community: changes whenever one of its entities or relations changes. A community
+    which doesn't split shows up with the same members at several Leiden levels, each with its own report.
+    """
+    hasher = xxhash.xxh64()
+    hasher.update(str(level).encode("utf-8"))
+    for ent in sorted(entities, key=lambda e: e["entity_name"]):
+        hasher.update(str((ent["entity_name"], ent.get("entity_type"), ent.get("description"))).encode("utf-8"))
+    for rel in sorted(relations, key=lambda r: (r["src_id"], r["tgt_id"])):
+        hasher.update(str((rel["src_id"], rel["tgt_id"], rel.get("description"), rel.get("weight"))).encode("utf-8"))
+    return hasher.hexdigest()
+
+
 def compute_args_hash(*args):
     return md5(str(args).encode()).hexdigest()
 
@@ -447,82 +480,16 @@ async def set_graph(tenant_id, kb_id, graph, docids):
         await trio.to_thread.run_sync(lambda: settings.docStoreConn.insert([{"id": chunk_id(chunk), **chunk}], search.index_name(tenant_id), kb_id))
 
 
-def is_continuous_subsequence(subseq, seq):
-    def find_all_indexes(tup, value):
-        indexes = []
-        start = 0
-        while True:
-            try:
-                index = tup.index(value, start)
-                indexes.append(index)
-                start = index + 1
-            except ValueError:
-                break
-        return indexes
-
-    index_list = find_all_indexes(seq,subseq[0])
-    for idx in index_list:
-        if idx!=len(seq)-1:
-            if seq[idx+1]==subseq[-1]:
-                return True
-    return False
-
-
-def merge_tuples(list1, list2):
-    result = []
-    for tup in list1:
-        last_element = tup[-1]
-        if last_element in tup[:-1]:
-            result.append(tup)
-        else:
-            matching_tuples = [t for t in list2 if t[0] == last_element]
-            already_match_flag = 0
-            for match in matching_tuples:
-                matchh = (match[1], match[0])
-                if is_continuous_subsequence(match, tup) or is_continuous_subsequence(matchh, tup):
-                    continue
-                already_match_flag = 1
-                merged_tuple = tup + match[1:]
-                result.append(merged_tuple)
-            if not already_match_flag:
-                result.append(tup)
-    return result
-
-
 async def update_nodes_pagerank_nhop_neighbour(tenant_id, kb_id, graph, n_hop):
-    def n_neighbor(id):
-        nonlocal graph, n_hop
-        count = 0
-        source_edge = list(graph.edges(id))
-        if not source_edge:
-            return []
-        count = count + 1
-        while count < n_hop:
-            count = count + 1
-            sc_edge = deepcopy(source_edge)
-            source_edge = []
-            for pair in sc_edge:
-                append_edge = list(graph.edges(pair[-1]))
-                for tuples in merge_tuples([pair], append_edge):
-                    source_edge.append(tuples)
-        nbrs = []
-        for path in source_edge:
-            n = {"path": path, "weights": []}
-            wts = nx.get_edge_attributes(graph, 'weight')
-            for i in range(len(path)-1):
-                f, t = path[i], path[i+1]
-                n["weights"].append(wts.get((f, t), 0))
-            nbrs.append(n)
-        return nbrs
-
+    nhops = await run_in_process(n_hop_paths, *graph_to_arrays(graph), n_hop)
     pr = nx.pagerank(graph)
     try:
         async with trio.open_nursery() as nursery:
             for n, p in pr.items():
                 graph.nodes[n]["pagerank"] = p
-                nursery.start_soon(lambda: trio.to_thread.run_sync(lambda: settings.docStoreConn.update({"entity_kwd": n, "kb_id": kb_id},
+                nursery.start_soon(lambda: trio.to_thread.run_sync(lambda n=n, p=p: settings.docStoreConn.update({"entity_kwd": n, "kb_id": kb_id},
                                                 {"rank_flt": p,
-                                                "n_hop_with_weight": json.dumps((n), ensure_ascii=False)},
+                                                "n_hop_with_weight": json.dumps(nhops.get(n, []), ensure_ascii=False)},
                                                 search.index_name(tenant_id), kb_id)))
     except Exception as e:
         logging.exception(e)
@@ -548,15 +515,28 @@ async def update_nodes_pagerank_nhop_neighbour(tenant_id, kb_id, graph, n_hop):
                                      search.index_name(tenant_id), kb_id))
     else:
         await trio.to_thread.run_sync(lambda: settings.docStoreConn.insert([{"id": chunk_id(chunk), **chunk}], search.index_name(tenant_id), kb_id))
+    REDIS_CONN.delete(ty2ents_cache_key(kb_id))
 
 
-async def get_entity_type2sampels(idxnms, kb_ids: list):
-    es_res = await trio.to_thread.run_sync(lambda: settings.retrievaler.search({"knowledge_graph_kwd": "ty2ents", "kb_id": kb_ids,
-                                       "size": 10000,
-                                       "fields": ["content_with_weight"]},
-                                      idxnms, kb_ids))
-
+def get_entity_type2sampels(idxnms, kb_ids: list):
+    """Sample entities per entity type of the KBs, cached per KB until its graph gets updated."""
     res = defaultdict(list)
+    missing = []
+    for kb_id in kb_ids:
+        smp = REDIS_CONN.get(ty2ents_cache_key(kb_id))
+        if smp is None:
+            missing.append(kb_id)
+            continue
+        for ty, ents in json.loads(smp).items():
+            res[ty].extend(ents)
+    if not missing:
+        return res
+
+    es_res = settings.retrievaler.search({"knowledge_graph_kwd": "ty2ents", "kb_id": missing,
+                                          "size": 10000,
+                                          "fields": ["content_with_weight", "kb_id"]},
+                                         idxnms, missing)
+    fetched = {kb_id: {} for kb_id in missing}
     for id in es_res.ids:
         smp = es_res.field[id].get("content_with_weight")
         if not smp:
@@ -565,12 +545,24 @@ async def get_entity_type2sampels(idxnms, kb_ids: list):
             smp = json.loads(smp)
         except Exception as e:
             logging.exception(e)
+            continue
 
+        kb_id = es_res.field[id].get("kb_id")
+        if isinstance(kb_id, list):
+            kb_id = kb_id[0]
+        if kb_id in fetched:
+            fetched[kb_id] = smp
         for ty, ents in smp.items():
             res[ty].extend(ents)
+    for kb_id, smp in fetched.items():
+        REDIS_CONN.set(ty2ents_cache_key(kb_id), json.dumps(smp, ensure_ascii=False), 3600)
     return res
 
 
+def ty2ents_cache_key(kb_id):
+    return f"graphrag:ty2ents:{kb_id}"
+
+
 def flat_uniq_list(arr, key):
     res = []
     for a in arr:
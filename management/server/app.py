@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 import jwt
 from dotenv import load_dotenv
 from flask import Flask, request
+from database import get_pool_metrics
 from flask_cors import CORS
 from routes import register_routes
 from services.users.service import authenticate_user
@@ -81,5 +82,11 @@ def login():
     return {"code": 0, "data": {"token": token}, "message": "登录成功"}
 
 
+# 连接池使用情况
+@app.route("/api/v1/system/pool_metrics", methods=["GET"])
+def pool_metrics():
+    return {"code": 0, "data": get_pool_metrics(), "message": "success"}
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
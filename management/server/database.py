@@ -1,8 +1,11 @@
 import os
+import threading
+import time
 from pathlib import Path
 
 import mysql.connector
 import redis
+import urllib3
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 from minio import Minio
@@ -80,61 +83,214 @@ REDIS_CONFIG = {
 }
 
 
+# 连接池配置
+MYSQL_POOL_SIZE = int(os.getenv("MANAGEMENT_MYSQL_POOL_SIZE", "16"))
+# 等待空闲MySQL连接的超时时间(秒)
+MYSQL_POOL_TIMEOUT = float(os.getenv("MANAGEMENT_MYSQL_POOL_TIMEOUT", "30"))
+# 空闲超过该时间(秒)的MySQL连接在下次取用时关闭重建
+MYSQL_POOL_IDLE_TIMEOUT = float(os.getenv("MANAGEMENT_MYSQL_POOL_IDLE_TIMEOUT", "300"))
+REDIS_POOL_SIZE = int(os.getenv("MANAGEMENT_REDIS_POOL_SIZE", "32"))
+MINIO_POOL_SIZE = int(os.getenv("MANAGEMENT_MINIO_POOL_SIZE", "16"))
+ES_POOL_SIZE = int(os.getenv("MANAGEMENT_ES_POOL_SIZE", "16"))
+
+
+class MySQLConnectionPool:
+    """
+    进程级MySQL连接池。连接数达到上限时等待归还，取用时检查连接是否可用，空闲过久的连接重建。
+    记录等待次数与等待时间，供 get_pool_metrics 查询。
+    """
+
+    def __init__(self, size, timeout, idle_timeout):
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle = []  # [(连接, 归还时间)]，后进先出
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {"in_use": 0, "created": 0, "evicted": 0, "checkouts": 0, "waits": 0, "timeouts": 0, "wait_time": 0.0, "max_wait_time": 0.0}
+
+    def get_connection(self):
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise TimeoutError(f"等待MySQL连接超时({self.timeout}秒)，连接池大小: {self.size}")
+        waited = time.monotonic() - start
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_time"] += waited
+            self._stats["max_wait_time"] = max(self._stats["max_wait_time"], waited)
+        return PooledConnection(self, conn)
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                conn, released_at = self._idle.pop() if self._idle else (None, None)
+            if conn is None:
+                conn = mysql.connector.connect(**DB_CONFIG)
+                with self._lock:
+                    self._stats["created"] += 1
+                return conn
+            # 空闲过久或已断开的连接直接关闭，取下一个
+            if time.monotonic() - released_at <= self.idle_timeout and conn.is_connected():
+                return conn
+            self._close_quietly(conn)
+            with self._lock:
+                self._stats["evicted"] += 1
+
+    def release(self, conn):
+        try:
+            # 回滚未提交的事务，避免连接带着事务状态被复用
+            conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._close_quietly(conn)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["size"] = self.size
+        stats["utilization"] = stats["in_use"] / self.size
+        stats["avg_wait_time"] = stats["wait_time"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+
+class PooledConnection:
+    """连接池中的MySQL连接，close() 将连接归还连接池"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def is_connected(self):
+        return self._conn is not None and self._conn.is_connected()
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.errors.OperationalError("连接已归还连接池")
+        return getattr(self._conn, name)
+
+    def __del__(self):
+        # 调用方忘记 close 时，回收对象时归还连接
+        self.close()
+
+
+_pool_lock = threading.Lock()
+_mysql_pool = None
+_minio_client = None
+_es_client = None
+_redis_pool = None
+
+
 def get_db_connection():
-    """创建MySQL数据库连接"""
+    """从连接池获取MySQL数据库连接，使用完毕后 close() 归还"""
+    global _mysql_pool
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
+        if _mysql_pool is None:
+            with _pool_lock:
+                if _mysql_pool is None:
+                    _mysql_pool = MySQLConnectionPool(MYSQL_POOL_SIZE, MYSQL_POOL_TIMEOUT, MYSQL_POOL_IDLE_TIMEOUT)
+        return _mysql_pool.get_connection()
     except Exception as e:
         print(f"MySQL连接失败: {str(e)}")
         raise e
 
 
 def get_minio_client():
-    """创建MinIO客户端连接"""
+    """获取进程共享的MinIO客户端，底层HTTP连接池复用连接"""
+    global _minio_client
     try:
-        minio_client = Minio(endpoint=MINIO_CONFIG["endpoint"], access_key=MINIO_CONFIG["access_key"], secret_key=MINIO_CONFIG["secret_key"], secure=MINIO_CONFIG["secure"])
-        return minio_client
+        if _minio_client is None:
+            with _pool_lock:
+                if _minio_client is None:
+                    http_client = urllib3.PoolManager(
+                        maxsize=MINIO_POOL_SIZE,
+                        timeout=urllib3.Timeout(connect=10, read=300),
+                        retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+                    )
+                    _minio_client = Minio(endpoint=MINIO_CONFIG["endpoint"], access_key=MINIO_CONFIG["access_key"], secret_key=MINIO_CONFIG["secret_key"], secure=MINIO_CONFIG["secure"], http_client=http_client)
+        return _minio_client
     except Exception as e:
         print(f"MinIO连接失败: {str(e)}")
         raise e
 
 
 def get_es_client():
-    """创建Elasticsearch客户端连接"""
+    """获取进程共享的Elasticsearch客户端"""
+    global _es_client
     try:
-        # 构建连接参数
-        es_params = {"hosts": [ES_CONFIG["host"]]}
+        if _es_client is None:
+            with _pool_lock:
+                if _es_client is None:
+                    # 构建连接参数
+                    es_params = {"hosts": [ES_CONFIG["host"]], "connections_per_node": ES_POOL_SIZE, "retry_on_timeout": True, "max_retries": 3}
 
-        # 添加认证信息
-        if ES_CONFIG["user"] and ES_CONFIG["password"]:
-            es_params["basic_auth"] = (ES_CONFIG["user"], ES_CONFIG["password"])
+                    # 添加认证信息
+                    if ES_CONFIG["user"] and ES_CONFIG["password"]:
+                        es_params["basic_auth"] = (ES_CONFIG["user"], ES_CONFIG["password"])
 
-        # 添加SSL配置
-        if ES_CONFIG["use_ssl"]:
-            es_params["use_ssl"] = True
-            es_params["verify_certs"] = False  # 在开发环境中可以设置为False，生产环境应该设置为True
+                    # 添加SSL配置
+                    if ES_CONFIG["use_ssl"]:
+                        es_params["use_ssl"] = True
+                        es_params["verify_certs"] = False  # 在开发环境中可以设置为False，生产环境应该设置为True
 
-        es_client = Elasticsearch(**es_params)
-        return es_client
+                    _es_client = Elasticsearch(**es_params)
+        return _es_client
     except Exception as e:
         print(f"Elasticsearch连接失败: {str(e)}")
         raise e
 
 
 def get_redis_connection():
-    """创建Redis连接"""
+    """获取使用进程共享连接池的Redis客户端，连接定期做健康检查"""
+    global _redis_pool
     try:
-        # 使用配置创建Redis连接
-        r = redis.Redis(**REDIS_CONFIG)
-        # 测试连接
-        r.ping()
-        return r
+        if _redis_pool is None:
+            with _pool_lock:
+                if _redis_pool is None:
+                    _redis_pool = redis.BlockingConnectionPool(max_connections=REDIS_POOL_SIZE, timeout=MYSQL_POOL_TIMEOUT, health_check_interval=30, **REDIS_CONFIG)
+        return redis.Redis(connection_pool=_redis_pool)
     except Exception as e:
         print(f"Redis连接失败: {str(e)}")
         raise e
 
 
+def get_pool_metrics():
+    """各连接池的使用情况"""
+    metrics = {"mysql": _mysql_pool.metrics() if _mysql_pool else None, "redis": None, "minio": {"size": MINIO_POOL_SIZE, "initialized": _minio_client is not None}, "elasticsearch": {"size": ES_POOL_SIZE, "initialized": _es_client is not None}}
+    if _redis_pool:
+        in_use = len(_redis_pool._connections) - _redis_pool.pool.qsize() + sum(1 for c in _redis_pool.pool.queue if c is None)
+        metrics["redis"] = {"size": REDIS_POOL_SIZE, "created": len(_redis_pool._connections), "in_use": in_use, "utilization": in_use / REDIS_POOL_SIZE}
+    return metrics
+
+
 def test_connections():
     """测试数据库和MinIO连接"""
     try:
@@ -294,6 +294,24 @@ def get_sequential_batch_parse_progress_route(kb_id):
         traceback.print_exc()
         return error_response(f"获取进度失败: {str(e)}", code=500)
     
+
+
+# 取消批量解析路由
+@knowledgebase_bp.route("/<string:kb_id>/batch_parse_sequential/cancel", methods=["POST"])
+def cancel_sequential_batch_parse_route(kb_id):
+    """取消知识库的批量解析任务"""
+    try:
+        result = KnowledgebaseService.cancel_sequential_batch_parse(kb_id)
+        if result.get("success"):
+            return success_response(data={"message": result.get("message")})
+        else:
+            return error_response(result.get("message", "取消失败"), code=409)
+    except Exception as e:
+        print(f"取消批量解析路由处理失败 (KB ID: {kb_id}): {str(e)}")
+        traceback.print_exc()
+        return error_response(f"取消批量解析失败: {str(e)}", code=500)
+
+
 @knowledgebase_bp.route('/embedding_models/<string:kb_id>', methods=['GET'])
 def get_tenant_embedding_models(kb_id):
     """获取租户的嵌入模型配置"""
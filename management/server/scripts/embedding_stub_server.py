@@ -0,0 +1,116 @@
+"""
+本地 embedding 桩服务，用于离线测试批量 embedding 的吞吐。
+
+兼容 OpenAI (/v1/embeddings) 和 Ollama (/api/embed, /api/embeddings) 接口，
+根据文本哈希生成确定的向量，并模拟每次请求的网络延迟和服务端的批次大小上限。
+
+启动服务:
+    python scripts/embedding_stub_server.py --port 8099 --latency 0.05 --max-batch 64
+对比逐条请求与批量请求的耗时:
+    python scripts/embedding_stub_server.py --benchmark 2000
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fake_embedding(text, dim):
+    """根据文本哈希生成确定的向量"""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(seed[i % len(seed)] - 128) / 128.0 for i in range(dim)]
+
+
+def make_handler(dim, latency, per_item_latency, max_batch):
+    class EmbeddingHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            texts = payload.get("input", payload.get("prompt", ""))
+            if isinstance(texts, str):
+                texts = [texts]
+            if len(texts) > max_batch:
+                return self._reply(413, {"error": f"batch size {len(texts)} exceeds {max_batch}"})
+            time.sleep(latency + per_item_latency * len(texts))
+
+            vecs = [fake_embedding(text, dim) for text in texts]
+            if self.path.endswith("/api/embeddings"):
+                self._reply(200, {"embedding": vecs[0]})
+            elif self.path.endswith("/api/embed"):
+                self._reply(200, {"model": payload.get("model"), "embeddings": vecs})
+            else:
+                self._reply(200, {"object": "list", "model": payload.get("model"), "data": [{"object": "embedding", "index": i, "embedding": vec} for i, vec in enumerate(vecs)]})
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return EmbeddingHandler
+
+
+def benchmark(url, num_texts, batch_size, max_workers):
+    from services.knowledgebases.embedding import EmbeddingClient
+
+    texts = [f"测试文本 {i}" for i in range(num_texts)]
+
+    start_time = time.time()
+    for text in texts:
+        resp = requests.post(url, json={"model": "stub", "input": text}, timeout=15)
+        resp.raise_for_status()
+    serial_time = time.time() - start_time
+    print(f"逐条请求: {num_texts} 条文本, 耗时 {serial_time:.2f}秒")
+
+    client = EmbeddingClient(url, "stub", batch_size=batch_size, max_workers=max_workers)
+    start_time = time.time()
+    vecs = client.encode(texts)
+    batch_time = time.time() - start_time
+    client.close()
+    assert len(vecs) == num_texts
+    print(f"批量请求 (batch_size={batch_size}, max_workers={max_workers}): 耗时 {batch_time:.2f}秒, 提速 {serial_time / batch_time:.1f} 倍")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--latency", type=float, default=0.02, help="每次请求的固定延迟(秒)")
+    parser.add_argument("--per-item-latency", type=float, default=0.001, help="每条文本的额外延迟(秒)")
+    parser.add_argument("--max-batch", type=int, default=64, help="单次请求允许的最大文本数，超过返回413")
+    parser.add_argument("--benchmark", type=int, default=0, help="启动服务后对比指定数量文本的逐条与批量耗时")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.dim, args.latency, args.per_item_latency, args.max_batch))
+    url = f"http://127.0.0.1:{server.server_port}/v1/embeddings"
+    if not args.benchmark:
+        print(f"Embedding 桩服务已启动: {url}")
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        benchmark(url, args.benchmark, args.batch_size, args.max_workers)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import mysql.connector
-from database import DB_CONFIG
+from database import get_db_connection
 
 
 def get_conversations_by_user_id(user_id, page=1, size=20, sort_by="update_time", sort_order="desc"):
@@ -17,7 +17,7 @@ def get_conversations_by_user_id(user_id, page=1, size=20, sort_by="update_time"
         tuple: (对话列表, 总数)
     """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # 直接使用user_id作为tenant_id
@@ -143,7 +143,7 @@ def get_messages_by_conversation_id(conversation_id, page=1, size=30):
         tuple: (对话详情, 总数)
     """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # 查询对话信息
@@ -16,6 +16,8 @@ load_dotenv("../../docker/.env")
 # redis配置参数
 UPLOAD_TEMP_DIR = os.getenv("UPLOAD_TEMP_DIR", tempfile.gettempdir())
 CHUNK_EXPIRY_SECONDS = 3600 * 24  # 分块24小时过期
+# 上传到MinIO的分片大小，文件超过该大小时使用分片上传
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
 
 temp_dir = tempfile.gettempdir()
 UPLOAD_FOLDER = os.path.join(temp_dir, "uploads")
@@ -452,8 +454,8 @@ def batch_delete_files(file_ids):
         raise e
 
 
-def upload_files_to_server(files, parent_id=None, user_id=None):
-    """处理文件上传到服务器的核心逻辑"""
+def _resolve_upload_owner(parent_id=None, user_id=None):
+    """确定上传文件的所属用户和存储桶(parent_id)"""
     if user_id is None:
         try:
             conn = get_db_connection()
@@ -510,6 +512,92 @@ def upload_files_to_server(files, parent_id=None, user_id=None):
             parent_id = get_uuid()  # 如果无法获取，生成一个新的ID
             print(f"生成新的parent_id: {parent_id}")
 
+    return parent_id, user_id
+
+
+def _safe_filename(original_filename):
+    """只替换文件系统不安全的字符，保留中文和其他Unicode字符"""
+    name, ext = os.path.splitext(original_filename)
+    safe_name = re.sub(r'[\\/:*?"<>|]', "_", name)
+
+    # 如果处理后文件名为空，则使用随机字符串
+    if not safe_name or safe_name.strip() == "":
+        safe_name = f"file_{get_uuid()[:8]}"
+
+    return safe_name + ext.lower()
+
+
+def _store_file(filename, data, length, parent_id, user_id):
+    """将文件内容流式上传到MinIO并创建文件记录，data 为可读取的文件对象，超过分片大小时自动分片上传"""
+    # 获取文件类型
+    filetype = filename_type(filename)
+    if filetype == FileType.OTHER.value:
+        raise RuntimeError("不支持的文件类型")
+
+    # 生成唯一存储位置
+    minio_client = get_minio_client()
+    location = filename
+
+    # 确保bucket存在
+    if not minio_client.bucket_exists(parent_id):
+        minio_client.make_bucket(parent_id)
+        print(f"创建MinIO存储桶: {parent_id}")
+
+    # 上传到MinIO
+    minio_client.put_object(bucket_name=parent_id, object_name=location, data=data, length=length, part_size=MULTIPART_PART_SIZE)
+    print(f"文件已上传到MinIO: {parent_id}/{location}")
+
+    # 创建文件记录
+    file_id = get_uuid()
+    current_time = int(datetime.now().timestamp())
+    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    file_record = {
+        "id": file_id,
+        "parent_id": parent_id,
+        "tenant_id": user_id,
+        "created_by": user_id,
+        "name": filename,
+        "type": filetype,
+        "size": length,
+        "location": location,
+        "source_type": FileSource.LOCAL.value,
+        "create_time": current_time,
+        "create_date": current_date,
+        "update_time": current_time,
+        "update_date": current_date,
+    }
+
+    # 保存文件记录
+    conn = get_db_connection()
+    cursor = None
+    try:
+        cursor = conn.cursor()
+
+        # 插入文件记录
+        columns = ", ".join(file_record.keys())
+        placeholders = ", ".join(["%s"] * len(file_record))
+        query = f"INSERT INTO file ({columns}) VALUES ({placeholders})"
+        cursor.execute(query, list(file_record.values()))
+
+        conn.commit()
+
+        return {"id": file_id, "name": filename, "size": file_record["size"], "type": filetype, "status": "success"}
+
+    except Exception as e:
+        conn.rollback()
+        print(f"数据库操作失败: {str(e)}")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def upload_files_to_server(files, parent_id=None, user_id=None):
+    """处理文件上传到服务器的核心逻辑"""
+    parent_id, user_id = _resolve_upload_owner(parent_id, user_id)
+
     results = []
 
     for file in files:
@@ -517,88 +605,17 @@ def upload_files_to_server(files, parent_id=None, user_id=None):
             continue
 
         if file and allowed_file(file.filename):
-            original_filename = file.filename
-            # 修复文件名处理逻辑，保留中文字符
-            name, ext = os.path.splitext(original_filename)
-
-            # 只替换文件系统不安全的字符，保留中文和其他Unicode字符
-            safe_name = re.sub(r'[\\/:*?"<>|]', "_", name)
-
-            # 如果处理后文件名为空，则使用随机字符串
-            if not safe_name or safe_name.strip() == "":
-                safe_name = f"file_{get_uuid()[:8]}"
-
-            filename = safe_name + ext.lower()
+            filename = _safe_filename(file.filename)
             filepath = os.path.join(UPLOAD_FOLDER, filename)
 
             try:
-                # 1. 保存文件到本地临时目录
+                # 保存文件到本地临时目录
                 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
                 file.save(filepath)
                 print(f"文件已保存到临时目录: {filepath}")
 
-                # 2. 获取文件类型
-                filetype = filename_type(filename)
-                if filetype == FileType.OTHER.value:
-                    raise RuntimeError("不支持的文件类型")
-
-                # 3. 生成唯一存储位置
-                minio_client = get_minio_client()
-                location = filename
-
-                # 确保bucket存在
-                if not minio_client.bucket_exists(parent_id):
-                    minio_client.make_bucket(parent_id)
-                    print(f"创建MinIO存储桶: {parent_id}")
-
-                # 4. 上传到MinIO
                 with open(filepath, "rb") as file_data:
-                    minio_client.put_object(bucket_name=parent_id, object_name=location, data=file_data, length=os.path.getsize(filepath))
-                print(f"文件已上传到MinIO: {parent_id}/{location}")
-
-                # 5. 创建文件记录
-                file_id = get_uuid()
-                current_time = int(datetime.now().timestamp())
-                current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                file_record = {
-                    "id": file_id,
-                    "parent_id": parent_id,
-                    "tenant_id": user_id,
-                    "created_by": user_id,
-                    "name": filename,
-                    "type": filetype,
-                    "size": os.path.getsize(filepath),
-                    "location": location,
-                    "source_type": FileSource.LOCAL.value,
-                    "create_time": current_time,
-                    "create_date": current_date,
-                    "update_time": current_time,
-                    "update_date": current_date,
-                }
-
-                # 保存文件记录
-                conn = get_db_connection()
-                try:
-                    cursor = conn.cursor()
-
-                    # 插入文件记录
-                    columns = ", ".join(file_record.keys())
-                    placeholders = ", ".join(["%s"] * len(file_record))
-                    query = f"INSERT INTO file ({columns}) VALUES ({placeholders})"
-                    cursor.execute(query, list(file_record.values()))
-
-                    conn.commit()
-
-                    results.append({"id": file_id, "name": filename, "size": file_record["size"], "type": filetype, "status": "success"})
-
-                except Exception as e:
-                    conn.rollback()
-                    print(f"数据库操作失败: {str(e)}")
-                    raise
-                finally:
-                    cursor.close()
-                    conn.close()
+                    results.append(_store_file(filename, file_data, os.path.getsize(filepath), parent_id, user_id))
 
             except Exception as e:
                 results.append({"name": filename, "error": str(e), "status": "failed"})
@@ -613,6 +630,40 @@ def upload_files_to_server(files, parent_id=None, user_id=None):
     return {"code": 0, "data": results, "message": f"成功上传 {len([r for r in results if r['status'] == 'success'])}/{len(files)} 个文件"}
 
 
+class ChunkFilesReader:
+    """按顺序拼接多个分块文件的只读文件对象，每次只读取请求的字节数"""
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._file = None
+
+    def read(self, size=-1):
+        data = bytearray()
+        while size < 0 or len(data) < size:
+            if self._file is None:
+                if not self._paths:
+                    break
+                self._file = open(self._paths.pop(0), "rb")
+            chunk = self._file.read(-1 if size < 0 else size - len(data))
+            if not chunk:
+                self._file.close()
+                self._file = None
+                continue
+            data += chunk
+        return bytes(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def handle_chunk_upload(chunk_file, chunk_index, total_chunks, upload_id, file_name, parent_id=None):
     """
     处理分块上传
@@ -645,16 +696,15 @@ def handle_chunk_upload(chunk_file, chunk_index, total_chunks, upload_id, file_n
             r.hmset(f"upload:{upload_id}:info", {"file_name": file_name, "total_chunks": total_chunks, "parent_id": parent_id or "", "status": "uploading"})
             r.expire(f"upload:{upload_id}:info", CHUNK_EXPIRY_SECONDS)
 
-        # 记录分块状态
-        r.setbit(f"upload:{upload_id}:chunks", int(chunk_index), 1)
-        r.expire(f"upload:{upload_id}:chunks", CHUNK_EXPIRY_SECONDS)
+        # 记录分块状态，并用 BITCOUNT 统计已上传的分块数，重传的分块不会重复计数
+        pipe = r.pipeline()
+        pipe.setbit(f"upload:{upload_id}:chunks", int(chunk_index), 1)
+        pipe.expire(f"upload:{upload_id}:chunks", CHUNK_EXPIRY_SECONDS)
+        pipe.bitcount(f"upload:{upload_id}:chunks")
+        uploaded_chunks = pipe.execute()[-1]
 
         # 检查是否所有分块都已上传
-        is_complete = True
-        for i in range(int(total_chunks)):
-            if not r.getbit(f"upload:{upload_id}:chunks", i):
-                is_complete = False
-                break
+        is_complete = uploaded_chunks >= int(total_chunks)
 
         return {"code": 0, "data": {"upload_id": upload_id, "chunk_index": chunk_index, "is_complete": is_complete}, "message": "分块上传成功"}
     except Exception as e:
@@ -683,9 +733,9 @@ def merge_chunks(upload_id, file_name, total_chunks, parent_id=None):
             return {"code": 404, "message": "上传任务不存在或已过期"}
 
         # 检查所有分块是否都已上传
-        for i in range(int(total_chunks)):
-            if not r.getbit(f"upload:{upload_id}:chunks", i):
-                return {"code": 400, "message": f"分块 {i} 未上传，无法合并"}
+        uploaded_chunks = r.bitcount(f"upload:{upload_id}:chunks")
+        if uploaded_chunks < int(total_chunks):
+            return {"code": 400, "message": f"已上传 {uploaded_chunks}/{total_chunks} 个分块，无法合并"}
 
         # 获取上传信息
         upload_info = r.hgetall(f"upload:{upload_id}:info")
@@ -698,40 +748,30 @@ def merge_chunks(upload_id, file_name, total_chunks, parent_id=None):
         # 使用存储的信息，如果参数中没有提供
         file_name = file_name or upload_info.get("file_name")
 
-        # 创建临时文件用于合并
+        # 按顺序读取各分块，直接流式分片上传到MinIO，不在本地合并也不整体读入内存
         upload_dir = Path(UPLOAD_TEMP_DIR) / "chunks" / upload_id
-        merged_path = Path(UPLOAD_TEMP_DIR) / f"merged_{upload_id}_{file_name}"
-
-        # 合并文件
-        with open(merged_path, "wb") as merged_file:
-            for i in range(int(total_chunks)):
-                chunk_path = upload_dir / f"{i}.chunk"
-                with open(chunk_path, "rb") as chunk_file:
-                    merged_file.write(chunk_file.read())
-
-        # 使用上传函数处理合并后的文件
-        with open(merged_path, "rb") as file_obj:
-            # 创建FileStorage对象
-            class MockFileStorage:
-                def __init__(self, file_obj, filename):
-                    self.file = file_obj
-                    self.filename = filename
-
-                def save(self, dst):
-                    with open(dst, "wb") as f:
-                        f.write(self.file.read())
-                        self.file.seek(0)  # 重置文件指针
-
-            mock_file = MockFileStorage(file_obj, file_name)
-            result = upload_files_to_server([mock_file])
+        chunk_paths = [upload_dir / f"{i}.chunk" for i in range(int(total_chunks))]
+        missing = [str(i) for i, path in enumerate(chunk_paths) if not path.exists()]
+        if missing:
+            return {"code": 400, "message": f"分块 {', '.join(missing)} 的文件不存在，无法合并"}
+
+        if not allowed_file(file_name):
+            return {"code": 400, "message": "不支持的文件类型"}
+        filename = _safe_filename(file_name)
+        parent_id, user_id = _resolve_upload_owner()
+        total_size = sum(path.stat().st_size for path in chunk_paths)
+        try:
+            with ChunkFilesReader(chunk_paths) as reader:
+                result = {"code": 0, "data": [_store_file(filename, reader, total_size, parent_id, user_id)], "message": "成功上传 1/1 个文件"}
+        except Exception as e:
+            print(f"文件上传过程中出错: {filename}, 错误: {str(e)}")
+            result = {"code": 0, "data": [{"name": filename, "error": str(e), "status": "failed"}], "message": "成功上传 0/1 个文件"}
 
         # 更新状态为已完成
         r.hset(f"upload:{upload_id}:info", "status", "completed")
 
         # 清理临时文件
         try:
-            if os.path.exists(merged_path):
-                os.remove(merged_path)
             if upload_dir.exists():
                 shutil.rmtree(upload_dir)
         except Exception as e:
@@ -0,0 +1,164 @@
+#  Copyright 2025 zstar1003. All Rights Reserved.
+#  Project source code: https://github.com/zstar1003/ragflow-plus
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from database import get_redis_connection
+
+from . import logger
+from .document_parser import _update_document_progress
+
+# 所有知识库同时解析的文档数上限
+BATCH_PARSE_GLOBAL_WORKERS = int(os.getenv("BATCH_PARSE_GLOBAL_WORKERS", "4"))
+# 单个知识库同时解析的文档数上限
+BATCH_PARSE_KB_WORKERS = int(os.getenv("BATCH_PARSE_KB_WORKERS", "2"))
+# 任务状态在Redis中的保留时间(秒)
+BATCH_PARSE_STATE_TTL = 7 * 24 * 3600
+# 运行中的任务超过该时间(秒)没有心跳，视为所在进程已退出
+BATCH_PARSE_HEARTBEAT_TIMEOUT = 60
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_PARSE_GLOBAL_WORKERS, thread_name_prefix="batch_parse")
+# 本进程中正在调度的知识库
+_active_jobs = set()
+_active_jobs_lock = threading.Lock()
+
+
+def _state_key(kb_id):
+    return f"batch_parse:{kb_id}"
+
+
+def _cancel_key(kb_id):
+    return f"batch_parse:{kb_id}:cancel"
+
+
+def _save_state(kb_id, **fields):
+    """将任务状态写入Redis哈希，并刷新心跳"""
+    fields["heartbeat"] = time.time()
+    r = get_redis_connection()
+    pipe = r.pipeline()
+    pipe.hset(_state_key(kb_id), mapping={k: str(v) for k, v in fields.items()})
+    pipe.expire(_state_key(kb_id), BATCH_PARSE_STATE_TTL)
+    pipe.execute()
+
+
+def get_batch_parse_state(kb_id):
+    """读取任务状态，结构与原 SEQUENTIAL_BATCH_TASKS 的值一致，另含成功/失败数"""
+    raw = get_redis_connection().hgetall(_state_key(kb_id))
+    if not raw:
+        return None
+    state = {k.decode(): v.decode() for k, v in raw.items()}
+    for field in ("total", "current", "parsed", "failed", "running"):
+        state[field] = int(state.get(field, 0))
+    for field in ("start_time", "heartbeat"):
+        state[field] = float(state.get(field, 0))
+    if state["status"] in ("starting", "running") and kb_id not in _active_jobs and time.time() - state["heartbeat"] > BATCH_PARSE_HEARTBEAT_TIMEOUT:
+        # 任务所在进程已退出，未完成的文档可重新启动批量解析继续处理
+        state["status"] = "interrupted"
+        state["message"] = f"任务已中断，已完成 {state['current']}/{state['total']} 个，可重新启动以继续解析剩余文档。"
+    return state
+
+
+def cancel_batch_parse(kb_id):
+    """取消任务：尚未开始的文档不再解析，正在解析的文档会继续完成"""
+    state = get_batch_parse_state(kb_id)
+    if not state or state["status"] not in ("starting", "running"):
+        return False
+    get_redis_connection().set(_cancel_key(kb_id), "1", ex=BATCH_PARSE_STATE_TTL)
+    return True
+
+
+def start_batch_parse(kb_id, documents, parse_fn):
+    """
+    在后台调度知识库的批量解析，documents 为 [{"id", "name"}]，parse_fn(doc_id) 解析单个文档。
+    文档提交到全局线程池并发解析，每个知识库同时解析的文档数不超过 BATCH_PARSE_KB_WORKERS。
+    """
+    with _active_jobs_lock:
+        state = get_batch_parse_state(kb_id)
+        if kb_id in _active_jobs or (state and state["status"] in ("starting", "running")):
+            return False
+        _active_jobs.add(kb_id)
+
+    r = get_redis_connection()
+    r.delete(_cancel_key(kb_id))
+    r.delete(_state_key(kb_id))
+    _save_state(kb_id, status="running", total=len(documents), current=0, parsed=0, failed=0, running=0, message=f"共找到 {len(documents)} 个文档待解析。", start_time=time.time())
+    thread = threading.Thread(target=_dispatch, args=(kb_id, documents, parse_fn), daemon=True)
+    thread.start()
+    return True
+
+
+def _dispatch(kb_id, documents, parse_fn):
+    total = len(documents)
+    start_time = time.time()
+    kb_slots = threading.BoundedSemaphore(BATCH_PARSE_KB_WORKERS)
+    lock = threading.Lock()
+    counts = {"current": 0, "parsed": 0, "failed": 0, "running": 0}
+    cancelled = False
+
+    def run(doc):
+        try:
+            result = parse_fn(doc["id"])
+            success = bool(result and result.get("success"))
+            if not success:
+                logger.warning(f"[Batch Parse] KB {kb_id}: Document {doc['id']} parsing failed: {result.get('error', '未知错误') if result else '未知错误'}")
+        except Exception as e:
+            success = False
+            logger.error(f"[Batch Parse ERROR] KB {kb_id}: Error parsing {doc['id']}: {e}")
+            traceback.print_exc()
+            try:
+                _update_document_progress(doc["id"], status="1", run="0", progress=0.0, message=f"批量任务中解析失败: {str(e)[:255]}")
+            except Exception as update_err:
+                logger.error(f"[Batch Parse ERROR] 更新文档 {doc['id']} 失败状态时出错: {update_err}")
+        finally:
+            kb_slots.release()
+
+        with lock:
+            counts["current"] += 1
+            counts["running"] -= 1
+            counts["parsed" if success else "failed"] += 1
+            snapshot = dict(counts)
+        _save_state(kb_id, **snapshot, message=f"已完成 {snapshot['current']}/{total} 个，正在解析 {snapshot['running']} 个")
+
+    try:
+        logger.info(f"[Batch Parse] KB {kb_id}: 开始并发解析 {total} 个文档...")
+        futures = []
+        for doc in documents:
+            # 等待本知识库的空闲名额，等待期间保持心跳并检查取消标记
+            while not kb_slots.acquire(timeout=BATCH_PARSE_HEARTBEAT_TIMEOUT / 3):
+                _save_state(kb_id)
+            if get_redis_connection().exists(_cancel_key(kb_id)):
+                kb_slots.release()
+                cancelled = True
+                break
+            with lock:
+                counts["running"] += 1
+            futures.append(_executor.submit(run, doc))
+
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=BATCH_PARSE_HEARTBEAT_TIMEOUT / 3)
+            if pending:
+                _save_state(kb_id)
+
+        duration = round(time.time() - start_time, 2)
+        if cancelled:
+            status = "cancelled"
+            message = f"批量解析已取消。已完成 {counts['current']}/{total} 个，成功 {counts['parsed']} 个，失败 {counts['failed']} 个。耗时 {duration} 秒。"
+        else:
+            status = "completed"
+            message = f"批量解析完成。总计 {total} 个，成功 {counts['parsed']} 个，失败 {counts['failed']} 个。耗时 {duration} 秒。"
+        _save_state(kb_id, **counts, status=status, message=message)
+        logger.info(f"[Batch Parse] KB {kb_id}: {message}")
+    except Exception as e:
+        error_message = f"批量解析过程中发生严重错误: {e}"
+        logger.error(f"[Batch Parse ERROR] KB {kb_id}: {error_message}")
+        traceback.print_exc()
+        _save_state(kb_id, status="failed", message=error_message)
+    finally:
+        get_redis_connection().delete(_cancel_key(kb_id))
+        with _active_jobs_lock:
+            _active_jobs.discard(kb_id)
@@ -1,20 +1,23 @@
 #  Copyright 2025 zstar1003. All Rights Reserved.
 #  Project source code: https://github.com/zstar1003/ragflow-plus
 
+import hashlib
 import json
 import os
 import re
 import shutil
 import sys
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
-from io import StringIO
+from io import BytesIO, StringIO
 from urllib.parse import urlparse
 
-import requests
 from database import MINIO_CONFIG, get_es_client, get_minio_client
+from elasticsearch import helpers
 from magic_pdf.config.enums import SupportedPdfParseMethod
 from magic_pdf.data.data_reader_writer import FileBasedDataReader, FileBasedDataWriter
 from magic_pdf.data.dataset import PymuDocDataset
@@ -22,18 +25,119 @@ from magic_pdf.data.read_api import read_local_images, read_local_office
 from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
 
 from . import logger
+from .embedding import EmbeddingClient
 from .excel_parser import parse_excel_file
 from .rag_tokenizer import RagTokenizer
 from .utils import _create_task_record, _update_document_progress, _update_kb_chunk_count, generate_uuid, get_bbox_from_block
 
 tknzr = RagTokenizer()
 
+# 每次批量写入ES的文本块数
+ES_BULK_SIZE = int(os.getenv("ES_BULK_SIZE", "256"))
+# 批量写入中失败条目的重试次数
+ES_BULK_MAX_RETRIES = 3
+# 同时进行MinerU解析的文档数；解析期间的输出捕获会替换进程全局的 sys.stdout，大于1时各文档的解析日志会相互混杂
+MINERU_PARSE_SLOTS = int(os.getenv("MINERU_PARSE_SLOTS", "1"))
+_mineru_slots = threading.BoundedSemaphore(MINERU_PARSE_SLOTS)
+# 同时上传的图片数
+IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "8"))
+# 已设置图片公共访问权限的桶
+_public_image_buckets = set()
+_public_image_buckets_lock = threading.Lock()
+
 
 def tokenize_text(text):
     """使用分词器对文本进行分词"""
     return tknzr.tokenize(text)
 
 
+def ensure_image_bucket_policy(minio_client, bucket):
+    """设置桶中图片的公共访问权限，每个桶在进程内只设置一次"""
+    if bucket in _public_image_buckets:
+        return
+    with _public_image_buckets_lock:
+        if bucket in _public_image_buckets:
+            return
+        policy = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Principal": {"AWS": "*"}, "Action": ["s3:GetObject"], "Resource": [f"arn:aws:s3:::{bucket}/images/*"]}]}
+        minio_client.set_bucket_policy(bucket, json.dumps(policy))
+        _public_image_buckets.add(bucket)
+
+
+def upload_images(minio_client, bucket, img_paths):
+    """
+    并发上传图片到MinIO，返回与 img_paths 顺序一致的访问链接。
+    图片读入内存后按内容哈希去重，内容相同的图片只上传一次并共用同一个链接。
+    """
+    ensure_image_bucket_policy(minio_client, bucket)
+
+    keys = []
+    unique_images = {}  # 内容哈希 -> (对象名, 图片内容, content_type)
+    for img_path in img_paths:
+        with open(img_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in unique_images:
+            img_ext = os.path.splitext(img_path)[1]
+            content_type = f"image/{img_ext[1:].lower()}"
+            if content_type == "image/jpg":
+                content_type = "image/jpeg"
+            unique_images[digest] = (f"images/{generate_uuid()}{img_ext}", data, content_type)  # MinIO中的对象名
+        keys.append(unique_images[digest][0])
+
+    def upload(img_key, data, content_type):
+        try:
+            minio_client.put_object(bucket_name=bucket, object_name=img_key, data=BytesIO(data), length=len(data), content_type=content_type)
+        except Exception as e:
+            logger.error(f"[Parser-ERROR] 上传图片 {img_key} 失败: {e}")
+            raise Exception(f"[Parser-ERROR] 上传图片 {img_key} 失败: {e}")
+
+    with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS) as executor:
+        list(executor.map(lambda args: upload(*args), unique_images.values()))
+    logger.info(f"[Parser-INFO] 上传图片 {len(unique_images)} 张，去重 {len(img_paths) - len(unique_images)} 张")
+
+    protocol = "https" if MINIO_CONFIG.get("secure", False) else "http"
+    return [f"{protocol}://{MINIO_CONFIG['endpoint']}/{bucket}/{img_key}" for img_key in keys]
+
+
+def build_es_doc(doc_id, kb_id, doc_name, chunk, vector_field_name, embedding_vec):
+    """构建文本块的ES文档"""
+    page_idx = chunk["page_idx"]
+    # 转换坐标格式
+    x1, y1, x2, y2 = chunk["bbox"]
+    bbox_reordered = [x1, x2, y1, y2]
+    now = datetime.now()
+    return {
+        "doc_id": doc_id,
+        "kb_id": kb_id,
+        "docnm_kwd": doc_name,
+        "title_tks": tokenize_text(doc_name),
+        "title_sm_tks": tokenize_text(doc_name),
+        "content_with_weight": chunk["content"],
+        "content_ltks": tokenize_text(chunk["content"]),
+        "content_sm_ltks": tokenize_text(chunk["content"]),
+        "page_num_int": [page_idx + 1],
+        "position_int": [[page_idx + 1] + bbox_reordered],  # 格式: [[page, x1, x2, y1, y2]]
+        "top_int": [1],
+        "create_time": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "create_timestamp_flt": now.timestamp(),
+        "img_id": chunk["img_id"],
+        vector_field_name: embedding_vec,
+    }
+
+
+def bulk_index_with_retry(es_client, actions, max_retries=ES_BULK_MAX_RETRIES):
+    """批量写入ES，不刷新索引；只重试写入失败的条目"""
+    for attempt in range(max_retries + 1):
+        _, errors = helpers.bulk(es_client, actions, raise_on_error=False, raise_on_exception=False, refresh=False)
+        if not errors:
+            return
+        failed_ids = {next(iter(error.values())).get("_id") for error in errors}
+        actions = [action for action in actions if action["_id"] in failed_ids]
+        logger.warning(f"[Parser-WARNING] {len(actions)} 个文本块写入ES失败，第 {attempt + 1} 次重试: {errors[0]}")
+        time.sleep(0.5 * 2**attempt)
+    raise Exception(f"[Parser-ERROR] {len(actions)} 个文本块写入ES失败: {errors[0]}")
+
+
 @contextmanager
 def capture_stdout_stderr(doc_id):
     """捕获标准输出和标准错误，并实时更新到数据库"""
@@ -193,123 +297,130 @@ def perform_parse(doc_id, doc_info, file_info, embedding_config, kb_info):
         update_progress(0.2, "文件获取成功，准备解析")
 
         # 2. 根据文件类型选择解析器
-        content_list = []
-        if file_type.endswith("pdf"):
-            update_progress(0.3, "使用MinerU解析器")
-
-            # 创建临时文件保存PDF内容
-            temp_dir = tempfile.gettempdir()
-            temp_pdf_path = os.path.join(temp_dir, f"{doc_id}.pdf")
-            with open(temp_pdf_path, "wb") as f:
-                f.write(file_content)
-
-            # 使用MinerU处理，并捕获详细输出
-            with capture_stdout_stderr(doc_id):
-                reader = FileBasedDataReader("")
-                pdf_bytes = reader.read(temp_pdf_path)
-                ds = PymuDocDataset(pdf_bytes)
-
-                update_progress(0.3, "分析PDF类型")
-                is_ocr = ds.classify() == SupportedPdfParseMethod.OCR
-                mode_msg = "OCR模式" if is_ocr else "文本模式"
-                update_progress(0.4, f"使用{mode_msg}处理PDF，正在进行详细解析...")
-
-                infer_result = ds.apply(doc_analyze, ocr=is_ocr)
-
-                # 设置临时输出目录
-                temp_image_dir = os.path.join(temp_dir, f"images_{doc_id}")
-                os.makedirs(temp_image_dir, exist_ok=True)
-                image_writer = FileBasedDataWriter(temp_image_dir)
-
-                update_progress(0.6, f"处理{mode_msg}结果")
-                pipe_result = infer_result.pipe_ocr_mode(image_writer) if is_ocr else infer_result.pipe_txt_mode(image_writer)
-
-                update_progress(0.8, "提取内容")
-                content_list = pipe_result.get_content_list(os.path.basename(temp_image_dir))
-                # 获取内容列表（JSON格式）
-                middle_content = pipe_result.get_middle_json()
-                middle_json_content = json.loads(middle_content)
-
-        elif file_type.endswith("word") or file_type.endswith("ppt") or file_type.endswith("txt") or file_type.endswith("md") or file_type.endswith("html"):
-            update_progress(0.3, "使用MinerU解析器")
-            # 创建临时文件保存文件内容
-            temp_dir = tempfile.gettempdir()
-            temp_file_path = os.path.join(temp_dir, f"{doc_id}{file_extension}")
-            with open(temp_file_path, "wb") as f:
-                f.write(file_content)
-
-            logger.info(f"[Parser-INFO] 临时文件路径: {temp_file_path}")
-            # 使用MinerU处理，并捕获详细输出
-            with capture_stdout_stderr(doc_id):
-                ds = read_local_office(temp_file_path)[0]
-                infer_result = ds.apply(doc_analyze, ocr=True)
-
-                # 设置临时输出目录
-                temp_image_dir = os.path.join(temp_dir, f"images_{doc_id}")
-                os.makedirs(temp_image_dir, exist_ok=True)
-                image_writer = FileBasedDataWriter(temp_image_dir)
-
-                update_progress(0.6, "处理文件结果")
-                pipe_result = infer_result.pipe_txt_mode(image_writer)
-
-                update_progress(0.8, "提取内容")
-                content_list = pipe_result.get_content_list(os.path.basename(temp_image_dir))
-                # 获取内容列表（JSON格式）
-                middle_content = pipe_result.get_middle_json()
-                middle_json_content = json.loads(middle_content)
-
-        # 对excel文件单独进行处理
-        elif file_type.endswith("excel"):
-            update_progress(0.3, "使用MinerU解析器")
-            # 创建临时文件保存文件内容
-            temp_dir = tempfile.gettempdir()
-            temp_file_path = os.path.join(temp_dir, f"{doc_id}{file_extension}")
-            with open(temp_file_path, "wb") as f:
-                f.write(file_content)
-
-            logger.info(f"[Parser-INFO] 临时文件路径: {temp_file_path}")
-
-            update_progress(0.8, "提取内容")
-            # 处理内容列表
-            content_list = parse_excel_file(temp_file_path)
-
-        elif file_type.endswith("visual"):
-            update_progress(0.3, "使用MinerU解析器")
-
-            # 创建临时文件保存文件内容
-            temp_dir = tempfile.gettempdir()
-            temp_file_path = os.path.join(temp_dir, f"{doc_id}{file_extension}")
-            with open(temp_file_path, "wb") as f:
-                f.write(file_content)
-
-            logger.info(f"[Parser-INFO] 临时文件路径: {temp_file_path}")
-            # 使用MinerU处理，并捕获详细输出
-            with capture_stdout_stderr(doc_id):
-                ds = read_local_images(temp_file_path)[0]
-                
-                update_progress(0.3, "分析图片类型")
-                is_ocr = ds.classify() == SupportedPdfParseMethod.OCR
-                mode_msg = "OCR模式" if is_ocr else "文本模式"
-                update_progress(0.4, f"使用{mode_msg}处理图片，正在进行详细解析...")
-
-                infer_result = ds.apply(doc_analyze, ocr=is_ocr)
-
-                # 设置临时输出目录
-                temp_image_dir = os.path.join(temp_dir, f"images_{doc_id}")
-                os.makedirs(temp_image_dir, exist_ok=True)
-                image_writer = FileBasedDataWriter(temp_image_dir)
-
-                update_progress(0.6, f"处理{mode_msg}结果")
-                pipe_result = infer_result.pipe_ocr_mode(image_writer) if is_ocr else infer_result.pipe_txt_mode(image_writer)
+        # MinerU解析占用CPU/GPU，同时解析的文档数受 MINERU_PARSE_SLOTS 限制；embedding与写入ES阶段不占用名额
+        if not _mineru_slots.acquire(blocking=False):
+            update_progress(0.2, "等待解析资源")
+            _mineru_slots.acquire()
+        try:
+            content_list = []
+            if file_type.endswith("pdf"):
+                update_progress(0.3, "使用MinerU解析器")
+
+                # 创建临时文件保存PDF内容
+                temp_dir = tempfile.gettempdir()
+                temp_pdf_path = os.path.join(temp_dir, f"{doc_id}.pdf")
+                with open(temp_pdf_path, "wb") as f:
+                    f.write(file_content)
+
+                # 使用MinerU处理，并捕获详细输出
+                with capture_stdout_stderr(doc_id):
+                    reader = FileBasedDataReader("")
+                    pdf_bytes = reader.read(temp_pdf_path)
+                    ds = PymuDocDataset(pdf_bytes)
+
+                    update_progress(0.3, "分析PDF类型")
+                    is_ocr = ds.classify() == SupportedPdfParseMethod.OCR
+                    mode_msg = "OCR模式" if is_ocr else "文本模式"
+                    update_progress(0.4, f"使用{mode_msg}处理PDF，正在进行详细解析...")
+
+                    infer_result = ds.apply(doc_analyze, ocr=is_ocr)
+
+                    # 设置临时输出目录
+                    temp_image_dir = os.path.join(temp_dir, f"images_{doc_id}")
+                    os.makedirs(temp_image_dir, exist_ok=True)
+                    image_writer = FileBasedDataWriter(temp_image_dir)
+
+                    update_progress(0.6, f"处理{mode_msg}结果")
+                    pipe_result = infer_result.pipe_ocr_mode(image_writer) if is_ocr else infer_result.pipe_txt_mode(image_writer)
+
+                    update_progress(0.8, "提取内容")
+                    content_list = pipe_result.get_content_list(os.path.basename(temp_image_dir))
+                    # 获取内容列表（JSON格式）
+                    middle_content = pipe_result.get_middle_json()
+                    middle_json_content = json.loads(middle_content)
+
+            elif file_type.endswith("word") or file_type.endswith("ppt") or file_type.endswith("txt") or file_type.endswith("md") or file_type.endswith("html"):
+                update_progress(0.3, "使用MinerU解析器")
+                # 创建临时文件保存文件内容
+                temp_dir = tempfile.gettempdir()
+                temp_file_path = os.path.join(temp_dir, f"{doc_id}{file_extension}")
+                with open(temp_file_path, "wb") as f:
+                    f.write(file_content)
+
+                logger.info(f"[Parser-INFO] 临时文件路径: {temp_file_path}")
+                # 使用MinerU处理，并捕获详细输出
+                with capture_stdout_stderr(doc_id):
+                    ds = read_local_office(temp_file_path)[0]
+                    infer_result = ds.apply(doc_analyze, ocr=True)
+
+                    # 设置临时输出目录
+                    temp_image_dir = os.path.join(temp_dir, f"images_{doc_id}")
+                    os.makedirs(temp_image_dir, exist_ok=True)
+                    image_writer = FileBasedDataWriter(temp_image_dir)
+
+                    update_progress(0.6, "处理文件结果")
+                    pipe_result = infer_result.pipe_txt_mode(image_writer)
+
+                    update_progress(0.8, "提取内容")
+                    content_list = pipe_result.get_content_list(os.path.basename(temp_image_dir))
+                    # 获取内容列表（JSON格式）
+                    middle_content = pipe_result.get_middle_json()
+                    middle_json_content = json.loads(middle_content)
+
+            # 对excel文件单独进行处理
+            elif file_type.endswith("excel"):
+                update_progress(0.3, "使用MinerU解析器")
+                # 创建临时文件保存文件内容
+                temp_dir = tempfile.gettempdir()
+                temp_file_path = os.path.join(temp_dir, f"{doc_id}{file_extension}")
+                with open(temp_file_path, "wb") as f:
+                    f.write(file_content)
+
+                logger.info(f"[Parser-INFO] 临时文件路径: {temp_file_path}")
 
                 update_progress(0.8, "提取内容")
-                content_list = pipe_result.get_content_list(os.path.basename(temp_image_dir))
-                # 获取内容列表（JSON格式）
-                middle_content = pipe_result.get_middle_json()
-                middle_json_content = json.loads(middle_content)
-        else:
-            update_progress(0.3, f"暂不支持的文件类型: {file_type}")
-            raise NotImplementedError(f"文件类型 '{file_type}' 的解析器尚未实现")
+                # 处理内容列表
+                content_list = parse_excel_file(temp_file_path)
+
+            elif file_type.endswith("visual"):
+                update_progress(0.3, "使用MinerU解析器")
+
+                # 创建临时文件保存文件内容
+                temp_dir = tempfile.gettempdir()
+                temp_file_path = os.path.join(temp_dir, f"{doc_id}{file_extension}")
+                with open(temp_file_path, "wb") as f:
+                    f.write(file_content)
+
+                logger.info(f"[Parser-INFO] 临时文件路径: {temp_file_path}")
+                # 使用MinerU处理，并捕获详细输出
+                with capture_stdout_stderr(doc_id):
+                    ds = read_local_images(temp_file_path)[0]
+                    
+                    update_progress(0.3, "分析图片类型")
+                    is_ocr = ds.classify() == SupportedPdfParseMethod.OCR
+                    mode_msg = "OCR模式" if is_ocr else "文本模式"
+                    update_progress(0.4, f"使用{mode_msg}处理图片，正在进行详细解析...")
+
+                    infer_result = ds.apply(doc_analyze, ocr=is_ocr)
+
+                    # 设置临时输出目录
+                    temp_image_dir = os.path.join(temp_dir, f"images_{doc_id}")
+                    os.makedirs(temp_image_dir, exist_ok=True)
+                    image_writer = FileBasedDataWriter(temp_image_dir)
+
+                    update_progress(0.6, f"处理{mode_msg}结果")
+                    pipe_result = infer_result.pipe_ocr_mode(image_writer) if is_ocr else infer_result.pipe_txt_mode(image_writer)
+
+                    update_progress(0.8, "提取内容")
+                    content_list = pipe_result.get_content_list(os.path.basename(temp_image_dir))
+                    # 获取内容列表（JSON格式）
+                    middle_content = pipe_result.get_middle_json()
+                    middle_json_content = json.loads(middle_content)
+            else:
+                update_progress(0.3, f"暂不支持的文件类型: {file_type}")
+                raise NotImplementedError(f"文件类型 '{file_type}' 的解析器尚未实现")
+        finally:
+            _mineru_slots.release()
 
         # 解析 middle_json_content 并提取块信息
         block_info_list = []
@@ -349,41 +460,13 @@ def perform_parse(doc_id, doc_info, file_info, embedding_config, kb_info):
             logger.info(f"[Parser-INFO] 创建MinIO桶: {output_bucket}")
 
         # 获取embedding向量维度
+        embedding_client = EmbeddingClient(embedding_url, embedding_model_name, embedding_api_key)
         embedding_dim = None
         try:
             # 先用测试文本获取向量维度
-            test_content = "test"
-            headers = {"Content-Type": "application/json"}
-            if embedding_api_key:
-                headers["Authorization"] = f"Bearer {embedding_api_key}"
-
-            is_ollama = "11434" in embedding_url if embedding_url else False
-            if is_ollama:
-                test_resp = requests.post(
-                    embedding_url,
-                    headers=headers,
-                    json={"model": embedding_model_name, "prompt": test_content},
-                    timeout=15,
-                )
-            else:
-                test_resp = requests.post(
-                    embedding_url,
-                    headers=headers,
-                    json={"model": embedding_model_name, "input": test_content},
-                    timeout=15,
-                )
-            
-            test_resp.raise_for_status()
-            test_data = test_resp.json()
-            
-            if is_ollama:
-                test_vec = test_data.get("embedding")
-            else:
-                test_vec = test_data["data"][0]["embedding"]
-            
-            embedding_dim = len(test_vec)
+            embedding_dim = len(embedding_client.encode(["test"])[0])
             logger.info(f"[Parser-INFO] 检测到embedding维度: {embedding_dim}")
-            
+
         except Exception as e:
             logger.error(f"[Parser-ERROR] 获取embedding维度失败: {e}")
             raise Exception(f"[Parser-ERROR] 获取embedding维度失败: {e}")
@@ -431,6 +514,8 @@ def perform_parse(doc_id, doc_info, file_info, embedding_config, kb_info):
 
         chunk_count = 0
         chunk_ids_list = []
+        pending_chunks = []
+        pending_images = []
 
         for chunk_idx, chunk_data in enumerate(content_list):
             page_idx = 0  # 默认页面索引
@@ -483,93 +568,8 @@ def perform_parse(doc_id, doc_info, file_info, embedding_config, kb_info):
                     # 将处理后的标题字符串和表格主体拼接
                     content = caption_str + table_body
 
-                embedding_vec = []  # 初始化为空列表
-                # 获取embedding向量
-                try:
-                    headers = {"Content-Type": "application/json"}
-                    if embedding_api_key:
-                        headers["Authorization"] = f"Bearer {embedding_api_key}"
-
-                    if is_ollama:
-                        embedding_resp = requests.post(
-                            embedding_url,  # 使用动态构建的 URL
-                            headers=headers,  # 添加 headers (包含可能的 API Key)
-                            json={
-                                "model": embedding_model_name,  # 使用动态获取或默认的模型名
-                                "prompt": content,
-                            },
-                            timeout=15,  # 稍微增加超时时间
-                        )
-                    else:
-                        embedding_resp = requests.post(
-                            embedding_url,  # 使用动态构建的 URL
-                            headers=headers,  # 添加 headers (包含可能的 API Key)
-                            json={
-                                "model": embedding_model_name,  # 使用动态获取或默认的模型名
-                                "input": content,
-                            },
-                            timeout=15,  # 稍微增加超时时间
-                        )
-
-                    embedding_resp.raise_for_status()
-                    embedding_data = embedding_resp.json()
-
-                    # 对ollama嵌入模型的接口返回值进行特殊处理
-                    if is_ollama:
-                        embedding_vec = embedding_data.get("embedding")
-                    else:
-                        embedding_vec = embedding_data["data"][0]["embedding"]
-
-                    # 检查向量维度是否与预期一致
-                    if len(embedding_vec) != embedding_dim:
-                        error_msg = f"[Parser-ERROR] Embedding向量维度不一致，预期: {embedding_dim}，实际: {len(embedding_vec)}"
-                        logger.error(error_msg)
-                        update_progress(-5, error_msg)
-                        raise ValueError(error_msg)
-                        
-                    logger.info(f"[Parser-INFO] 获取embedding成功，维度: {len(embedding_vec)}")
-                except Exception as e:
-                    logger.error(f"[Parser-ERROR] 获取embedding失败: {e}")
-                    raise Exception(f"[Parser-ERROR] 获取embedding失败: {e}")
-
-                chunk_id = generate_uuid()
-
-                try:
-                    # 准备ES文档
-                    current_time_es = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    current_timestamp_es = datetime.now().timestamp()
-
-                    # 转换坐标格式
-                    x1, y1, x2, y2 = bbox
-                    bbox_reordered = [x1, x2, y1, y2]
-
-                    es_doc = {
-                        "doc_id": doc_id,
-                        "kb_id": kb_id,
-                        "docnm_kwd": doc_info["name"],
-                        "title_tks": tokenize_text(doc_info["name"]),
-                        "title_sm_tks": tokenize_text(doc_info["name"]),
-                        "content_with_weight": content,
-                        "content_ltks": tokenize_text(content),
-                        "content_sm_ltks": tokenize_text(content),
-                        "page_num_int": [page_idx + 1],
-                        "position_int": [[page_idx + 1] + bbox_reordered],  # 格式: [[page, x1, x2, y1, y2]]
-                        "top_int": [1],
-                        "create_time": current_time_es,
-                        "create_timestamp_flt": current_timestamp_es,
-                        "img_id": "",
-                        vector_field_name: embedding_vec,
-                    }
-
-                    # 存储到Elasticsearch
-                    es_client.index(index=index_name, id=chunk_id, document=es_doc)  # 使用 document 参数
-
-                    chunk_count += 1
-                    chunk_ids_list.append(chunk_id)
-
-                except Exception as e:
-                    logger.error(f"[Parser-ERROR] 处理文本块 {chunk_idx} (page: {page_idx}, bbox: {bbox}) 失败: {e}")
-                    raise Exception(f"[Parser-ERROR] 处理文本块 {chunk_idx} (page: {page_idx}, bbox: {bbox}) 失败: {e}")
+                # 先收集文本块，循环结束后批量获取embedding
+                pending_chunks.append({"content": content, "page_idx": page_idx, "bbox": bbox})
 
             elif chunk_data["type"] == "image":
                 img_path_relative = chunk_data.get("img_path")
@@ -581,76 +581,57 @@ def perform_parse(doc_id, doc_info, file_info, embedding_config, kb_info):
                     logger.warning(f"[Parser-WARNING] 图片文件不存在: {img_path_abs}")
                     continue
 
-                img_id = generate_uuid()
-                img_ext = os.path.splitext(img_path_abs)[1]
-                img_key = f"images/{img_id}{img_ext}"  # MinIO中的对象名
-                content_type = f"image/{img_ext[1:].lower()}"
-                if content_type == "image/jpg":
-                    content_type = "image/jpeg"
-
+                # 先收集图片，循环结束后并发上传
+                pending_images.append({"path": img_path_abs, "position": len(pending_chunks)})  # 使用当前处理的文本块数作为位置参考
+
+        if pending_images:
+            update_progress(0.95, f"正在上传 {len(pending_images)} 张图片")
+            img_urls = upload_images(minio_client, output_bucket, [img["path"] for img in pending_images])
+            # 记录图片信息，包括URL和位置信息
+            image_info_list = [{"url": img_url, "position": img["position"]} for img, img_url in zip(pending_images, img_urls)]
+
+        # 4. 在内存中确定每个文本块关联的图片：与文本块距离间隔小于5个块的最后一张图片
+        for i, chunk in enumerate(pending_chunks):
+            chunk["img_id"] = ""
+            for img_info in image_info_list:
+                if abs(i - img_info["position"]) < 5:
+                    # 存储相对路径部分
+                    chunk["img_id"] = urlparse(img_info["url"]).path.lstrip("/")
+
+        # 按批次获取embedding并批量写入ES，全部写入后统一刷新一次
+        total_chunks = len(pending_chunks)
+        try:
+            for batch_start in range(0, total_chunks, ES_BULK_SIZE):
+                batch = pending_chunks[batch_start : batch_start + ES_BULK_SIZE]
                 try:
-                    # 上传图片到MinIO (桶为kb_id)
-                    minio_client.fput_object(bucket_name=output_bucket, object_name=img_key, file_path=img_path_abs, content_type=content_type)
-
-                    # 设置图片的公共访问权限
-                    policy = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Principal": {"AWS": "*"}, "Action": ["s3:GetObject"], "Resource": [f"arn:aws:s3:::{kb_id}/images/*"]}]}
-                    minio_client.set_bucket_policy(kb_id, json.dumps(policy))
-
-                    logger.info(f"成功上传图片: {img_key}")
-                    minio_endpoint = MINIO_CONFIG["endpoint"]
-                    use_ssl = MINIO_CONFIG.get("secure", False)
-                    protocol = "https" if use_ssl else "http"
-                    img_url = f"{protocol}://{minio_endpoint}/{output_bucket}/{img_key}"
+                    embedding_vecs = embedding_client.encode([chunk["content"] for chunk in batch])
+                except Exception as e:
+                    logger.error(f"[Parser-ERROR] 获取embedding失败: {e}")
+                    raise Exception(f"[Parser-ERROR] 获取embedding失败: {e}")
 
-                    # 记录图片信息，包括URL和位置信息
-                    image_info = {
-                        "url": img_url,
-                        "position": chunk_count,  # 使用当前处理的文本块数作为位置参考
-                    }
-                    image_info_list.append(image_info)
+                actions = []
+                for chunk, embedding_vec in zip(batch, embedding_vecs):
+                    # 检查向量维度是否与预期一致
+                    if len(embedding_vec) != embedding_dim:
+                        error_msg = f"[Parser-ERROR] Embedding向量维度不一致，预期: {embedding_dim}，实际: {len(embedding_vec)}"
+                        logger.error(error_msg)
+                        update_progress(-5, error_msg)
+                        raise ValueError(error_msg)
+                    actions.append({"_index": index_name, "_id": generate_uuid(), "_source": build_es_doc(doc_id, kb_id, doc_info["name"], chunk, vector_field_name, embedding_vec)})
 
-                    logger.info(f"图片访问链接: {img_url}")
+                bulk_index_with_retry(es_client, actions)
+                chunk_ids_list.extend(action["_id"] for action in actions)
+                chunk_count += len(actions)
+                update_progress(0.96 + 0.03 * chunk_count / total_chunks, f"已写入 {chunk_count}/{total_chunks} 个文本块")
+        finally:
+            embedding_client.close()
 
-                except Exception as e:
-                    logger.error(f"[Parser-ERROR] 上传图片 {img_path_abs} 失败: {e}")
-                    raise Exception(f"[Parser-ERROR] 上传图片 {img_path_abs} 失败: {e}")
+        if chunk_ids_list:
+            es_client.indices.refresh(index=index_name)
 
         # 打印匹配总结信息
         logger.info(f"[Parser-INFO] 共处理 {chunk_count} 个文本块。")
 
-        # 4. 更新文本块的图像信息
-        if image_info_list and chunk_ids_list:
-
-            try:
-
-                # 为每个文本块找到最近的图片
-                for i, chunk_id in enumerate(chunk_ids_list):
-                    # 找到与当前文本块最近的图片
-                    nearest_image = None
-
-                    for img_info in image_info_list:
-                        # 计算文本块与图片的"距离"
-                        distance = abs(i - img_info["position"])  # 使用位置差作为距离度量
-                        # 如果文本块与图片的距离间隔小于5个块,则认为块与图片是相关的
-                        if distance < 5:
-                            nearest_image = img_info
-
-                    # 如果找到了最近的图片，则更新文本块的img_id
-                    if nearest_image:
-                        # 存储相对路径部分
-                        parsed_url = urlparse(nearest_image["url"])
-                        relative_path = parsed_url.path.lstrip("/")  # 去掉开头的斜杠
-                        # 更新ES中的文档
-                        direct_update = {"doc": {"img_id": relative_path}}
-                        es_client.update(index=index_name, id=chunk_id, body=direct_update, refresh=True)
-                        index_name = f"ragflow_{tenant_id}"
-                        logger.info(f"[Parser-INFO] 更新文本块 {chunk_id} 的图片关联: {relative_path}")
-
-            except Exception as e:
-                logger.error(f"[Parser-ERROR] 更新文本块图片关联失败: {e}")
-                raise Exception(f"[Parser-ERROR] 更新文本块图片关联失败: {e}")
-
-
         # 5. 更新最终状态
         process_duration = time.time() - start_time
         _update_document_progress(doc_id, progress=1.0, message="解析完成", status="1", run="3", chunk_count=chunk_count, process_duration=process_duration)
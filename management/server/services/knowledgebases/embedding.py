@@ -0,0 +1,122 @@
+#  Copyright 2025 zstar1003. All Rights Reserved.
+#  Project source code: https://github.com/zstar1003/ragflow-plus
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import logger
+
+# 每个批次的文本数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# 同时进行的批次请求数
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))
+# 单个批次失败后的重试次数
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+EMBEDDING_TIMEOUT = int(os.getenv("EMBEDDING_TIMEOUT", "60"))
+
+# 服务端拒绝过大批次时返回的状态码，收到后将批次对半拆分重试
+OVERSIZED_BATCH_STATUS = (400, 413, 422)
+# 可重试的状态码
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class EmbeddingBatchError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class EmbeddingClient:
+    """
+    批量获取 embedding 向量，请求通过连接池复用连接。
+    文本按 batch_size 分批，最多 max_workers 个批次并发请求，单个批次失败按指数退避重试，
+    批次被服务端以过大为由拒绝时对半拆分后重新请求。
+    """
+
+    def __init__(self, url, model, api_key=None, batch_size=EMBEDDING_BATCH_SIZE, max_workers=EMBEDDING_MAX_WORKERS, max_retries=EMBEDDING_MAX_RETRIES, timeout=EMBEDDING_TIMEOUT):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # 如果请求url端口号为11434，则认为是ollama模型，批量接口为 /api/embed
+        self.is_ollama = "11434" in url
+        self.url = url
+        if self.is_ollama and url.endswith("/api/embeddings"):
+            self.url = url[: -len("/api/embeddings")] + "/api/embed"
+        self.legacy_ollama_url = url
+
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        if api_key:
+            self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def encode(self, texts):
+        """按输入顺序返回每条文本的向量"""
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.max_workers == 1:
+            results = [self._encode_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(self._encode_batch, batches))
+        return [vec for vecs in results for vec in vecs]
+
+    def _encode_batch(self, batch):
+        try:
+            return self._request_with_retry(batch)
+        except EmbeddingBatchError as e:
+            if e.status_code not in OVERSIZED_BATCH_STATUS or len(batch) == 1:
+                raise
+            half = len(batch) // 2
+            logger.warning(f"[Parser-WARNING] Embedding 服务拒绝了 {len(batch)} 条文本的批次 ({e.status_code})，拆分为 {half} 和 {len(batch) - half} 条重试")
+            return self._encode_batch(batch[:half]) + self._encode_batch(batch[half:])
+
+    def _request_with_retry(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._request(batch)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except EmbeddingBatchError as e:
+                if e.status_code not in RETRY_STATUS:
+                    raise
+                error = e
+            if attempt < self.max_retries:
+                logger.warning(f"[Parser-WARNING] Embedding 批次请求失败，第 {attempt + 1} 次重试: {error}")
+                time.sleep(0.5 * 2**attempt)
+        raise error
+
+    def _request(self, batch):
+        if self.is_ollama and self.url == self.legacy_ollama_url:
+            # 旧版 ollama 没有批量接口，逐条请求
+            return [self._post(self.url, {"model": self.model, "prompt": text})["embedding"] for text in batch]
+
+        payload = {"model": self.model, "input": batch}
+        if self.is_ollama:
+            try:
+                return self._post(self.url, payload)["embeddings"]
+            except EmbeddingBatchError as e:
+                if e.status_code != 404:
+                    raise
+                logger.warning("[Parser-WARNING] Ollama 不支持 /api/embed 批量接口，改为逐条请求 /api/embeddings")
+                self.url = self.legacy_ollama_url
+                return self._request(batch)
+
+        data = self._post(self.url, payload)["data"]
+        return [item["embedding"] for item in sorted(data, key=lambda item: item.get("index", 0))]
+
+    def _post(self, url, payload):
+        resp = self.session.post(url, json=payload, timeout=self.timeout)
+        if resp.status_code != 200:
+            raise EmbeddingBatchError(resp.status_code, f"HTTP {resp.status_code}: {resp.text[:200]}")
+        return resp.json()
@@ -1,7 +1,7 @@
 import mysql.connector
 from datetime import datetime
 from utils import generate_uuid
-from database import DB_CONFIG
+from database import get_db_connection
 
 def get_teams_with_pagination(current_page, page_size, name='', sort_by="create_time", sort_order="desc", tenant_id=None):
     """
@@ -9,7 +9,7 @@ def get_teams_with_pagination(current_page, page_size, name='', sort_by="create_
     tenant_id: 如果提供，则只返回该租户的团队
     """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         # 构建WHERE子句和参数
@@ -92,7 +92,7 @@ def get_teams_with_pagination(current_page, page_size, name='', sort_by="create_
 def get_team_by_id(team_id):
     """根据ID获取团队详情"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         query = """
@@ -124,7 +124,7 @@ def get_team_by_id(team_id):
 def delete_team(team_id):
     """删除指定ID的团队"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # 删除团队成员关联
@@ -150,7 +150,7 @@ def delete_team(team_id):
 def get_team_members(team_id):
     """获取团队成员列表"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         query = """
@@ -185,7 +185,7 @@ def get_team_members(team_id):
 def add_team_member(team_id, user_id, role="member"):
     """添加团队成员"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # 检查用户是否已经是团队成员
@@ -240,7 +240,7 @@ def add_team_member(team_id, user_id, role="member"):
 def remove_team_member(team_id, user_id):
     """移除团队成员"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # 检查是否是团队的唯一所有者
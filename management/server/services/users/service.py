@@ -3,7 +3,7 @@ import mysql.connector
 import pytz
 from datetime import datetime
 from utils import generate_uuid, encrypt_password, verify_password
-from database import DB_CONFIG
+from database import get_db_connection
 
 # 从环境变量获取超级管理员配置
 ADMIN_USERNAME = os.getenv("MANAGEMENT_ADMIN_USERNAME", "admin")
@@ -33,7 +33,7 @@ def authenticate_user(username: str, password: str):
     
     # 其他用户使用数据库验证
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         # 查询用户信息 - 支持email或nickname登录
@@ -116,7 +116,7 @@ def get_user_info_by_id(user_id: str):
         }
     
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         # 查询用户信息
@@ -182,7 +182,7 @@ def get_users_with_pagination(current_page, page_size, username='', email='', so
     """查询用户信息，支持分页和条件筛选"""
     try:
         # 建立数据库连接
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         # 构建WHERE子句和参数
@@ -251,7 +251,7 @@ def get_users_with_pagination(current_page, page_size, username='', email='', so
 def delete_user(user_id):
     """删除指定ID的用户"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # 删除 user 表中的用户记录
@@ -285,7 +285,7 @@ def create_user(user_data):
     时间将以 UTC+8 (Asia/Shanghai) 存储。
     """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         # 开始插入
@@ -339,7 +339,7 @@ def create_user(user_data):
 def update_user(user_id, user_data):
     """更新用户信息"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         query = """
@@ -370,7 +370,7 @@ def reset_user_password(user_id, new_password):
         bool: 操作是否成功
     """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
 
         # 加密新密码
@@ -18,7 +18,7 @@ import re
 import math
 from dataclasses import dataclass
 
-from rag.settings import TAG_FLD, PAGERANK_FLD
+from rag.settings import TAG_FLD, PAGERANK_FLD, TOKEN_NUM_FLD
 from rag.utils import rmSpace
 from rag.nlp import rag_tokenizer, query
 import numpy as np
@@ -125,6 +125,7 @@ class Dealer:
                 "content_with_weight",
                 PAGERANK_FLD,
                 TAG_FLD,
+                TOKEN_NUM_FLD,
             ],
         )
         kwds = set([])  # 初始化关键词集合
@@ -513,6 +514,7 @@ class Dealer:
                 "vector": chunk.get(vector_column, zero_vector),
                 "positions": position_int,
                 "doc_type_kwd": chunk.get("doc_type_kwd", ""),
+                "token_num": int(chunk.get(TOKEN_NUM_FLD) or 0),
             }
             if highlight and sres.highlight:
                 if id in sres.highlight:
@@ -0,0 +1,163 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Micro-benchmark of the work a chat turn does between the retrieval and the LLM call: formatting the
+retrieved chunks with `kb_prompt` and fitting the messages into the context with `message_fit_in`.
+
+    python -m rag.prompt_benchmark --chunks 64 --docs 8 --chunk_tokens 256 --turns 50 --db_ms 2
+
+The database and Redis are simulated, the meta fields query costing `--db_ms`. Reported per turn:
+  - legacy: the former multi-pass builder, querying the documents every turn;
+  - cold:   `kb_prompt` with the metadata and token count caches emptied before every turn;
+  - warm:   `kb_prompt` on the same chunks again, as when a conversation goes on.
+"""
+import argparse
+import logging
+import random
+import statistics
+import time
+
+from api.db.services import document_service
+from api.db.services.document_service import DocumentService
+from rag.prompts import kb_prompt, message_fit_in
+from rag.utils import _token_counts, _token_counts_lock, num_tokens_from_string
+
+WORDS = ("retrieval", "augmented", "generation", "chunk", "embedding", "rerank", "knowledge", "base",
+         "document", "parser", "token", "context", "answer", "citation", "tenant", "dialog")
+
+
+def legacy_kb_prompt(kbinfos, max_tokens, load_meta_fields):
+    knowledges = [ck["content_with_weight"] for ck in kbinfos["chunks"]]
+    used_token_count = 0
+    chunks_num = 0
+    for i, c in enumerate(knowledges):
+        used_token_count += num_tokens_from_string(c)
+        chunks_num += 1
+        if max_tokens * 0.97 < used_token_count:
+            knowledges = knowledges[:i]
+            break
+
+    docs = load_meta_fields([ck["doc_id"] for ck in kbinfos["chunks"][:chunks_num]])
+
+    doc2chunks = {}
+    for i, ck in enumerate(kbinfos["chunks"][:chunks_num]):
+        cnt = f"---\nID: {i}\n" + (f"URL: {ck['url']}\n" if "url" in ck else "")
+        cnt += ck["content_with_weight"]
+        doc2chunks.setdefault(ck["docnm_kwd"], {"chunks": [], "meta": {}})
+        doc2chunks[ck["docnm_kwd"]]["chunks"].append(cnt)
+        doc2chunks[ck["docnm_kwd"]]["meta"] = docs.get(ck["doc_id"], {})
+
+    knowledges = []
+    for nm, cks_meta in doc2chunks.items():
+        txt = f"\n文档: {nm} \n"
+        for k, v in cks_meta["meta"].items():
+            txt += f"{k}: {v}\n"
+        txt += "相关片段如下:\n"
+        for chunk in cks_meta["chunks"]:
+            txt += f"{chunk}\n"
+        knowledges.append(txt)
+    return knowledges
+
+
+def make_chunks(args, rng):
+    chunks = []
+    for i in range(args.chunks):
+        doc = i % args.docs
+        content = " ".join(rng.choice(WORDS) for _ in range(args.chunk_tokens))
+        chunks.append({"doc_id": f"doc{doc}", "docnm_kwd": f"document_{doc}.pdf", "content_with_weight": content,
+                       "token_num": num_tokens_from_string(content)})
+    return chunks
+
+
+def fit(knowledges, history, max_tokens):
+    system = "请总结知识库的内容来回答问题。\n以下是知识库：\n{knowledge}".format(
+        knowledge="\n------\n" + "\n\n------\n\n".join(knowledges))
+    return message_fit_in([{"role": "system", "content": system}] + history, int(max_tokens * 0.95))
+
+
+def clear_caches():
+    with document_service._doc_meta_cache_lock:
+        document_service._doc_meta_cache.clear()
+    with _token_counts_lock:
+        _token_counts.clear()
+
+
+def report(name, timings):
+    for stage in ("prompt", "fit", "total"):
+        ms = sorted(t[stage] * 1000 for t in timings)
+        print(f"  {name:>6} {stage:>6}: mean {statistics.mean(ms):7.3f}ms  p50 {ms[len(ms) // 2]:7.3f}ms  "
+              f"p95 {ms[min(len(ms) - 1, int(len(ms) * 0.95))]:7.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=64)
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--chunk_tokens", type=int, default=256)
+    parser.add_argument("--max_tokens", type=int, default=32768)
+    parser.add_argument("--history", type=int, default=10, help="Messages of the conversation before the question")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--db_ms", type=float, default=2.0, help="Round trip of the meta fields query")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(0)
+    metas = {f"doc{i}": {"author": f"author {i}", "year": 2000 + i} for i in range(args.docs)}
+
+    def load_meta_fields(doc_ids):
+        time.sleep(args.db_ms / 1000)
+        return {doc_id: metas[doc_id] for doc_id in doc_ids if doc_id in metas}
+
+    versions = {}
+    DocumentService._load_meta_fields = classmethod(lambda cls, doc_ids: load_meta_fields(doc_ids))
+    document_service.REDIS_CONN.mget = lambda keys: [versions.get(k) for k in keys]
+
+    chunks = make_chunks(args, rng)
+    history = []
+    for i in range(args.history):
+        history.append({"role": "user" if i % 2 == 0 else "assistant",
+                        "content": " ".join(rng.choice(WORDS) for _ in range(64))})
+    kbinfos = {"chunks": chunks}
+    print(f"{args.chunks} chunks of {args.chunk_tokens} tokens over {args.docs} documents, "
+          f"{args.history} history messages, {args.turns} turns")
+
+    def turn(build):
+        st = time.perf_counter()
+        knowledges = build()
+        mid = time.perf_counter()
+        fit(knowledges, history + [{"role": "user", "content": "question"}], args.max_tokens)
+        end = time.perf_counter()
+        return {"prompt": mid - st, "fit": end - mid, "total": end - st}
+
+    for name in ("legacy", "cold", "warm"):
+        timings = []
+        for _ in range(args.turns):
+            if name != "warm":
+                clear_caches()
+            if name == "legacy":
+                timings.append(turn(lambda: legacy_kb_prompt(kbinfos, args.max_tokens, load_meta_fields)))
+            else:
+                timings.append(turn(lambda: kb_prompt(kbinfos, args.max_tokens)))
+        report(name, timings)
+
+    # the legacy builder kept the chunk which overflowed the budget, they only agree when all the chunks fit
+    if sum(ck["token_num"] for ck in chunks) <= args.max_tokens * 0.97:
+        assert kb_prompt(kbinfos, args.max_tokens) == legacy_kb_prompt(kbinfos, args.max_tokens, load_meta_fields), \
+            "kb_prompt and the legacy builder disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -18,14 +18,13 @@ import json
 import logging
 import os
 import re
-from collections import defaultdict
 import json_repair
 from api.db import LLMType
 from api.db.services.document_service import DocumentService
 from api.db.services.llm_service import TenantLLMService, LLMBundle
 from api.utils.file_utils import get_project_base_directory
 from rag.settings import TAG_FLD
-from rag.utils import num_tokens_from_string, encoder
+from rag.utils import num_tokens_from_string, truncate
 
 
 def chunks_format(reference):
@@ -103,15 +102,11 @@ def message_fit_in(msg, max_length=4000):
     ll2 = num_tokens_from_string(msg_[-1]["content"])
     # 如果系统消息占比超过80%，则截断系统消息
     if ll / (ll + ll2) > 0.8:
-        m = msg_[0]["content"]
-        m = encoder.decode(encoder.encode(m)[: max_length - ll2])
-        msg[0]["content"] = m
+        msg[0]["content"] = truncate(msg_[0]["content"], max_length - ll2)
         return max_length, msg
 
     # 否则截断最后一条消息
-    m = msg_[-1]["content"]
-    m = encoder.decode(encoder.encode(m)[: max_length - ll2])
-    msg[-1]["content"] = m
+    msg[-1]["content"] = truncate(msg_[-1]["content"], max_length - ll2)
     return max_length, msg
 
 
@@ -124,45 +119,33 @@ def kb_prompt(kbinfos, max_tokens):
         max_tokens (int): 模型的最大token限制
 
     流程:
-        1. 提取所有检索到的文档片段内容
-        2. 计算token数量，确保不超过模型限制
-        3. 获取文档元数据
-        4. 按文档名组织文档片段
-        5. 格式化为结构化提示词
+        1. 一次遍历检索到的文档片段：累计token数量，超出模型限制即停止，同时按文档名分组并格式化片段
+        2. 批量获取文档元数据（进程内缓存，文档元数据更新后失效）
+        3. 拼接为结构化提示词
 
     返回:
         list: 格式化后的知识库内容列表，每个元素是一个文档的相关信息
     """
-    knowledges = [ck["content_with_weight"] for ck in kbinfos["chunks"]]
+    chunks = kbinfos["chunks"]
+    budget = max_tokens * 0.97
     used_token_count = 0
-    chunks_num = 0
-    for i, c in enumerate(knowledges):
-        used_token_count += num_tokens_from_string(c)
-        chunks_num += 1
-        if max_tokens * 0.97 < used_token_count:
-            knowledges = knowledges[:i]
-            logging.warning(f"Not all the retrieval into prompt: {i + 1}/{len(knowledges)}")
+    # 文档名 -> {"doc_id": 最后一个片段所属文档, "chunks": 已格式化的片段}
+    doc2chunks = {}
+    for i, ck in enumerate(chunks):
+        # 索引时已记录的token数，旧的分块没有该字段时再计算
+        used_token_count += ck.get("token_num") or num_tokens_from_string(ck["content_with_weight"])
+        if budget < used_token_count:
+            logging.warning(f"Not all the retrieval into prompt: {i}/{len(chunks)}")
             break
+        doc = doc2chunks.setdefault(ck["docnm_kwd"], {"doc_id": ck["doc_id"], "chunks": []})
+        doc["doc_id"] = ck["doc_id"]
+        doc["chunks"].append(f"---\nID: {i}\n" + (f"URL: {ck['url']}\n" if "url" in ck else "") + ck["content_with_weight"] + "\n")
 
-    docs = DocumentService.get_by_ids([ck["doc_id"] for ck in kbinfos["chunks"][:chunks_num]])
-    docs = {d.id: d.meta_fields for d in docs}
-
-    doc2chunks = defaultdict(lambda: {"chunks": [], "meta": []})
-    for i, ck in enumerate(kbinfos["chunks"][:chunks_num]):
-        cnt = f"---\nID: {i}\n" + (f"URL: {ck['url']}\n" if "url" in ck else "")
-        cnt += ck["content_with_weight"]
-        doc2chunks[ck["docnm_kwd"]]["chunks"].append(cnt)
-        doc2chunks[ck["docnm_kwd"]]["meta"] = docs.get(ck["doc_id"], {})
-
+    metas = DocumentService.get_meta_fields([doc["doc_id"] for doc in doc2chunks.values()])
     knowledges = []
-    for nm, cks_meta in doc2chunks.items():
-        txt = f"\n文档: {nm} \n"
-        for k, v in cks_meta["meta"].items():
-            txt += f"{k}: {v}\n"
-        txt += "相关片段如下:\n"
-        for i, chunk in enumerate(cks_meta["chunks"], 1):
-            txt += f"{chunk}\n"
-        knowledges.append(txt)
+    for nm, doc in doc2chunks.items():
+        meta = "".join(f"{k}: {v}\n" for k, v in metas.get(doc["doc_id"], {}).items())
+        knowledges.append(f"\n文档: {nm} \n{meta}相关片段如下:\n" + "".join(doc["chunks"]))
     return knowledges
 
 
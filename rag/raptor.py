@@ -27,13 +27,17 @@ from graphrag.utils import (
     set_llm_cache,
     chat_limiter,
 )
+from rag.raptor_cluster import CLUSTER_SEARCH_STRATEGIES
 from rag.utils import truncate
 
 
 class RecursiveAbstractiveProcessing4TreeOrganizedRetrieval:
     def __init__(
-        self, max_cluster, llm_model, embd_model, prompt, max_token=512, threshold=0.1
+        self, max_cluster, llm_model, embd_model, prompt, max_token=512, threshold=0.1, cluster_search="exhaustive"
     ):
+        if cluster_search not in CLUSTER_SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown RAPTOR cluster search: {cluster_search}")
+        self._cluster_search = cluster_search
         self._max_cluster = max_cluster
         self._llm_model = llm_model
         self._embd_model = embd_model
@@ -67,14 +71,7 @@ class RecursiveAbstractiveProcessing4TreeOrganizedRetrieval:
 
     def _get_optimal_clusters(self, embeddings: np.ndarray, random_state: int):
         max_clusters = min(self._max_cluster, len(embeddings))
-        n_clusters = np.arange(1, max_clusters)
-        bics = []
-        for n in n_clusters:
-            gm = GaussianMixture(n_components=n, random_state=random_state)
-            gm.fit(embeddings)
-            bics.append(gm.bic(embeddings))
-        optimal_clusters = n_clusters[np.argmin(bics)]
-        return optimal_clusters
+        return CLUSTER_SEARCH_STRATEGIES[self._cluster_search](embeddings, max_clusters, random_state)
 
     async def __call__(self, chunks, random_state, callback=None):
         layers = [(0, len(chunks))]
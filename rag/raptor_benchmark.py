@@ -0,0 +1,60 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Benchmark of the RAPTOR cluster-count search strategies on synthetic Gaussian blobs.
+
+    python -m rag.raptor_benchmark --points 2000 --dim 12 --max_cluster 64 --trials 3
+
+For every strategy, the chosen n, its BIC, the adjusted rand index of the resulting
+clustering against the true blobs and the wall time are printed next to the exhaustive search.
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score
+from sklearn.mixture import GaussianMixture
+
+from rag.raptor_cluster import CLUSTER_SEARCH_STRATEGIES, _bic
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=12, help="RAPTOR reduces embeddings to 12 dims with UMAP")
+    parser.add_argument("--max_cluster", type=int, default=64)
+    parser.add_argument("--trials", type=int, default=3, help="Each trial draws a different number of blobs")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for trial in range(args.trials):
+        centers = int(rng.integers(2, args.max_cluster // 2))
+        embeddings, labels = make_blobs(n_samples=args.points, n_features=args.dim, centers=centers,
+                                        cluster_std=1.5, random_state=trial)
+        max_clusters = min(args.max_cluster, len(embeddings))
+        print(f"Trial {trial}: {args.points} points, {centers} blobs, max_cluster {max_clusters}")
+        for name, search in CLUSTER_SEARCH_STRATEGIES.items():
+            st = time.perf_counter()
+            n = search(embeddings, max_clusters, trial)
+            elapsed = time.perf_counter() - st
+            gm = GaussianMixture(n_components=n, random_state=trial).fit(embeddings)
+            ari = adjusted_rand_score(labels, gm.predict(embeddings))
+            print(f"  {name:>15}: n={n:<3} BIC={_bic(embeddings, n, trial):.1f} ARI={ari:.3f} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
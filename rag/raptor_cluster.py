@@ -0,0 +1,73 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Strategies choosing the number of GaussianMixture components of a RAPTOR layer by BIC.
+
+Only depends on numpy and scikit-learn so that the benchmark can import it without the LLM stack.
+"""
+import numpy as np
+from sklearn.mixture import GaussianMixture
+
+# Consecutive coarse steps without a lower BIC before the coarse sweep stops.
+CLUSTER_SEARCH_PATIENCE = 2
+
+
+def _bic(embeddings: np.ndarray, n: int, random_state: int) -> float:
+    gm = GaussianMixture(n_components=n, random_state=random_state)
+    gm.fit(embeddings)
+    return gm.bic(embeddings)
+
+
+def exhaustive_cluster_search(embeddings: np.ndarray, max_clusters: int, random_state: int) -> int:
+    """Fit a GaussianMixture for every n in [1, max_clusters) and keep the lowest BIC."""
+    n_clusters = list(range(1, max(2, max_clusters)))
+    bics = [_bic(embeddings, n, random_state) for n in n_clusters]
+    return n_clusters[int(np.argmin(bics))]
+
+
+def coarse_to_fine_cluster_search(embeddings: np.ndarray, max_clusters: int, random_state: int) -> int:
+    """
+    Sweep n in steps of sqrt(max_clusters), stopping once the BIC hasn't improved for
+    CLUSTER_SEARCH_PATIENCE steps, then try every n within one step of the best coarse n.
+    About 3*sqrt(max_clusters) fits instead of max_clusters.
+    """
+    bics = {}
+
+    def bic(n):
+        if n not in bics:
+            bics[n] = _bic(embeddings, n, random_state)
+        return bics[n]
+
+    max_clusters = max(2, max_clusters)
+    step = max(1, int(np.sqrt(max_clusters - 1)))
+    best, stale = None, 0
+    for n in range(1, max_clusters, step):
+        if best is None or bic(n) < bic(best):
+            best, stale = n, 0
+            continue
+        stale += 1
+        if stale >= CLUSTER_SEARCH_PATIENCE:
+            break
+    for n in range(max(1, best - step + 1), min(max_clusters, best + step)):
+        bic(n)
+    return min(bics, key=lambda n: (bics[n], n))
+
+
+# Selected per knowledge base with parser_config["raptor"]["cluster_search"].
+CLUSTER_SEARCH_STRATEGIES = {
+    "exhaustive": exhaustive_cluster_search,
+    "coarse_to_fine": coarse_to_fine_cluster_search,
+}
@@ -35,12 +35,17 @@ except Exception:
 DOC_MAXIMUM_SIZE = int(os.environ.get("MAX_CONTENT_LENGTH", 128 * 1024 * 1024))
 
 SVR_QUEUE_NAME = "rag_flow_svr_queue"
+# Task progress events published by the task executors, consumed by the document progress aggregator
+SVR_PROGRESS_QUEUE_NAME = "rag_flow_svr_progress"
+SVR_PROGRESS_QUEUE_MAX_LEN = 100000
 SVR_QUEUE_RETENTION = 60*60
 SVR_QUEUE_MAX_LEN = 1024
 SVR_CONSUMER_NAME = "rag_flow_svr_consumer"
 SVR_CONSUMER_GROUP_NAME = "rag_flow_svr_consumer_group"
 PAGERANK_FLD = "pagerank_fea"
 TAG_FLD = "tag_feas"
+# Token count of content_with_weight, stored at index time
+TOKEN_NUM_FLD = "token_num_int"
 
 
 def print_rag_settings():
@@ -14,14 +14,31 @@
 #  limitations under the License.
 #
 import logging
+import os
 import time
-import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from api.db.db_models import close_connection
 from api.db.services.task_service import TaskService
+from rag.utils.file_cache import (
+    FILE_CACHE_DISK_BYTES,
+    FILE_CACHE_REDIS_BYTES,
+    FILE_CACHE_REDIS_MAX_OBJECT,
+    cache_key,
+    delete_redis,
+    disk_entries,
+    disk_path,
+    redis_entries,
+    write_disk,
+    write_redis,
+)
 from rag.utils.storage_factory import STORAGE_IMPL
 from rag.utils.redis_conn import REDIS_CONN
 
+FILE_CACHE_FETCH_WORKERS = int(os.environ.get("FILE_CACHE_FETCH_WORKERS", "4"))
+# Eviction rank of the cached files no longer queued, above any queue position
+UNQUEUED_RANK = 10 ** 9
+
 
 def collect():
     doc_locations = TaskService.get_ongoing_doc_name()
@@ -32,29 +49,88 @@ def collect():
     return doc_locations
 
 
-def main():
+def make_room(size, position, entries, budget):
+    """
+    `entries` maps the cached objects of a tier to (size, rank), the higher the rank the sooner evicted:
+    the queue position, or above UNQUEUED_RANK once no longer queued.
+    Returns the entries to evict so that an object of `size` at queue `position` fits in `budget`,
+    None when it can't fit without evicting objects needed sooner.
+    """
+    if size > budget:
+        return None
+    free = budget - sum(s for s, _ in entries.values())
+    victims = []
+    for key in sorted(entries, key=lambda k: -entries[k][1]):
+        if free >= size or entries[key][1] <= position:
+            break
+        victims.append(key)
+        free += entries[key][0]
+    return victims if free >= size else None
+
+
+def fetch(bucket, name, to_disk, to_redis):
+    try:
+        file_bin = STORAGE_IMPL.get(bucket, name)
+        if to_disk:
+            write_disk(bucket, name, file_bin)
+        if to_redis:
+            write_redis(bucket, name, file_bin)
+        logging.info("CACHE: {}/{} {} bytes".format(bucket, name, len(file_bin)))
+    except Exception:
+        logging.exception("CACHE: {}/{} got exception".format(bucket, name))
+
+
+def main(executor):
+    """
+    Prefetch the files of the ongoing tasks in queue order, as long as they fit in the byte budget of
+    each tier, evicting the files no longer queued first, then the ones queued behind.
+    """
     locations = collect()
-    if not locations:
+    if not locations or not REDIS_CONN.is_alive():
         return
     logging.info(f"TASKS: {len(locations)}")
-    for kb_id, loc in locations:
-        try:
-            if REDIS_CONN.is_alive():
-                try:
-                    key = "{}/{}".format(kb_id, loc)
-                    if REDIS_CONN.exist(key):
-                        continue
-                    file_bin = STORAGE_IMPL.get(kb_id, loc)
-                    REDIS_CONN.transaction(key, file_bin, 12 * 60)
-                    logging.info("CACHE: {}".format(loc))
-                except Exception as e:
-                    traceback.print_stack(e)
-        except Exception as e:
-            traceback.print_stack(e)
+    position = {cache_key(bucket, name): i for i, (bucket, name, _) in enumerate(locations)}
+    path_key = {disk_path(bucket, name): cache_key(bucket, name) for bucket, name, _ in locations}
+    now = time.time()
+    disk = {path: (size, position[path_key[path]] if path in path_key else UNQUEUED_RANK + now - mtime)
+            for path, (size, mtime) in disk_entries().items()}
+    redis = {key: (size, position.get(key, UNQUEUED_RANK)) for key, size in redis_entries().items()}
+
+    jobs = []
+    for i, (bucket, name, size) in enumerate(locations):
+        key, path = cache_key(bucket, name), disk_path(bucket, name)
+        to_disk = to_redis = False
+        if path not in disk:
+            victims = make_room(size, i, disk, FILE_CACHE_DISK_BYTES)
+            if victims is not None:
+                for victim in victims:
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                    disk.pop(victim)
+                disk[path] = (size, i)
+                to_disk = True
+        if key not in redis and size <= FILE_CACHE_REDIS_MAX_OBJECT:
+            victims = make_room(size, i, redis, FILE_CACHE_REDIS_BYTES)
+            if victims is not None:
+                for victim in victims:
+                    delete_redis(victim)
+                    redis.pop(victim)
+                redis[key] = (size, i)
+                to_redis = True
+        if to_disk or to_redis:
+            jobs.append(executor.submit(fetch, bucket, name, to_disk, to_redis))
+    for job in jobs:
+        job.result()
 
 
 if __name__ == "__main__":
-    while True:
-        main()
-        close_connection()
-        time.sleep(1)
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=FILE_CACHE_FETCH_WORKERS) as executor:
+        while True:
+            try:
+                main(executor)
+            except Exception:
+                logging.exception("cache_file_svr got exception")
+            close_connection()
+            time.sleep(1)
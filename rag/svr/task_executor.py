@@ -17,15 +17,18 @@ from multiprocessing.context import TimeoutError
 from timeit import default_timer as timer
 import tracemalloc
 import signal
+import threading
+import time
 import trio
 import exceptiongroup
 import faulthandler
 import numpy as np
 from peewee import DoesNotExist
-from api.db import LLMType, ParserType, TaskStatus
+from api.db import FileType, LLMType, ParserType, TaskStatus
 from api.db.services.document_service import DocumentService
 from api.db.services.llm_service import LLMBundle
-from api.db.services.task_service import TaskService
+from api.db.services.task_service import TaskService, chunk_store_digest, pdf_page_ranges, split_task, split_task_ranges, \
+    trim_header_by_lines
 from api.db.services.file2document_service import File2DocumentService
 from api import settings
 from api.versions import get_ragflow_version
@@ -34,9 +37,13 @@ from rag.app import laws, paper, presentation, manual, qa, table, book, resume,
     email, tag
 from rag.nlp import search, rag_tokenizer
 from rag.raptor import RecursiveAbstractiveProcessing4TreeOrganizedRetrieval as Raptor
-from rag.settings import DOC_MAXIMUM_SIZE, SVR_QUEUE_NAME, print_rag_settings, TAG_FLD, PAGERANK_FLD
-from rag.utils import num_tokens_from_string
-from rag.utils.redis_conn import REDIS_CONN
+from rag.settings import DOC_MAXIMUM_SIZE, print_rag_settings, TAG_FLD, PAGERANK_FLD, TOKEN_NUM_FLD
+from rag.utils import num_tokens_from_string, num_tokens_from_strings
+from rag.utils.redis_conn import REDIS_CONN, RedisAckBuffer
+from rag.utils.task_queue import FairTaskQueue, queue_priority
+from rag.utils.task_split import adaptive_split_enabled, cost_key, record_range, straggler_cut
+from rag.utils.file_cache import get_file
+from api.utils.file_utils import pdf_page_count
 from rag.utils.storage_factory import STORAGE_IMPL
 from graphrag.utils import chat_limiter
 
@@ -64,7 +71,6 @@ FACTORY = {
     ParserType.TAG.value: tag
 }
 
-UNACKED_ITERATOR = None
 CONSUMER_NAME = "task_consumer_" + CONSUMER_NO
 BOOT_AT = datetime.now().astimezone().isoformat(timespec="milliseconds")
 PENDING_TASKS = 0
@@ -76,8 +82,30 @@ CURRENT_TASKS = {}
 
 MAX_CONCURRENT_TASKS = int(os.environ.get('MAX_CONCURRENT_TASKS', "5"))
 MAX_CONCURRENT_CHUNK_BUILDERS = int(os.environ.get('MAX_CONCURRENT_CHUNK_BUILDERS', "1"))
-task_limiter = trio.CapacityLimiter(MAX_CONCURRENT_TASKS)
+# Seconds between two flushes of the buffered acks.
+TASK_ACK_FLUSH_INTERVAL = float(os.environ.get('TASK_ACK_FLUSH_INTERVAL', "1"))
+# Pending messages idle for longer than this many seconds belong to a dead executor and are reclaimed,
+# live executors reset the idle time of the messages they work on every 30 seconds in report_status.
+TASK_RECLAIM_IDLE = int(os.environ.get('TASK_RECLAIM_IDLE', "600"))
+TASK_RECLAIM_INTERVAL = 60
+# Chunks read per request when copying the chunks of a document with the same content
+CHUNK_SOURCE_BATCH_SIZE = 1000
+SVR_CONSUMER_GROUP_NAME = "rag_flow_svr_task_broker"
+ACK_BUFFER = RedisAckBuffer(REDIS_CONN, SVR_CONSUMER_GROUP_NAME)
+TASK_QUEUE = FairTaskQueue(SVR_CONSUMER_GROUP_NAME, CONSUMER_NAME, ACK_BUFFER)
+# (queue name, message id) of the messages read and not acked yet
+INFLIGHT_MSGS = set()
+# the ones a worker started, kept alive in report_status; the others can be reclaimed by idle executors
+STARTED_MSGS = set()
 chunk_limiter = trio.CapacityLimiter(MAX_CONCURRENT_CHUNK_BUILDERS)
+# Progress of a task is written at most once per this many milliseconds, except the final one.
+PROGRESS_FLUSH_INTERVAL = int(os.environ.get('PROGRESS_FLUSH_INTERVAL_MS', "1000")) / 1000
+PROGRESS_LOG_MAX_LENGTH = 3000
+# Seconds the cancel flag of a document is cached for.
+CANCEL_CHECK_INTERVAL = 3
+# task id -> progress log and latest progress of the tasks run by this executor, see set_progress
+TASK_PROGRESS = {}
+progress_lock = threading.Lock()
 
 # SIGUSR1 handler: start tracemalloc and take snapshot
 def start_tracemalloc_and_snapshot(signum, frame):
@@ -116,11 +144,61 @@ class TaskCanceledException(Exception):
         self.msg = msg
 
 
+def _task_progress(task_id):
+    state = TASK_PROGRESS.get(task_id)
+    if state is None:
+        e, task = TaskService.get_by_id(task_id)
+        if not e:
+            raise DoesNotExist(f"Task {task_id} not found")
+        state = TASK_PROGRESS.setdefault(task_id, {
+            "doc_id": task.doc_id,
+            "log": task.progress_msg or "",
+            "progress": None,
+            "dirty": False,
+            "flushed_at": 0,
+            "flush_lock": threading.Lock(),
+            "canceled": False,
+            "cancel_checked_at": 0,
+        })
+    return state
+
+
+def has_canceled(state):
+    now = time.monotonic()
+    if now - state["cancel_checked_at"] >= CANCEL_CHECK_INTERVAL:
+        state["canceled"] = DocumentService.has_canceled(state["doc_id"])
+        state["cancel_checked_at"] = now
+    return state["canceled"]
+
+
+def flush_progress(task_id, force=False):
+    state = TASK_PROGRESS.get(task_id)
+    if not state:
+        return
+    with state["flush_lock"]:
+        with progress_lock:
+            if not state["dirty"] or (not force and time.monotonic() - state["flushed_at"] < PROGRESS_FLUSH_INTERVAL):
+                return
+            d = {"progress_msg": state["log"]}
+            if state["progress"] is not None:
+                d["progress"] = state["progress"]
+            state["dirty"] = False
+            state["flushed_at"] = time.monotonic()
+        TaskService.update_progress(task_id, d)
+        close_connection()
+        DocumentService.publish_progress(state["doc_id"], task_id, d.get("progress"))
+
+
 def set_progress(task_id, from_page=0, to_page=-1, prog=None, msg="Processing..."):
+    """
+    Append to the progress log of a task kept in TASK_PROGRESS. The log and the latest progress are
+    written at most every PROGRESS_FLUSH_INTERVAL, right away for a final progress (failed, done or canceled).
+    """
     try:
         if prog is not None and prog < 0:
             msg = "[ERROR]" + msg
-        cancel = TaskService.do_cancel(task_id)
+        state = _task_progress(task_id)
+        cancel = has_canceled(state)
 
         if cancel:
             msg += " [Canceled]"
@@ -132,13 +210,15 @@ def set_progress(task_id, from_page=0, to_page=-1, prog=None, msg="Processing...
                     msg = f"Page({from_page + 1}~{to_page + 1}): " + msg
         if msg:
             msg = datetime.now().strftime("%H:%M:%S") + " " + msg
-        d = {"progress_msg": msg}
-        if prog is not None:
-            d["progress"] = prog
 
-        TaskService.update_progress(task_id, d)
+        with progress_lock:
+            if msg:
+                state["log"] = trim_header_by_lines(state["log"] + "\n" + msg, PROGRESS_LOG_MAX_LENGTH)
+            if prog is not None:
+                state["progress"] = prog
+            state["dirty"] = True
+        flush_progress(task_id, force=prog is not None and (prog < 0 or prog >= 1))
 
-        close_connection()
         if cancel:
             raise TaskCanceledException(msg)
         logging.info(f"set_progress({task_id}), progress: {prog}, progress_msg: {msg}")
@@ -147,28 +227,94 @@ def set_progress(task_id, from_page=0, to_page=-1, prog=None, msg="Processing...
     except Exception:
         logging.exception(f"set_progress({task_id}), progress: {prog}, progress_msg: {msg}, got exception")
 
-async def collect():
-    global CONSUMER_NAME, DONE_TASKS, FAILED_TASKS
-    global UNACKED_ITERATOR
-    try:
-        if not UNACKED_ITERATOR:
-            UNACKED_ITERATOR = REDIS_CONN.get_unacked_iterator(SVR_QUEUE_NAME, "rag_flow_svr_task_broker", CONSUMER_NAME)
+
+def finish_progress(task_id):
+    flush_progress(task_id, force=True)
+    TASK_PROGRESS.pop(task_id, None)
+
+
+async def flush_progress_loop():
+    while True:
+        await trio.sleep(PROGRESS_FLUSH_INTERVAL)
+        for task_id in list(TASK_PROGRESS.keys()):
+            try:
+                await trio.to_thread.run_sync(flush_progress, task_id)
+            except Exception:
+                logging.exception(f"flush_progress({task_id}) got exception")
+
+
+def ack_task(redis_msg):
+    redis_msg.ack()
+    INFLIGHT_MSGS.discard((redis_msg.get_queue_name(), redis_msg.get_msg_id()))
+    STARTED_MSGS.discard((redis_msg.get_queue_name(), redis_msg.get_msg_id()))
+
+
+def start_task(redis_msg):
+    """Keep alive a message from now on, unless an idle executor took it over while it was in the prefetch buffer."""
+    key = (redis_msg.get_queue_name(), redis_msg.get_msg_id())
+    if not REDIS_CONN.queue_claim_own(key[0], SVR_CONSUMER_GROUP_NAME, CONSUMER_NAME, key[1]):
+        INFLIGHT_MSGS.discard(key)
+        return False
+    STARTED_MSGS.add(key)
+    return True
+
+
+async def prefetch_tasks(send_channel):
+    """
+    Fill the prefetch buffer, reading as many messages as it has room for in one round trip: first the
+    messages left unacked by the previous run of this consumer, then new ones picked by TASK_QUEUE among
+    the tenants and priority classes. Nothing is read while the buffer is full, so at most
+    MAX_CONCURRENT_TASKS messages wait for a worker. Every TASK_RECLAIM_INTERVAL seconds the messages of dead executors
+    are taken over with XAUTOCLAIM.
+    """
+    backlog_done = False
+    last_reclaim = trio.current_time()
+    while True:
+        count = MAX_CONCURRENT_TASKS - send_channel.statistics().current_buffer_used
+        if count <= 0:
+            await trio.sleep(0.1)
+            continue
         try:
-            redis_msg = next(UNACKED_ITERATOR)
-        except StopIteration:
-            redis_msg = REDIS_CONN.queue_consumer(SVR_QUEUE_NAME, "rag_flow_svr_task_broker", CONSUMER_NAME)
-        if not redis_msg:
+            if not backlog_done:
+                msgs = await trio.to_thread.run_sync(TASK_QUEUE.read_backlog, count)
+                backlog_done = msgs is None
+                msgs = msgs or []
+            elif trio.current_time() - last_reclaim > TASK_RECLAIM_INTERVAL:
+                scanned, msgs = await trio.to_thread.run_sync(TASK_QUEUE.reclaim, TASK_RECLAIM_IDLE * 1000, count)
+                if scanned:
+                    last_reclaim = trio.current_time()
+                if msgs:
+                    logging.info(f"prefetch_tasks reclaimed {len(msgs)} stale messages")
+            else:
+                msgs = await trio.to_thread.run_sync(TASK_QUEUE.read, count)
+                if not msgs:
+                    await trio.sleep(0.1)
+        except Exception:
+            logging.exception("prefetch_tasks got exception")
             await trio.sleep(1)
-            return None, None
-    except Exception:
-        logging.exception("collect got exception")
-        return None, None
+            continue
+        for redis_msg in msgs:
+            key = (redis_msg.get_queue_name(), redis_msg.get_msg_id())
+            if key in INFLIGHT_MSGS:
+                continue
+            INFLIGHT_MSGS.add(key)
+            await send_channel.send(redis_msg)
+
 
+async def flush_acks():
+    while True:
+        await trio.sleep(TASK_ACK_FLUSH_INTERVAL)
+        if len(ACK_BUFFER):
+            await trio.to_thread.run_sync(ACK_BUFFER.flush)
+
+
+async def collect(redis_msg):
+    global FAILED_TASKS
     msg = redis_msg.get_message()
     if not msg:
         logging.error(f"collect got empty message of {redis_msg.get_msg_id()}")
-        redis_msg.ack()
-        return None, None
+        ack_task(redis_msg)
+        return None
 
     canceled = False
     task = TaskService.get_task(msg["id"])
@@ -179,28 +325,29 @@ async def collect():
         state = "is unknown" if not task else "has been cancelled"
         FAILED_TASKS += 1
         logging.warning(f"collect task {msg['id']} {state}")
-        redis_msg.ack()
-        return None, None
+        ack_task(redis_msg)
+        return None
     task["task_type"] = msg.get("task_type", "")
-    return redis_msg, task
+    task["priority"] = queue_priority(redis_msg.get_queue_name())
+    return task
 
 
-async def get_storage_binary(bucket, name):
-    return await trio.to_thread.run_sync(lambda: STORAGE_IMPL.get(bucket, name))
+async def get_storage_binary(bucket, name, size=None):
+    return await trio.to_thread.run_sync(lambda: get_file(bucket, name, size))
 
 
-async def build_chunks(task, progress_callback):
+async def get_source_binary(task, progress_callback):
     if task["size"] > DOC_MAXIMUM_SIZE:
         set_progress(task["id"], prog=-1, msg="File size exceeds( <= %dMb )" %
                                               (int(DOC_MAXIMUM_SIZE / 1024 / 1024)))
-        return []
+        return None
 
-    chunker = FACTORY[task["parser_id"].lower()]
     try:
         st = timer()
         bucket, name = File2DocumentService.get_storage_address(doc_id=task["doc_id"])
-        binary = await get_storage_binary(bucket, name)
+        binary = await get_storage_binary(bucket, name, task["size"])
         logging.info("From minio({}) {}/{}".format(timer() - st, task["location"], task["name"]))
+        return binary
     except TimeoutError:
         progress_callback(-1, "Internal server error: Fetch file from minio timeout. Could you try it again.")
         logging.exception(
@@ -214,7 +361,58 @@ async def build_chunks(task, progress_callback):
         logging.exception("Chunking {}/{} got exception".format(task["location"], task["name"]))
         raise
 
+
+def read_chunk_source(source):
+    """All the chunks of a chunk store reference, embeddings included, None if some of them are gone."""
+    chunk_ids = source["chunk_ids"].split()
+    found = {}
+    for b in range(0, len(chunk_ids), CHUNK_SOURCE_BATCH_SIZE):
+        found.update(settings.docStoreConn.mget(chunk_ids[b:b + CHUNK_SOURCE_BATCH_SIZE], search.index_name(source["tenant_id"]), [source["kb_id"]]))
+    if any(chunk_id not in found for chunk_id in chunk_ids):
+        return None
+    return [found[chunk_id] for chunk_id in chunk_ids]
+
+
+async def clone_chunks(task, content_digest, progress_callback):
+    """
+    Copies, embeddings included, of the chunks another document built from the same content with the same
+    settings, rebound to the task's document and knowledge base. None if there is no such chunks.
+    """
+    sources = await trio.to_thread.run_sync(lambda: TaskService.get_chunk_sources(content_digest))
+    for source in sources:
+        if source["doc_id"] == task["doc_id"]:
+            continue
+        st = timer()
+        chunks = await trio.to_thread.run_sync(lambda: read_chunk_source(source))
+        if chunks is None:
+            # the source document was deleted or re-parsed meanwhile
+            await trio.to_thread.run_sync(lambda: TaskService.release_chunk_store(task_id=source["id"]))
+            continue
+
+        docs = []
+        for ck in chunks:
+            d = {k: v for k, v in ck.items() if not k.startswith("_") and k not in ["available_int", PAGERANK_FLD]}
+            d["doc_id"] = task["doc_id"]
+            d["kb_id"] = str(task["kb_id"])
+            if task["pagerank"]:
+                d[PAGERANK_FLD] = int(task["pagerank"])
+            d["id"] = xxhash.xxh64((d["content_with_weight"] + str(d["doc_id"])).encode("utf-8")).hexdigest()
+            d["create_time"] = str(datetime.now()).replace("T", " ")[:19]
+            d["create_timestamp_flt"] = datetime.now().timestamp()
+            if d.get("img_id"):
+                src_bucket, src_name = d["img_id"].split("-")
+                await trio.to_thread.run_sync(lambda: STORAGE_IMPL.put(task["kb_id"], d["id"], STORAGE_IMPL.get(src_bucket, src_name)))
+                d["img_id"] = "{}-{}".format(task["kb_id"], d["id"])
+            docs.append(d)
+        progress_callback(msg="Reused {} chunks of document {} with the same content ({:.2f}s)".format(len(docs), source["doc_id"], timer() - st))
+        return docs
+    return None
+
+
+async def build_chunks(task, binary, progress_callback):
+    chunker = FACTORY[task["parser_id"].lower()]
     try:
+        st = timer()
         async with chunk_limiter:
             cks = await trio.to_thread.run_sync(lambda: chunker.chunk(task["name"], binary=binary, from_page=task["from_page"],
                                 to_page=task["to_page"], lang=task["language"], callback=progress_callback,
@@ -266,6 +464,8 @@ async def build_chunks(task, progress_callback):
         del d["image"]
         docs.append(d)
     logging.info("MINIO PUT({}):{}".format(task["name"], el))
+    for d, token_num in zip(docs, num_tokens_from_strings([d["content_with_weight"] for d in docs])):
+        d[TOKEN_NUM_FLD] = token_num
 
     if task["parser_config"].get("auto_keywords", 0):
         st = timer()
@@ -412,7 +612,8 @@ async def run_raptor(row, chat_mdl, embd_mdl, vector_size, callback=None):
         embd_mdl,
         row["parser_config"]["raptor"]["prompt"],
         row["parser_config"]["raptor"]["max_token"],
-        row["parser_config"]["raptor"]["threshold"]
+        row["parser_config"]["raptor"]["threshold"],
+        row["parser_config"]["raptor"].get("cluster_search", "exhaustive")
     )
     original_length = len(chunks)
     chunks = await raptor(chunks, row["parser_config"]["raptor"]["random_seed"], callback)
@@ -435,12 +636,49 @@ async def run_raptor(row, chat_mdl, embd_mdl, vector_size, callback=None):
         d["content_with_weight"] = content
         d["content_ltks"] = rag_tokenizer.tokenize(content)
         d["content_sm_ltks"] = rag_tokenizer.fine_grained_tokenize(d["content_ltks"])
+        d[TOKEN_NUM_FLD] = num_tokens_from_string(content)
         res.append(d)
-        tk_count += num_tokens_from_string(content)
+        tk_count += d[TOKEN_NUM_FLD]
     return res, tk_count
 
 
+async def split_straggler(task):
+    """Hands the pages of a PDF task predicted to run too long over to a new task, before they are parsed."""
+    # a PDF whose page count is unknown yet is split by split_by_page_count
+    if task.get("task_type", "") or task["type"] != FileType.PDF.value or not task.get("page_num") or \
+            not adaptive_split_enabled(task["parser_id"], task["parser_config"]):
+        return
+    from_page, to_page = task["from_page"], task["to_page"]
+    cut = await trio.to_thread.run_sync(lambda: straggler_cut(from_page, to_page, cost_key(task["parser_id"], task["parser_config"])))
+    if not cut:
+        return
+    tail = await trio.to_thread.run_sync(lambda: split_task(task, cut, task["priority"]))
+    logging.info(f"split_straggler task {task['id']} pages {from_page}-{to_page}: pages {cut}-{to_page} moved to task {tail['id']}")
+
+
+async def split_by_page_count(task, binary):
+    """
+    A PDF queued before its page count was known got one task per page range. The count is recorded once the
+    file is read here, and the range split into tasks as queue_tasks would have done.
+    """
+    if task.get("task_type", "") or task["type"] != FileType.PDF.value or task.get("page_num"):
+        return
+    pages = await trio.to_thread.run_sync(lambda: pdf_page_count(binary))
+    if not pages:
+        return
+    await trio.to_thread.run_sync(lambda: DocumentService.update_by_id(task["doc_id"], {"page_num": pages}))
+    task["page_num"] = pages
+    from_page, to_page = task["from_page"], task["to_page"]
+    ranges = pdf_page_ranges(task, pages, [(from_page + 1, to_page + 1)])
+    if not ranges or ranges == [(from_page, to_page)]:
+        return
+    tails = await trio.to_thread.run_sync(lambda: split_task_ranges(task, ranges, task["priority"]))
+    logging.info(f"split_by_page_count task {task['id']} pages {from_page}-{to_page} of {pages}: "
+                 f"kept {task['from_page']}-{task['to_page']}, {len(tails)} tasks added")
+
+
 async def do_handle_task(task):
+    await split_straggler(task)
     task_id = task["id"]
     task_from_page = task["from_page"]
     task_to_page = task["to_page"]
@@ -482,6 +720,8 @@ async def do_handle_task(task):
 
     init_kb(task, vector_size)
 
+    task_content_digest = ""
+    task_parsed = False
     # Either using RAPTOR or Standard chunking methods
     if task.get("task_type", "") == "raptor":
         # bind LLM for raptor
@@ -503,28 +743,40 @@ async def do_handle_task(task):
     else:
         # Standard chunking methods
         start_ts = timer()
-        chunks = await build_chunks(task, progress_callback)
-        logging.info("Build document {}: {:.2f}s".format(task_document_name, timer() - start_ts))
-        if chunks is None:
-            return
-        if not chunks:
-            progress_callback(1., msg=f"No chunk built from {task_document_name}")
-            return
-        # TODO: exception handler
-        ## set_progress(task["did"], -1, "ERROR: ")
-        progress_callback(msg="Generate {} chunks".format(len(chunks)))
-        start_ts = timer()
-        try:
-            token_count, vector_size = await embedding(chunks, embedding_model, task_parser_config, progress_callback)
-        except Exception as e:
-            error_message = "Generate embedding error:{}".format(str(e))
-            progress_callback(-1, error_message)
-            logging.exception(error_message)
+        binary = await get_source_binary(task, progress_callback)
+        if binary is not None:
+            await split_by_page_count(task, binary)
+            task_from_page, task_to_page = task["from_page"], task["to_page"]
+            progress_callback = partial(set_progress, task_id, task_from_page, task_to_page)
+        task_content_digest = chunk_store_digest(task, binary) if binary is not None else ""
+        chunks = await clone_chunks(task, task_content_digest, progress_callback) if task_content_digest else None
+        if chunks:
+            # nothing was embedded
             token_count = 0
-            raise
-        progress_message = "Embedding chunks ({:.2f}s)".format(timer() - start_ts)
-        logging.info(progress_message)
-        progress_callback(msg=progress_message)
+        else:
+            chunks = await build_chunks(task, binary, progress_callback) if binary is not None else []
+            task_parsed = True
+            logging.info("Build document {}: {:.2f}s".format(task_document_name, timer() - start_ts))
+            if chunks is None:
+                return
+            if not chunks:
+                progress_callback(1., msg=f"No chunk built from {task_document_name}")
+                return
+            # TODO: exception handler
+            ## set_progress(task["did"], -1, "ERROR: ")
+            progress_callback(msg="Generate {} chunks".format(len(chunks)))
+            start_ts = timer()
+            try:
+                token_count, vector_size = await embedding(chunks, embedding_model, task_parser_config, progress_callback)
+            except Exception as e:
+                error_message = "Generate embedding error:{}".format(str(e))
+                progress_callback(-1, error_message)
+                logging.exception(error_message)
+                token_count = 0
+                raise
+            progress_message = "Embedding chunks ({:.2f}s)".format(timer() - start_ts)
+            logging.info(progress_message)
+            progress_callback(msg=progress_message)
 
     chunk_count = len(set([chunk["id"] for chunk in chunks]))
     start_ts = timer()
@@ -551,6 +803,12 @@ async def do_handle_task(task):
                                                                                      timer() - start_ts))
 
     DocumentService.increment_chunk_num(task_doc_id, task_dataset_id, token_count, chunk_count, 0)
+    if task_content_digest:
+        # the chunks of the task are complete, other documents with the same content can copy them from now on
+        TaskService.update_content_digest(task_id, task_content_digest)
+    if task_parsed and task["type"] == FileType.PDF.value and adaptive_split_enabled(task["parser_id"], task_parser_config):
+        # timing of the pages actually parsed, for the sizing of the next ranges
+        record_range(cost_key(task["parser_id"], task_parser_config), task_to_page - task_from_page, timer() - task_start_ts, task_doc_id)
 
     time_cost = timer() - start_ts
     task_time_cost = timer() - task_start_ts
@@ -561,9 +819,12 @@ async def do_handle_task(task):
                                                                                    token_count, task_time_cost))
 
 
-async def handle_task():
+async def handle_task(redis_msg):
     global DONE_TASKS, FAILED_TASKS
-    redis_msg, task = await collect()
+    if not await trio.to_thread.run_sync(start_task, redis_msg):
+        logging.info(f"handle_task skips message {redis_msg.get_msg_id()}, reclaimed by another executor")
+        return
+    task = await collect(redis_msg)
     if not task:
         return
     try:
@@ -585,7 +846,16 @@ async def handle_task():
         except Exception:
             pass
         logging.exception(f"handle_task got exception for task {json.dumps(task)}")
-    redis_msg.ack()
+    try:
+        await trio.to_thread.run_sync(finish_progress, task["id"])
+    except Exception:
+        logging.exception(f"finish_progress({task['id']}) got exception")
+    ack_task(redis_msg)
+
+
+async def task_worker(receive_channel):
+    async for redis_msg in receive_channel:
+        await handle_task(redis_msg)
 
 
 async def report_status():
@@ -594,10 +864,9 @@ async def report_status():
     while True:
         try:
             now = datetime.now()
-            group_info = REDIS_CONN.queue_info(SVR_QUEUE_NAME, "rag_flow_svr_task_broker")
-            if group_info is not None:
-                PENDING_TASKS = int(group_info.get("pending", 0))
-                LAG_TASKS = int(group_info.get("lag", 0))
+            queues = TASK_QUEUE.metrics()
+            PENDING_TASKS = sum(q["pending"] for q in queues.values())
+            LAG_TASKS = sum(q["depth"] for q in queues.values())
 
             current = copy.deepcopy(CURRENT_TASKS)
             heartbeat = json.dumps({
@@ -609,8 +878,14 @@ async def report_status():
                 "done": DONE_TASKS,
                 "failed": FAILED_TASKS,
                 "current": current,
+                "queues": queues,
+                "max_concurrent": MAX_CONCURRENT_TASKS,
             })
             REDIS_CONN.zadd(CONSUMER_NAME, heartbeat, now.timestamp())
+            inflight = {}
+            for queue_name, msg_id in list(STARTED_MSGS):
+                inflight.setdefault(queue_name, []).append(msg_id)
+            REDIS_CONN.queue_keepalive(SVR_CONSUMER_GROUP_NAME, CONSUMER_NAME, inflight)
             logging.info(f"{CONSUMER_NAME} reported heartbeat: {heartbeat}")
 
             expired = REDIS_CONN.zcount(CONSUMER_NAME, 0, now.timestamp() - 60 * 30)
@@ -639,11 +914,15 @@ async def main():
     if TRACE_MALLOC_ENABLED:
         start_tracemalloc_and_snapshot(None, None)
 
+    # Messages read ahead of the workers, at most MAX_CONCURRENT_TASKS
+    send_channel, receive_channel = trio.open_memory_channel(MAX_CONCURRENT_TASKS)
     async with trio.open_nursery() as nursery:
         nursery.start_soon(report_status)
-        while True:
-            async with task_limiter:
-                nursery.start_soon(handle_task)
+        nursery.start_soon(flush_acks)
+        nursery.start_soon(flush_progress_loop)
+        nursery.start_soon(prefetch_tasks, send_channel)
+        for _ in range(MAX_CONCURRENT_TASKS):
+            nursery.start_soon(task_worker, receive_channel)
     logging.error("BUG!!! You should not reach here!!!")
 
 if __name__ == "__main__":
@@ -16,7 +16,10 @@
 
 import os
 import re
+import threading
 import tiktoken
+import xxhash
+from cachetools import LRUCache
 from api.utils.file_utils import get_project_base_directory
 
 def singleton(cls, *args, **kw):
@@ -78,14 +81,66 @@ os.environ["TIKTOKEN_CACHE_DIR"] = tiktoken_cache_dir
 encoder = tiktoken.get_encoding("cl100k_base")
 
 
+# Token counts of the texts counted lately, keyed by the digest of the text. Short texts such as the
+# deltas of a streamed answer are cheaper to encode than to cache.
+TOKEN_COUNT_CACHE_SIZE = int(os.environ.get("TOKEN_COUNT_CACHE_SIZE", 100000))
+TOKEN_COUNT_CACHE_MIN_LEN = 64
+_token_counts = LRUCache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+_token_counts_lock = threading.Lock()
+
+
+def _count_key(string: str) -> int:
+    return xxhash.xxh64_intdigest(string.encode("utf-8", "surrogatepass"))
+
+
 def num_tokens_from_string(string: str) -> int:
     """Returns the number of tokens in a text string."""
     try:
-        return len(encoder.encode(string))
+        if len(string) < TOKEN_COUNT_CACHE_MIN_LEN:
+            return len(encoder.encode(string))
+        key = _count_key(string)
+        with _token_counts_lock:
+            count = _token_counts.get(key)
+        if count is None:
+            count = len(encoder.encode(string))
+            with _token_counts_lock:
+                _token_counts[key] = count
+        return count
     except Exception:
         return 0
 
 
+def num_tokens_from_strings(strings: list[str]) -> list[int]:
+    """Returns the number of tokens of each text, the ones not counted lately encoded in one batch."""
+    counts = [None] * len(strings)
+    missing = {}
+    with _token_counts_lock:
+        for i, string in enumerate(strings):
+            count = _token_counts.get(_count_key(string)) if len(string) >= TOKEN_COUNT_CACHE_MIN_LEN else None
+            if count is None:
+                missing.setdefault(string, []).append(i)
+            else:
+                counts[i] = count
+    if not missing:
+        return counts
+    try:
+        encoded = encoder.encode_batch(list(missing.keys()))
+        missed_counts = [len(tks) for tks in encoded]
+    except Exception:
+        # some text can't be encoded, count them one by one as num_tokens_from_string does
+        missed_counts = [num_tokens_from_string(string) for string in missing]
+    with _token_counts_lock:
+        for (string, indexes), count in zip(missing.items(), missed_counts):
+            if len(string) >= TOKEN_COUNT_CACHE_MIN_LEN:
+                _token_counts[_count_key(string)] = count
+            for i in indexes:
+                counts[i] = count
+    return counts
+
+
 def truncate(string: str, max_len: int) -> str:
     """Returns truncated text if the length of text exceed max_len."""
+    count = num_tokens_from_string(string)
+    if count and count <= max_len:
+        return string
     return encoder.decode(encoder.encode(string)[:max_len])
@@ -60,6 +60,10 @@ class RAGFlowAzureSasBlob:
                 self.__open__()
                 time.sleep(1)
 
+    def put_stream(self, bucket, fnm, stream):
+        """Write a file-like object block by block, it can't be re-read so there is no retry."""
+        return self.conn.upload_blob(name=fnm, data=stream)
+
     def rm(self, bucket, fnm):
         try:
             self.conn.delete_blob(fnm)
@@ -68,6 +68,18 @@ class RAGFlowAzureSpnBlob:
                 self.__open__()
                 time.sleep(1)
 
+    def put_stream(self, bucket, fnm, stream, chunk_size=4 * 1024 * 1024):
+        """Append a file-like object chunk by chunk, it can't be re-read so there is no retry."""
+        f = self.conn.create_file(fnm)
+        offset = 0
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.append_data(chunk, offset=offset, length=len(chunk))
+            offset += len(chunk)
+        return f.flush_data(offset)
+
     def rm(self, bucket, fnm):
         try:
             self.conn.delete_file(fnm)
@@ -215,6 +215,13 @@ class DocStoreConnection(ABC):
         """
         raise NotImplementedError("Not implemented")
 
+    @abstractmethod
+    def mget(self, chunkIds: list[str], indexName: str, knowledgebaseIds: list[str]) -> dict[str, dict]:
+        """
+        Get the chunks with given ids in one request, {id: chunk}, the ids not found are left out
+        """
+        raise NotImplementedError("Not implemented")
+
     @abstractmethod
     def insert(self, rows: list[dict], indexName: str, knowledgebaseId: str = None) -> list[str]:
         """
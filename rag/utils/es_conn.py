@@ -277,6 +277,29 @@ class ESConnection(DocStoreConnection):
         logger.error("ESConnection.get timeout for 3 times!")
         raise Exception("ESConnection.get timeout.")
 
+    def mget(self, chunkIds: list[str], indexName: str, knowledgebaseIds: list[str]) -> dict[str, dict]:
+        if not chunkIds:
+            return {}
+        for i in range(ATTEMPT_TIME):
+            try:
+                res = self.es.mget(index=indexName, ids=chunkIds, source=True)
+                chunks = {}
+                for d in res["docs"]:
+                    if d.get("found"):
+                        chunk = d["_source"]
+                        chunk["id"] = d["_id"]
+                        chunks[d["_id"]] = chunk
+                return chunks
+            except NotFoundError:
+                return {}
+            except Exception as e:
+                logger.exception(f"ESConnection.mget({len(chunkIds)} ids) got exception")
+                if str(e).find("Timeout") > 0:
+                    continue
+                raise e
+        logger.error("ESConnection.mget timeout for 3 times!")
+        raise Exception("ESConnection.mget timeout.")
+
     def insert(self, documents: list[dict], indexName: str, knowledgebaseId: str = None) -> list[str]:
         # Refers to https://www.elastic.co/guide/en/elasticsearch/reference/current/docs-bulk.html
         operations = []
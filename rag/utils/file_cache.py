@@ -0,0 +1,185 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Prefetch cache of the source files of the documents being parsed, filled by rag/svr/cache_file_svr.py.
+
+Two tiers, each with a byte budget:
+  - a directory on the local disk, shared by the task executors of the host;
+  - Redis, shared by all hosts, holding objects up to FILE_CACHE_REDIS_MAX_OBJECT in chunks of
+    FILE_CACHE_CHUNK_SIZE, so that no single value is large.
+`get_file` reads the local disk, then Redis, then falls back to the object storage. Both tiers expire after
+FILE_CACHE_TTL and an object whose size differs from the document's is not served, so that a document
+uploaded again at the location of a removed one never gets the removed one's bytes.
+"""
+import hashlib
+import logging
+import os
+import time
+
+from api.utils.file_utils import get_project_base_directory
+from rag.utils.redis_conn import REDIS_CONN
+from rag.utils.storage_factory import STORAGE_IMPL
+
+FILE_CACHE_DIR = os.environ.get("FILE_CACHE_DIR", os.path.join(get_project_base_directory(), "file_cache"))
+FILE_CACHE_DISK_BYTES = int(os.environ.get("FILE_CACHE_DISK_BYTES", 4 * 1024 ** 3))
+FILE_CACHE_REDIS_BYTES = int(os.environ.get("FILE_CACHE_REDIS_BYTES", 256 * 1024 ** 2))
+FILE_CACHE_REDIS_MAX_OBJECT = int(os.environ.get("FILE_CACHE_REDIS_MAX_OBJECT", 32 * 1024 ** 2))
+FILE_CACHE_CHUNK_SIZE = 4 * 1024 ** 2
+FILE_CACHE_TTL = 12 * 60
+# Sizes of the objects of the Redis tier, field "{bucket}/{name}"
+FILE_CACHE_REDIS_INDEX = "file_cache:sizes"
+
+
+def cache_key(bucket, name):
+    return f"{bucket}/{name}"
+
+
+def disk_path(bucket, name):
+    return os.path.join(FILE_CACHE_DIR, hashlib.sha1(cache_key(bucket, name).encode("utf-8")).hexdigest())
+
+
+def _redis_key(key):
+    return f"file_cache:{key}"
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_disk(bucket, name):
+    path = disk_path(bucket, name)
+    try:
+        with open(path, "rb") as f:
+            if time.time() - os.fstat(f.fileno()).st_mtime <= FILE_CACHE_TTL:
+                return f.read()
+    except FileNotFoundError:
+        return None
+    _remove(path)
+    return None
+
+
+def write_disk(bucket, name, binary):
+    """Written to a temporary file first, so that readers on the host never see a partial file."""
+    os.makedirs(FILE_CACHE_DIR, exist_ok=True)
+    path = disk_path(bucket, name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(binary)
+    os.replace(tmp, path)
+
+
+def disk_entries():
+    """{path: (size, mtime)} of the files in the local disk tier, removing the ones which expired."""
+    res = {}
+    if not os.path.isdir(FILE_CACHE_DIR):
+        return res
+    now = time.time()
+    for entry in os.scandir(FILE_CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            st = entry.stat()
+            if now - st.st_mtime > FILE_CACHE_TTL:
+                _remove(entry.path)
+                continue
+            res[entry.path] = (st.st_size, st.st_mtime)
+    return res
+
+
+def read_redis(bucket, name):
+    r = REDIS_CONN.REDIS_BINARY
+    key = _redis_key(cache_key(bucket, name))
+    meta = r.get(key)
+    if not meta:
+        return None
+    _, chunks = map(int, meta.split(b":"))
+    pipeline = r.pipeline(transaction=False)
+    for i in range(chunks):
+        pipeline.get(f"{key}:{i}")
+    parts = pipeline.execute()
+    if any(p is None for p in parts):
+        return None
+    return b"".join(parts)
+
+
+def write_redis(bucket, name, binary):
+    """The chunks are written before the meta key which tells readers the object is complete."""
+    key = cache_key(bucket, name)
+    rkey = _redis_key(key)
+    chunks = [binary[i:i + FILE_CACHE_CHUNK_SIZE] for i in range(0, len(binary), FILE_CACHE_CHUNK_SIZE)] or [b""]
+    pipeline = REDIS_CONN.REDIS_BINARY.pipeline(transaction=False)
+    for i, chunk in enumerate(chunks):
+        pipeline.set(f"{rkey}:{i}", chunk, ex=FILE_CACHE_TTL)
+    pipeline.set(rkey, f"{len(binary)}:{len(chunks)}", ex=FILE_CACHE_TTL)
+    pipeline.hset(FILE_CACHE_REDIS_INDEX, key, len(binary))
+    pipeline.execute()
+
+
+def delete_redis(key):
+    r = REDIS_CONN.REDIS_BINARY
+    rkey = _redis_key(key)
+    meta = r.get(rkey)
+    pipeline = r.pipeline(transaction=False)
+    if meta:
+        pipeline.delete(*[f"{rkey}:{i}" for i in range(int(meta.split(b":")[1]))])
+    pipeline.delete(rkey)
+    pipeline.hdel(FILE_CACHE_REDIS_INDEX, key)
+    pipeline.execute()
+
+
+def redis_entries():
+    """{key: size} of the objects in the Redis tier, forgetting the ones which expired."""
+    r = REDIS_CONN.REDIS_BINARY
+    sizes = {k.decode("utf-8"): int(v) for k, v in r.hgetall(FILE_CACHE_REDIS_INDEX).items()}
+    if not sizes:
+        return sizes
+    pipeline = r.pipeline(transaction=False)
+    for key in sizes:
+        pipeline.exists(_redis_key(key))
+    expired = [key for key, alive in zip(sizes, pipeline.execute()) if not alive]
+    if expired:
+        r.hdel(FILE_CACHE_REDIS_INDEX, *expired)
+    return {k: v for k, v in sizes.items() if k not in expired}
+
+
+def evict(bucket, name):
+    """Drop an object from the Redis tier and from the disk tier of this host, e.g. once its document is removed."""
+    try:
+        _remove(disk_path(bucket, name))
+        delete_redis(cache_key(bucket, name))
+    except Exception:
+        logging.exception(f"file cache evict {bucket}/{name} got exception")
+
+
+def get_file(bucket, name, size=None):
+    """`size`, the size of the document, tells a stale object apart from the current one."""
+    st = time.time()
+    for tier, read in (("disk", read_disk), ("redis", read_redis)):
+        try:
+            binary = read(bucket, name)
+        except Exception:
+            logging.exception(f"file cache {tier} read {bucket}/{name} got exception")
+            continue
+        if binary is None:
+            continue
+        if size is not None and len(binary) != size:
+            logging.warning(f"file cache {tier} {bucket}/{name} is stale, {len(binary)} bytes instead of {size}")
+            evict(bucket, name)
+            break
+        logging.info(f"file cache {tier} hit {bucket}/{name} ({time.time() - st:.2f}s)")
+        return binary
+    return STORAGE_IMPL.get(bucket, name)
@@ -442,6 +442,30 @@ class InfinityConnection(DocStoreConnection):
         res_fields = self.getFields(res, res.columns.tolist())
         return res_fields.get(chunkId, None)
 
+    def mget(
+            self, chunkIds: list[str], indexName: str, knowledgebaseIds: list[str]
+    ) -> dict[str, dict]:
+        if not chunkIds:
+            return {}
+        inf_conn = self.connPool.get_conn()
+        db_instance = inf_conn.get_database(self.dbName)
+        df_list = list()
+        str_ids = ", ".join(f"'{chunkId}'" for chunkId in chunkIds)
+        for knowledgebaseId in knowledgebaseIds:
+            table_name = f"{indexName}_{knowledgebaseId}"
+            try:
+                table_instance = db_instance.get_table(table_name)
+            except Exception:
+                logger.warning(
+                    f"Table not found: {table_name}, this knowledge base isn't created in Infinity. Maybe it is created in other document engine.")
+                continue
+            kb_res, _ = table_instance.output(["*"]).filter(f"id IN ({str_ids})").to_df()
+            logger.debug(f"INFINITY mget table: {table_name}, {len(chunkIds)} ids, {len(kb_res)} found")
+            df_list.append(kb_res)
+        self.connPool.release_conn(inf_conn)
+        res = concat_dataframes(df_list, ["id"])
+        return self.getFields(res, res.columns.tolist())
+
     def insert(
             self, documents: list[dict], indexName: str, knowledgebaseId: str = None
     ) -> list[str]:
@@ -22,6 +22,9 @@ from io import BytesIO
 from rag import settings
 from rag.utils import singleton
 
+# Part size of multipart uploads of streams, the minimum allowed by S3 is 5MB.
+STREAM_PART_SIZE = 10 * 1024 * 1024
+
 
 @singleton
 class RAGFlowMinio:
@@ -76,6 +79,12 @@ class RAGFlowMinio:
                 self.__open__()
                 time.sleep(1)
 
+    def put_stream(self, bucket, fnm, stream):
+        """Write a file-like object of unknown length in multipart chunks, it can't be re-read so there is no retry."""
+        if not self.conn.bucket_exists(bucket):
+            self.conn.make_bucket(bucket)
+        return self.conn.put_object(bucket, fnm, stream, length=-1, part_size=STREAM_PART_SIZE)
+
     def rm(self, bucket, fnm):
         try:
             self.conn.remove_object(bucket, fnm)
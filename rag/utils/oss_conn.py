@@ -121,6 +121,15 @@ class RAGFlowOSS:
                 self.__open__()
                 time.sleep(1)
 
+    @use_prefix_path
+    @use_default_bucket
+    def put_stream(self, bucket, fnm, stream):
+        """Write a file-like object, boto3 reads and uploads it part by part. It can't be re-read so there is no retry."""
+        if not self.bucket_exists(bucket):
+            self.conn.create_bucket(Bucket=bucket)
+            logging.info(f"create bucket {bucket} ********")
+        return self.conn.upload_fileobj(stream, bucket, fnm)
+
     @use_prefix_path
     @use_default_bucket
     def rm(self, bucket, fnm):
@@ -16,6 +16,7 @@
 
 import logging
 import json
+import threading
 import uuid
 
 import valkey as redis
@@ -24,14 +25,18 @@ from rag.utils import singleton
 from valkey.lock import Lock
 
 class RedisMsg:
-    def __init__(self, consumer, queue_name, group_name, msg_id, message):
+    def __init__(self, consumer, queue_name, group_name, msg_id, message, ack_buffer=None):
         self.__consumer = consumer
         self.__queue_name = queue_name
         self.__group_name = group_name
         self.__msg_id = msg_id
         self.__message = json.loads(message["message"])
+        self.__ack_buffer = ack_buffer
 
     def ack(self):
+        if self.__ack_buffer is not None:
+            self.__ack_buffer.add(self.__queue_name, self.__msg_id)
+            return True
         try:
             self.__consumer.xack(self.__queue_name, self.__group_name, self.__msg_id)
             return True
@@ -45,11 +50,47 @@ class RedisMsg:
     def get_msg_id(self):
         return self.__msg_id
 
+    def get_queue_name(self):
+        return self.__queue_name
+
+
+class RedisAckBuffer:
+    """
+    Collects the acks of one consumer group so that `flush` sends them with one pipelined XACK per queue.
+    A message whose ack is still buffered when the consumer dies is delivered again, as an unacked one.
+    """
+
+    def __init__(self, redis_db, group_name):
+        self.__redis_db = redis_db
+        self.__group_name = group_name
+        self.__msg_ids = {}
+        self.__lock = threading.Lock()
+
+    def add(self, queue_name, msg_id):
+        with self.__lock:
+            self.__msg_ids.setdefault(queue_name, []).append(msg_id)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.__msg_ids.values())
+
+    def flush(self) -> int:
+        with self.__lock:
+            msg_ids, self.__msg_ids = self.__msg_ids, {}
+        if not msg_ids:
+            return 0
+        if self.__redis_db.queue_ack(self.__group_name, msg_ids):
+            return sum(len(ids) for ids in msg_ids.values())
+        with self.__lock:
+            for queue_name, ids in msg_ids.items():
+                self.__msg_ids[queue_name] = ids + self.__msg_ids.get(queue_name, [])
+        return 0
+
 
 @singleton
 class RedisDB:
     def __init__(self):
         self.REDIS = None
+        self.REDIS_BINARY = None
         self.config = settings.REDIS
         self.__open__()
 
@@ -62,6 +103,13 @@ class RedisDB:
                 password=self.config.get("password"),
                 decode_responses=True,
             )
+            # same server, for binary values
+            self.REDIS_BINARY = redis.StrictRedis(
+                host=self.config["host"].split(":")[0],
+                port=int(self.config.get("host", ":6379").split(":")[1]),
+                db=int(self.config.get("db", 1)),
+                password=self.config.get("password"),
+            )
         except Exception:
             logging.warning("Redis can't be connected.")
         return self.REDIS
@@ -95,6 +143,15 @@ class RedisDB:
             logging.warning("RedisDB.get " + str(k) + " got exception: " + str(e))
             self.__open__()
 
+    def mget(self, keys: list):
+        if not self.REDIS:
+            return
+        try:
+            return self.REDIS.mget(keys)
+        except Exception as e:
+            logging.warning("RedisDB.mget " + str(keys[:3]) + " got exception: " + str(e))
+            self.__open__()
+
     def set_obj(self, k, obj, exp=3600):
         try:
             self.REDIS.set(k, json.dumps(obj, ensure_ascii=False), exp)
@@ -113,6 +170,15 @@ class RedisDB:
             self.__open__()
         return False
 
+    def delete(self, k):
+        try:
+            self.REDIS.delete(k)
+            return True
+        except Exception as e:
+            logging.warning("RedisDB.delete " + str(k) + " got exception: " + str(e))
+            self.__open__()
+        return False
+
     def sadd(self, key: str, member: str):
         try:
             self.REDIS.sadd(key, member)
@@ -142,6 +208,28 @@ class RedisDB:
             self.__open__()
         return None
 
+    def lpush(self, key: str, value: str, maxlen: int = None):
+        """Prepends to a list, keeping its first `maxlen` elements when given."""
+        try:
+            pipeline = self.REDIS.pipeline(transaction=False)
+            pipeline.lpush(key, value)
+            if maxlen:
+                pipeline.ltrim(key, 0, maxlen - 1)
+            pipeline.execute()
+            return True
+        except Exception as e:
+            logging.warning("RedisDB.lpush " + str(key) + " got exception: " + str(e))
+            self.__open__()
+        return False
+
+    def lrange(self, key: str, start: int, end: int):
+        try:
+            return self.REDIS.lrange(key, start, end)
+        except Exception as e:
+            logging.warning("RedisDB.lrange " + str(key) + " got exception: " + str(e))
+            self.__open__()
+        return None
+
     def zadd(self, key: str, member: str, score: float):
         try:
             self.REDIS.zadd(key, {member: score})
@@ -193,12 +281,12 @@ class RedisDB:
             self.__open__()
         return False
 
-    def queue_product(self, queue, message, exp=settings.SVR_QUEUE_RETENTION) -> bool:
+    def queue_product(self, queue, message, exp=settings.SVR_QUEUE_RETENTION, maxlen=None) -> bool:
         for _ in range(3):
             try:
                 payload = {"message": json.dumps(message)}
                 pipeline = self.REDIS.pipeline()
-                pipeline.xadd(queue, payload)
+                pipeline.xadd(queue, payload, maxlen=maxlen, approximate=True)
                 # pipeline.expire(queue, exp)
                 pipeline.execute()
                 return True
@@ -242,6 +330,120 @@ class RedisDB:
                 )
         return None
 
+    def queue_consumer_batch(self, group_name, consumer_name, reads, ack_buffer=None, block=None) -> list[RedisMsg]:
+        """
+        Read several queues in one round trip. `reads` is a list of (queue name, msg id, count), msg id ">"
+        reads new messages, an older id the messages after it already delivered to this consumer and not acked.
+        Each read waits at most `block` ms for new messages, doesn't wait by default.
+        A missing consumer group is created, its queue yields no message this time.
+        """
+        try:
+            pipeline = self.REDIS.pipeline(transaction=False)
+            for queue_name, msg_id, count in reads:
+                pipeline.xreadgroup(group_name, consumer_name, {queue_name: msg_id}, count=count, block=block)
+            res = []
+            for (queue_name, _, _), messages in zip(reads, pipeline.execute(raise_on_error=False)):
+                if isinstance(messages, Exception):
+                    self.queue_create_group(queue_name, group_name)
+                    continue
+                for _, element_list in messages or []:
+                    res.extend(RedisMsg(self.REDIS, queue_name, group_name, i, payload, ack_buffer)
+                               for i, payload in element_list if payload)
+            return res
+        except Exception as e:
+            logging.warning("RedisDB.queue_consumer_batch got exception: " + str(e))
+            self.__open__()
+        return []
+
+    def queue_create_group(self, queue_name, group_name):
+        try:
+            self.REDIS.xgroup_create(queue_name, group_name, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                logging.warning("RedisDB.queue_create_group " + str(queue_name) + " got exception: " + str(e))
+
+    def queue_ack(self, group_name, msg_ids) -> bool:
+        """`msg_ids` maps queue names to the ids to ack."""
+        try:
+            pipeline = self.REDIS.pipeline(transaction=False)
+            for queue_name, ids in msg_ids.items():
+                for i in range(0, len(ids), 1000):
+                    pipeline.xack(queue_name, group_name, *ids[i:i + 1000])
+            pipeline.execute()
+            return True
+        except Exception as e:
+            logging.warning("RedisDB.queue_ack got exception: " + str(e))
+            self.__open__()
+        return False
+
+    def queue_autoclaim(self, queue_name, group_name, consumer_name, min_idle_ms, count, start_id="0-0",
+                        ack_buffer=None) -> tuple[str, list[RedisMsg]]:
+        """
+        Take over up to `count` pending messages idle for more than `min_idle_ms` with XAUTOCLAIM.
+        Returns the cursor to continue from ("0-0" once the whole pending list was scanned) and the messages.
+        """
+        try:
+            res = self.REDIS.xautoclaim(queue_name, group_name, consumer_name, min_idle_ms, start_id=start_id, count=count)
+            msgs = [RedisMsg(self.REDIS, queue_name, group_name, i, payload, ack_buffer)
+                    for i, payload in res[1] if i and payload]
+            return res[0], msgs
+        except Exception as e:
+            if "NOGROUP" not in str(e):
+                logging.warning("RedisDB.queue_autoclaim " + str(queue_name) + " got exception: " + str(e))
+                self.__open__()
+        return "0-0", []
+
+    def queue_keepalive(self, group_name, consumer_name, msg_ids) -> bool:
+        """
+        Reset the idle time of messages still being processed, so that `queue_autoclaim` leaves them alone.
+        `msg_ids` maps queue names to ids.
+        """
+        try:
+            pipeline = self.REDIS.pipeline(transaction=False)
+            for queue_name, ids in msg_ids.items():
+                pipeline.xclaim(queue_name, group_name, consumer_name, 0, list(ids), justid=True)
+            pipeline.execute()
+            return True
+        except Exception as e:
+            logging.warning("RedisDB.queue_keepalive got exception: " + str(e))
+            self.__open__()
+        return False
+
+    def queue_claim_own(self, queue_name, group_name, consumer_name, msg_id) -> bool:
+        """
+        Reset the idle time of a pending message if it is still delivered to `consumer_name`.
+        Returns False when it was taken over by another consumer or acked in the meantime.
+        """
+        try:
+            pending = self.REDIS.xpending_range(queue_name, group_name, min=msg_id, max=msg_id, count=1)
+            if not pending or pending[0]["consumer"] != consumer_name:
+                return False
+            self.REDIS.xclaim(queue_name, group_name, consumer_name, 0, [msg_id], justid=True)
+            return True
+        except Exception as e:
+            logging.warning("RedisDB.queue_claim_own " + str(queue_name) + " got exception: " + str(e))
+            self.__open__()
+        return True
+
+    def queue_info_many(self, queues, group_name) -> dict:
+        """Consumer group info of several queues, fetched in one round trip."""
+        try:
+            pipeline = self.REDIS.pipeline(transaction=False)
+            for queue in queues:
+                pipeline.xinfo_groups(queue)
+            res = {}
+            for queue, groups in zip(queues, pipeline.execute(raise_on_error=False)):
+                if isinstance(groups, Exception):
+                    continue
+                for group in groups:
+                    if group["name"] == group_name:
+                        res[queue] = group
+            return res
+        except Exception as e:
+            logging.warning("RedisDB.queue_info_many got exception: " + str(e))
+            self.__open__()
+        return {}
+
     def get_unacked_iterator(self, queue_name, group_name, consumer_name):
         try:
             group_info = self.REDIS.xinfo_groups(queue_name)
@@ -295,6 +497,10 @@ class RedisDistributedLock:
     def release(self):
         return self.lock.release()
 
+    def reacquire(self):
+        """Reset the timeout of the lock held, raises LockNotOwnedError once it was lost."""
+        return self.lock.reacquire()
+
     def __enter__(self):
         self.acquire()
 
@@ -94,6 +94,13 @@ class RAGFlowS3:
                 self.__open__()
                 time.sleep(1)
 
+    def put_stream(self, bucket, fnm, stream):
+        """Write a file-like object, boto3 reads and uploads it part by part. It can't be re-read so there is no retry."""
+        if not self.bucket_exists(bucket):
+            self.conn.create_bucket(Bucket=bucket)
+            logging.info(f"create bucket {bucket} ********")
+        return self.conn.upload_fileobj(stream, bucket, fnm)
+
     def rm(self, bucket, fnm):
         try:
             self.conn.delete_object(Bucket=bucket, Key=fnm)
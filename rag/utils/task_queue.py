@@ -0,0 +1,205 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Fair-share scheduling of the parse tasks.
+
+Tasks are queued to one Redis stream per (priority class, tenant), all registered in a set so that the
+executors can find them. An executor picks the class by weighted stride scheduling and the tenant of
+that class round-robin, so that a tenant importing thousands of pages only takes its share of its class.
+Messages are plain `RedisMsg` of a single consumer group, acked the same way as before.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from rag.settings import SVR_QUEUE_NAME
+from rag.utils.redis_conn import REDIS_CONN
+
+# A single document (re-)parsed from the UI or the API
+INTERACTIVE = "interactive"
+# Documents parsed in batches
+BULK = "bulk"
+# RAPTOR and GraphRAG
+BACKGROUND = "background"
+TASK_PRIORITY_WEIGHTS = {
+    INTERACTIVE: int(os.environ.get("TASK_WEIGHT_INTERACTIVE", "8")),
+    BULK: int(os.environ.get("TASK_WEIGHT_BULK", "2")),
+    BACKGROUND: int(os.environ.get("TASK_WEIGHT_BACKGROUND", "1")),
+}
+TASK_QUEUE_REGISTRY = f"{SVR_QUEUE_NAME}:queues"
+# Seconds between two reloads of the registry in the executors
+TASK_QUEUE_REFRESH_INTERVAL = 5
+# A queue found empty isn't read again for this long, doubled while it stays empty, in seconds
+TASK_QUEUE_IDLE_BACKOFF = 0.5
+TASK_QUEUE_MAX_IDLE_BACKOFF = 4
+
+
+def sub_queue_name(priority: str, tenant_id: str) -> str:
+    return f"{SVR_QUEUE_NAME}:{priority}:{tenant_id}"
+
+
+def queue_priority(queue_name: str) -> str:
+    """Tasks queued to the single stream used before the sub-queues are scheduled as bulk ones."""
+    parts = queue_name.split(":")
+    return parts[1] if len(parts) > 2 and parts[1] in TASK_PRIORITY_WEIGHTS else BULK
+
+
+def queue_task(message: dict, tenant_id: str, priority: str = BULK) -> bool:
+    queue_name = sub_queue_name(priority, tenant_id)
+    return REDIS_CONN.sadd(TASK_QUEUE_REGISTRY, queue_name) and REDIS_CONN.queue_product(queue_name, message)
+
+
+class FairTaskQueue:
+    """
+    Weighted fair dequeue over all the task sub-queues for one consumer of `group_name`.
+    Not thread safe, `read`, `read_backlog` and `reclaim` are called from a single prefetching loop.
+    `metrics` can be called from another thread, `queues` is a frozenset replaced as a whole on refresh.
+    """
+
+    def __init__(self, group_name, consumer_name, ack_buffer=None):
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.ack_buffer = ack_buffer
+        self.queues = frozenset()
+        self._rings = {priority: deque() for priority in TASK_PRIORITY_WEIGHTS}
+        self._pass = {priority: 0.0 for priority in TASK_PRIORITY_WEIGHTS}
+        self._vtime = 0.0
+        self._idle_until = {}
+        self._idle_backoff = {}
+        self._refreshed_at = 0
+        self._backlog = None
+        self._reclaim_cursors = {}
+        self._stats_lock = threading.Lock()
+        self._waits = {priority: [] for priority in TASK_PRIORITY_WEIGHTS}
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() - self._refreshed_at < TASK_QUEUE_REFRESH_INTERVAL:
+            return
+        registered = REDIS_CONN.smembers(TASK_QUEUE_REGISTRY)
+        if registered is None:
+            return
+        self._refreshed_at = time.monotonic()
+        for queue_name in (set(registered) | {SVR_QUEUE_NAME}) - self.queues:
+            REDIS_CONN.queue_create_group(queue_name, self.group_name)
+            self.queues = self.queues | {queue_name}
+            self._rings[queue_priority(queue_name)].append(queue_name)
+
+    def _is_ready(self, queue_name, now):
+        return self._idle_until.get(queue_name, 0) <= now
+
+    def _next_queue(self, now):
+        active = [p for p, ring in self._rings.items() if any(self._is_ready(q, now) for q in ring)]
+        if not active:
+            return None
+        # a class coming back from idle starts at the current virtual time instead of catching up
+        for p in active:
+            self._pass[p] = max(self._pass[p], self._vtime)
+        priority = min(active, key=lambda p: self._pass[p])
+        self._vtime = self._pass[priority]
+        self._pass[priority] += 1 / TASK_PRIORITY_WEIGHTS[priority]
+        ring = self._rings[priority]
+        for _ in range(len(ring)):
+            queue_name = ring[0]
+            ring.rotate(-1)
+            if self._is_ready(queue_name, now):
+                return queue_name
+
+    def read(self, count) -> list:
+        """Up to `count` new messages, in one round trip."""
+        self.refresh()
+        now = time.monotonic()
+        picks = {}
+        for _ in range(count):
+            queue_name = self._next_queue(now)
+            if not queue_name:
+                break
+            picks[queue_name] = picks.get(queue_name, 0) + 1
+        if not picks:
+            return []
+        msgs = REDIS_CONN.queue_consumer_batch(self.group_name, self.consumer_name,
+                                               [(q, ">", n) for q, n in picks.items()], self.ack_buffer)
+        got = {}
+        for msg in msgs:
+            got[msg.get_queue_name()] = got.get(msg.get_queue_name(), 0) + 1
+            self._record_wait(msg)
+        for queue_name, n in picks.items():
+            if got.get(queue_name, 0) < n:
+                backoff = min(self._idle_backoff.get(queue_name, TASK_QUEUE_IDLE_BACKOFF / 2) * 2, TASK_QUEUE_MAX_IDLE_BACKOFF)
+                self._idle_backoff[queue_name] = backoff
+                self._idle_until[queue_name] = now + backoff
+            else:
+                self._idle_backoff.pop(queue_name, None)
+        return msgs
+
+    def read_backlog(self, count) -> list | None:
+        """Messages delivered to this consumer before it restarted and never acked, None once all were read."""
+        if self._backlog is None:
+            self.refresh(force=True)
+            self._backlog = {q: "0" for q in self.queues}
+        if not self._backlog:
+            return None
+        msgs = REDIS_CONN.queue_consumer_batch(self.group_name, self.consumer_name,
+                                               [(q, i, count) for q, i in self._backlog.items()], self.ack_buffer)
+        last = {msg.get_queue_name(): msg.get_msg_id() for msg in msgs}
+        self._backlog = last
+        return msgs
+
+    def reclaim(self, min_idle_ms, count) -> tuple[bool, list]:
+        """
+        Take over the messages of dead consumers with XAUTOCLAIM, up to `count` per call.
+        Returns whether every queue was scanned to its end, and the messages.
+        """
+        if not self._reclaim_cursors:
+            self.refresh()
+            self._reclaim_cursors = {q: "0-0" for q in self.queues}
+        msgs = []
+        for queue_name, cursor in list(self._reclaim_cursors.items()):
+            if len(msgs) >= count:
+                break
+            cursor, claimed = REDIS_CONN.queue_autoclaim(queue_name, self.group_name, self.consumer_name, min_idle_ms,
+                                                         count - len(msgs), start_id=cursor, ack_buffer=self.ack_buffer)
+            msgs.extend(claimed)
+            if cursor == "0-0":
+                del self._reclaim_cursors[queue_name]
+            else:
+                self._reclaim_cursors[queue_name] = cursor
+        return not self._reclaim_cursors, msgs
+
+    def _record_wait(self, msg):
+        enqueued_at = int(msg.get_msg_id().split("-")[0]) / 1000
+        with self._stats_lock:
+            self._waits[queue_priority(msg.get_queue_name())].append(max(0.0, time.time() - enqueued_at))
+
+    def metrics(self) -> dict:
+        """
+        Per priority class: messages not delivered yet (depth), delivered and not acked (pending), and the
+        time the messages dequeued since the previous call waited in the queue.
+        """
+        with self._stats_lock:
+            waits, self._waits = self._waits, {priority: [] for priority in TASK_PRIORITY_WEIGHTS}
+        res = {p: {"depth": 0, "pending": 0, "dequeued": len(w), "wait_avg": round(sum(w) / len(w), 3) if w else 0,
+                   "wait_max": round(max(w), 3) if w else 0} for p, w in waits.items()}
+        queues = sorted(self.queues)
+        try:
+            for queue_name, group in REDIS_CONN.queue_info_many(queues, self.group_name).items():
+                p = res[queue_priority(queue_name)]
+                p["depth"] += int(group.get("lag") or 0)
+                p["pending"] += int(group.get("pending") or 0)
+        except Exception:
+            logging.exception("FairTaskQueue.metrics got exception")
+        return res
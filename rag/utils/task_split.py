@@ -0,0 +1,159 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+Adaptive sizing of the page ranges of the parse tasks.
+
+The executors record how long each page range took, per parser and layout recognizer. A least squares fit of
+those timings gives the fixed cost of a task and the cost of a page. Ranges are then sized so that:
+  - the fixed cost stays a small fraction of a task (TASK_SPLIT_OVERHEAD_RATIO), sparing tiny tasks;
+  - no task is predicted to run longer than TASK_SPLIT_MAX_SECONDS, sparing stragglers;
+  - in between, a document is spread over the executor slots left free by the queued and running tasks.
+Without enough history, the static `task_page_size` applies.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from rag.utils.redis_conn import REDIS_CONN
+
+TASK_SPLIT_MAX_SECONDS = float(os.environ.get("TASK_SPLIT_MAX_SECONDS", "300"))
+TASK_SPLIT_OVERHEAD_RATIO = float(os.environ.get("TASK_SPLIT_OVERHEAD_RATIO", "0.1"))
+# Timings kept per parser, and needed before the fit is trusted
+TASK_SPLIT_HISTORY = 500
+TASK_SPLIT_MIN_SAMPLES = 5
+# Seconds the fitted costs and the executor capacity are reused for
+TASK_SPLIT_CACHE_TTL = 30
+# An executor without heartbeat for this long, in seconds, is considered gone
+EXECUTOR_HEARTBEAT_TIMEOUT = 90
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def cost_key(parser_id: str, parser_config: dict) -> str:
+    return f"{parser_id}:{parser_config.get('layout_recognize', 'DeepDOC')}"
+
+
+def adaptive_split_enabled(parser_id: str, parser_config: dict) -> bool:
+    """Documents parsed as a whole, or split by an explicit `task_page_size`, keep their static ranges."""
+    return parser_id not in ["one", "knowledge_graph"] and parser_config.get("layout_recognize", "DeepDOC") == "DeepDOC" \
+        and "task_page_size" not in parser_config
+
+
+def _timings_key(key):
+    return f"task_split:timings:{key}"
+
+
+def _cached(name, fn):
+    now = time.monotonic()
+    with _cache_lock:
+        if name in _cache and now - _cache[name][0] < TASK_SPLIT_CACHE_TTL:
+            return _cache[name][1]
+    value = fn()
+    with _cache_lock:
+        _cache[name] = (now, value)
+    return value
+
+
+def record_range(key: str, pages: int, seconds: float, doc_id: str = ""):
+    if pages <= 0 or seconds <= 0:
+        return
+    REDIS_CONN.lpush(_timings_key(key), json.dumps({"pages": pages, "seconds": round(seconds, 3), "doc_id": doc_id,
+                                                    "at": int(time.time())}), TASK_SPLIT_HISTORY)
+
+
+def _fit(key):
+    samples = [json.loads(s) for s in REDIS_CONN.lrange(_timings_key(key), 0, TASK_SPLIT_HISTORY - 1) or []]
+    if len(samples) < TASK_SPLIT_MIN_SAMPLES:
+        return None
+    n = len(samples)
+    sx = sum(s["pages"] for s in samples)
+    sy = sum(s["seconds"] for s in samples)
+    sxx = sum(s["pages"] ** 2 for s in samples)
+    sxy = sum(s["pages"] * s["seconds"] for s in samples)
+    det = n * sxx - sx * sx
+    page_sec = (n * sxy - sx * sy) / det if det else 0
+    task_sec = (sy - page_sec * sx) / n if det else 0
+    if page_sec <= 0 or task_sec < 0:
+        # all the ranges had the same length, or too noisy to tell the fixed cost apart
+        page_sec, task_sec = sy / sx, 0.0
+    return task_sec, page_sec
+
+
+def page_cost(key: str) -> tuple[float, float] | None:
+    """(seconds per task, seconds per page) fitted from the recorded timings, None without enough of them."""
+    try:
+        return _cached(f"cost:{key}", lambda: _fit(key))
+    except Exception:
+        logging.exception(f"page_cost({key}) got exception")
+        return None
+
+
+def _capacity():
+    now = time.time()
+    slots, backlog, latest = 0, 0, ""
+    for executor in REDIS_CONN.smembers("TASKEXE") or []:
+        heartbeats = REDIS_CONN.zrangebyscore(executor, now - EXECUTOR_HEARTBEAT_TIMEOUT, now)
+        if not heartbeats:
+            continue
+        heartbeat = json.loads(heartbeats[-1])
+        slots += int(heartbeat.get("max_concurrent", 1))
+        # depth and pending are those of the whole consumer group, the latest report wins
+        if heartbeat.get("now", "") >= latest:
+            latest = heartbeat.get("now", "")
+            backlog = int(heartbeat.get("lag", 0)) + int(heartbeat.get("pending", 0))
+    return slots, backlog
+
+
+def executor_capacity() -> tuple[int, int]:
+    """(task slots of the executors alive, tasks queued or running)."""
+    try:
+        return _cached("capacity", _capacity)
+    except Exception:
+        logging.exception("executor_capacity got exception")
+        return 0, 0
+
+
+def page_size(pages: int, key: str, default: int) -> int:
+    """Pages per task for a range of `pages` pages, `default` without enough timings."""
+    cost = page_cost(key)
+    if not cost:
+        return default
+    task_sec, page_sec = cost
+    slots, backlog = executor_capacity()
+    size = math.ceil(pages / max(1, slots - backlog))
+    min_size = math.ceil(task_sec * (1 - TASK_SPLIT_OVERHEAD_RATIO) / TASK_SPLIT_OVERHEAD_RATIO / page_sec)
+    max_size = int((TASK_SPLIT_MAX_SECONDS - task_sec) / page_sec)
+    # a straggler costs more than a few tasks too many
+    return max(1, min(max(size, min_size), max_size))
+
+
+def straggler_cut(from_page: int, to_page: int, key: str) -> int | None:
+    """
+    The page to cut a task at, when the pages it was given are predicted to take longer than
+    TASK_SPLIT_MAX_SECONDS, e.g. because they were sized when the timings were unknown or the executors busy.
+    """
+    cost = page_cost(key)
+    if not cost or to_page - from_page <= 1:
+        return None
+    task_sec, page_sec = cost
+    if task_sec + page_sec * (to_page - from_page) <= TASK_SPLIT_MAX_SECONDS:
+        return None
+    cut = from_page + page_size(to_page - from_page, key, to_page - from_page)
+    return cut if cut < to_page else None
@@ -1,15 +1,22 @@
 from beartype.claw import beartype_this_package
 import importlib.metadata
 from .ragflow import RAGFlow
+from .async_ragflow import AsyncRAGFlow
 from .modules.dataset import DataSet
 from .modules.chat import Chat
 from .modules.session import Session
 from .modules.document import Document
 from .modules.chunk import Chunk
+from .modules.async_dataset import AsyncDataSet
+from .modules.async_chat import AsyncChat
+from .modules.async_session import AsyncSession
+from .modules.async_document import AsyncDocument
+from .modules.async_chunk import AsyncChunk
 
 
 beartype_this_package()
 
 __version__ = importlib.metadata.version("ragflow_sdk")
 
-__all__ = ["RAGFlow", "DataSet", "Chat", "Session", "Document", "Chunk"]
+__all__ = ["RAGFlow", "DataSet", "Chat", "Session", "Document", "Chunk",
+           "AsyncRAGFlow", "AsyncDataSet", "AsyncChat", "AsyncSession", "AsyncDocument", "AsyncChunk"]
@@ -0,0 +1,52 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from .async_session import AsyncSession
+from .chat import Chat
+
+
+class AsyncChat(Chat):
+    async def update(self, update_message: dict):
+        res = await self.put(f'/chats/{self.id}',
+                             update_message)
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res["message"])
+
+    async def create_session(self, name: str = "New session") -> AsyncSession:
+        res = await self.post(f"/chats/{self.id}/sessions", {"name": name})
+        res = res.json()
+        if res.get("code") == 0:
+            return AsyncSession(self.rag, res['data'])
+        raise Exception(res["message"])
+
+    async def list_sessions(self, page: int = 1, page_size: int = 30, orderby: str = "create_time", desc: bool = True,
+                            id: str = None, name: str = None) -> list[AsyncSession]:
+        res = await self.get(f'/chats/{self.id}/sessions',
+                             {"page": page, "page_size": page_size, "orderby": orderby, "desc": desc, "id": id, "name": name})
+        res = res.json()
+        if res.get("code") == 0:
+            result_list = []
+            for data in res["data"]:
+                result_list.append(AsyncSession(self.rag, data))
+            return result_list
+        raise Exception(res["message"])
+
+    async def delete_sessions(self, ids: list[str] | None = None):
+        res = await self.rm(f"/chats/{self.id}/sessions", {"ids": ids})
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res.get("message"))
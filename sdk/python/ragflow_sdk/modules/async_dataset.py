@@ -0,0 +1,112 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import asyncio
+from urllib.parse import quote
+
+from .async_document import AsyncDocument
+from .dataset import UPLOAD_CHUNK_SIZE, DataSet
+
+
+async def aread_chunks(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+
+
+class AsyncDataSet(DataSet):
+    async def update(self, update_message: dict):
+        res = await self.put(f'/datasets/{self.id}',
+                             update_message)
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res["message"])
+
+    async def upload_documents(self, document_list: list[dict]):
+        url = f"/datasets/{self.id}/documents"
+        files = [("file", (ele["display_name"], ele["blob"])) for ele in document_list]
+        res = await self.post(path=url, json=None, files=files)
+        res = res.json()
+        if res.get("code") == 0:
+            doc_list = []
+            for doc in res["data"]:
+                document = AsyncDocument(self.rag, doc)
+                doc_list.append(document)
+            return doc_list
+        raise Exception(res.get("message"))
+
+    async def stream_upload_documents(self, document_list: list[dict], max_workers: int = 4, max_retries: int = 3,
+                                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> list[dict]:
+        """Asyncio counterpart of `DataSet.stream_upload_documents`."""
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def upload(ele):
+            async with semaphore:
+                return await self._stream_upload(ele, max_retries, chunk_size)
+
+        return list(await asyncio.gather(*[upload(ele) for ele in document_list]))
+
+    async def _stream_upload(self, ele: dict, max_retries: int, chunk_size: int) -> dict:
+        result = {"display_name": ele["display_name"], "document": None, "error": None}
+        headers = {"X-File-Name": quote(ele["display_name"]), "Content-Type": "application/octet-stream"}
+        for attempt in range(max_retries + 1):
+            try:
+                data = aread_chunks(ele["path"], chunk_size) if "path" in ele else ele["blob"]
+                res = await self.post(f"/datasets/{self.id}/documents/stream", data=data, headers=headers)
+                if res.status_code >= 500 and attempt < max_retries:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
+                res = res.json()
+                if res.get("code") == 0:
+                    result["document"] = AsyncDocument(self.rag, res["data"][0])
+                else:
+                    result["error"] = res.get("message")
+                return result
+            except Exception as e:
+                result["error"] = str(e)
+                if attempt < max_retries:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        return result
+
+    async def list_documents(self, id: str | None = None, keywords: str | None = None, page: int = 1, page_size: int = 30,
+                             orderby: str = "create_time", desc: bool = True):
+        res = await self.get(f"/datasets/{self.id}/documents",
+                             params={"id": id, "keywords": keywords, "page": page, "page_size": page_size, "orderby": orderby,
+                                     "desc": desc})
+        res = res.json()
+        documents = []
+        if res.get("code") == 0:
+            for document in res["data"].get("docs"):
+                documents.append(AsyncDocument(self.rag, document))
+            return documents
+        raise Exception(res["message"])
+
+    async def delete_documents(self, ids: list[str] | None = None):
+        res = await self.rm(f"/datasets/{self.id}/documents", {"ids": ids})
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res["message"])
+
+    async def async_parse_documents(self, document_ids):
+        res = await self.post(f"/datasets/{self.id}/chunks", {"document_ids": document_ids})
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res.get("message"))
+
+    async def async_cancel_parse_documents(self, document_ids):
+        res = await self.rm(f"/datasets/{self.id}/chunks", {"document_ids": document_ids})
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res.get("message"))
@@ -0,0 +1,66 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+
+from .async_chunk import AsyncChunk
+from .document import Document
+
+
+class AsyncDocument(Document):
+    async def update(self, update_message: dict):
+        if "meta_fields" in update_message:
+            if not isinstance(update_message["meta_fields"], dict):
+                raise Exception("meta_fields must be a dictionary")
+        res = await self.put(f'/datasets/{self.dataset_id}/documents/{self.id}',
+                             update_message)
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res["message"])
+
+    async def download(self):
+        res = await self.get(f"/datasets/{self.dataset_id}/documents/{self.id}")
+        try:
+            res = res.json()
+            raise Exception(res.get("message"))
+        except json.JSONDecodeError:
+            return res.content
+
+    async def list_chunks(self, page=1, page_size=30, keywords=""):
+        data = {"keywords": keywords, "page": page, "page_size": page_size}
+        res = await self.get(f'/datasets/{self.dataset_id}/documents/{self.id}/chunks', data)
+        res = res.json()
+        if res.get("code") == 0:
+            chunks = []
+            for data in res["data"].get("chunks"):
+                chunk = AsyncChunk(self.rag, data)
+                chunks.append(chunk)
+            return chunks
+        raise Exception(res.get("message"))
+
+    async def add_chunk(self, content: str, important_keywords: list[str] = [], questions: list[str] = []):
+        res = await self.post(f'/datasets/{self.dataset_id}/documents/{self.id}/chunks',
+                              {"content": content, "important_keywords": important_keywords, "questions": questions})
+        res = res.json()
+        if res.get("code") == 0:
+            return AsyncChunk(self.rag, res["data"].get("chunk"))
+        raise Exception(res.get("message"))
+
+    async def delete_chunks(self, ids: list[str] | None = None):
+        res = await self.rm(f"/datasets/{self.dataset_id}/documents/{self.id}/chunks", {"chunk_ids": ids})
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res.get("message"))
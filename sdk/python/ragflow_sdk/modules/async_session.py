@@ -0,0 +1,61 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from .session import Session, Message, parse_event_line
+
+
+class AsyncSession(Session):
+    async def ask(self, question="", stream=True, **kwargs):
+        """Async generator of answer messages. With `stream=False`, only the final message is yielded."""
+        message = None
+        answer, reference = "", None
+        async for events in self._event_lines(question, stream, **kwargs):
+            for event, value in events:
+                if event == "delta":
+                    answer += value
+                elif event == "answer":
+                    answer = value
+                else:
+                    reference = value
+            temp_dict = {"content": answer, "role": "assistant"}
+            if reference is not None:
+                temp_dict["reference"] = reference
+            message = Message(self.rag, temp_dict)
+            if stream:
+                yield message
+        if not stream and message is not None:
+            yield message
+
+    async def ask_events(self, question="", **kwargs):
+        """Asyncio counterpart of `Session.ask_events`."""
+        async for events in self._event_lines(question, True, **kwargs):
+            for event in events:
+                yield event
+
+    async def _event_lines(self, question, stream, **kwargs):
+        async with self.rag.stream("POST", f"/chats/{self.chat_id}/completions",
+                                   json={"question": question, "stream": stream, "session_id": self.id,
+                                         "delta": True, **kwargs}) as res:
+            async for line in res.aiter_lines():
+                events = parse_event_line(line)
+                if events:
+                    yield events
+
+    async def update(self, update_message):
+        res = await self.put(f"/chats/{self.chat_id}/sessions/{self.id}", update_message)
+        res = res.json()
+        if res.get("code") != 0:
+            raise Exception(res.get("message"))
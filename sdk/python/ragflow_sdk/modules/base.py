@@ -34,8 +34,8 @@ class Base:
                     pr[name] = value
         return pr
 
-    def post(self, path, json=None, stream=False, files=None):
-        res = self.rag.post(path, json, stream=stream,files=files)
+    def post(self, path, json=None, stream=False, files=None, data=None, headers=None):
+        res = self.rag.post(path, json, stream=stream, files=files, data=data, headers=headers)
         return res
 
     def get(self, path, params=None):
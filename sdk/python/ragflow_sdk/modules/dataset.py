@@ -13,11 +13,22 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 
 from .document import Document
 
 from .base import Base
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def read_chunks(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
 
 class DataSet(Base):
     class ParserConfig(Base):
@@ -62,6 +73,40 @@ class DataSet(Base):
             return doc_list
         raise Exception(res.get("message"))
 
+    def stream_upload_documents(self, document_list: list[dict], max_workers: int = 4, max_retries: int = 3,
+                                chunk_size: int = UPLOAD_CHUNK_SIZE) -> list[dict]:
+        """
+        Upload every document in its own request, `max_workers` requests at a time.
+        Each element has a `display_name` and either the `path` of a file, read from disk and sent
+        `chunk_size` bytes at a time, or a `blob`. A request failing on a connection error or a 5xx status
+        is retried up to `max_retries` times, a failed document doesn't stop the others.
+        Returns one {"display_name", "document", "error"} per element, in the same order.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda ele: self._stream_upload(ele, max_retries, chunk_size), document_list))
+
+    def _stream_upload(self, ele: dict, max_retries: int, chunk_size: int) -> dict:
+        result = {"display_name": ele["display_name"], "document": None, "error": None}
+        headers = {"X-File-Name": quote(ele["display_name"]), "Content-Type": "application/octet-stream"}
+        for attempt in range(max_retries + 1):
+            try:
+                data = read_chunks(ele["path"], chunk_size) if "path" in ele else ele["blob"]
+                res = self.post(f"/datasets/{self.id}/documents/stream", data=data, headers=headers)
+                if res.status_code >= 500 and attempt < max_retries:
+                    time.sleep(0.5 * 2 ** attempt)
+                    continue
+                res = res.json()
+                if res.get("code") == 0:
+                    result["document"] = Document(self.rag, res["data"][0])
+                else:
+                    result["error"] = res.get("message")
+                return result
+            except Exception as e:
+                result["error"] = str(e)
+                if attempt < max_retries:
+                    time.sleep(0.5 * 2 ** attempt)
+        return result
+
     def list_documents(self, id: str | None = None, keywords: str | None = None, page: int = 1, page_size: int = 30,
                        orderby: str = "create_time", desc: bool = True):
         res = self.get(f"/datasets/{self.id}/documents",
@@ -19,6 +19,33 @@ import json
 from .base import Base
 
 
+def parse_event_line(line: str) -> list[tuple[str, object]]:
+    """
+    Events of one line of a completion response. Servers asked for `delta` send the text appended to
+    the answer, older ones the whole answer in every event, both are handled.
+    """
+    if line.startswith("{"):
+        json_data = json.loads(line)
+        if json_data.get("code") != 0:
+            raise Exception(json_data["message"])
+    elif line.startswith("data:"):
+        json_data = json.loads(line[5:])
+    else:
+        return []
+    data = json_data["data"]
+    if data is True or not data or data.get("running_status"):
+        return []
+    events = []
+    if "delta" in data:
+        events.append(("delta", data["delta"]))
+    if "answer" in data:
+        events.append(("answer", data["answer"]))
+    reference = data.get("reference")
+    if reference and "chunks" in reference:
+        events.append(("reference", reference["chunks"]))
+    return events
+
+
 class Session(Base):
     def __init__(self, rag, res_dict):
         self.id = None
@@ -34,30 +61,39 @@ class Session(Base):
     def ask(self, question="", stream=True, **kwargs):
         res = self._ask_chat(question, stream, **kwargs)
 
+        message = None
+        answer, reference = "", None
         for line in res.iter_lines():
-            line = line.decode("utf-8")
-            if line.startswith("{"):
-                json_data = json.loads(line)
-                raise Exception(json_data["message"])
-            if not line.startswith("data:"):
-                continue
-            json_data = json.loads(line[5:])
-            if json_data["data"] is True or json_data["data"].get("running_status"):
+            events = parse_event_line(line.decode("utf-8"))
+            if not events:
                 continue
-            answer = json_data["data"]["answer"]
-            reference = json_data["data"].get("reference", {})
+            for event, value in events:
+                if event == "delta":
+                    answer += value
+                elif event == "answer":
+                    answer = value
+                else:
+                    reference = value
             temp_dict = {"content": answer, "role": "assistant"}
-            if reference and "chunks" in reference:
-                chunks = reference["chunks"]
-                temp_dict["reference"] = chunks
+            if reference is not None:
+                temp_dict["reference"] = reference
             message = Message(self.rag, temp_dict)
             if stream:
                 yield message
         if not stream:
             return message
 
+    def ask_events(self, question="", **kwargs):
+        """
+        Stream the answer as (event, value) pairs without rebuilding it: ("delta", text appended to the answer),
+        ("answer", text replacing the whole answer, e.g. once citations are inserted) and ("reference", chunks).
+        """
+        res = self._ask_chat(question, True, **kwargs)
+        for line in res.iter_lines():
+            yield from parse_event_line(line.decode("utf-8"))
+
     def _ask_chat(self, question: str, stream: bool, **kwargs):
-        json_data = {"question": question, "stream": stream, "session_id": self.id}
+        json_data = {"question": question, "stream": stream, "session_id": self.id, "delta": True}
         json_data.update(kwargs)
         res = self.post(f"/chats/{self.chat_id}/completions", json_data, stream=stream)
         return res
@@ -14,6 +14,8 @@
 #  limitations under the License.
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .modules.chat import Chat
 from .modules.chunk import Chunk
@@ -21,28 +23,49 @@ from .modules.dataset import DataSet
 
 
 class RAGFlow:
-    def __init__(self, api_key, base_url, version="v1"):
+    def __init__(self, api_key, base_url, version="v1", pool_connections: int = 10, pool_maxsize: int = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.5, timeout: float | None = None):
         """
         api_url: http://<host_address>/api/v1
+        Requests go through one pooled keep-alive session, `pool_maxsize` bounds the connections kept per host.
+        Idempotent requests failing on connection errors or 502/503/504 are retried `max_retries` times
+        with exponential backoff.
         """
         self.user_key = api_key
         self.api_url = f"{base_url}/api/{version}"
         self.authorization_header = {"Authorization": "{} {}".format("Bearer", self.user_key)}
-
-    def post(self, path, json=None, stream=False, files=None):
-        res = requests.post(url=self.api_url + path, json=json, headers=self.authorization_header, stream=stream, files=files)
+        self.timeout = timeout
+        retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=[502, 503, 504], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.authorization_header)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def post(self, path, json=None, stream=False, files=None, data=None, headers=None):
+        res = self.session.post(url=self.api_url + path, json=json, stream=stream, files=files, data=data,
+                                headers=headers, timeout=self.timeout)
         return res
 
     def get(self, path, params=None, json=None):
-        res = requests.get(url=self.api_url + path, params=params, headers=self.authorization_header, json=json)
+        res = self.session.get(url=self.api_url + path, params=params, json=json, timeout=self.timeout)
         return res
 
     def delete(self, path, json):
-        res = requests.delete(url=self.api_url + path, json=json, headers=self.authorization_header)
+        res = self.session.delete(url=self.api_url + path, json=json, timeout=self.timeout)
         return res
 
     def put(self, path, json):
-        res = requests.put(url=self.api_url + path, json=json, headers=self.authorization_header)
+        res = self.session.put(url=self.api_url + path, json=json, timeout=self.timeout)
         return res
 
     def create_dataset(
@@ -0,0 +1,117 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""Concurrent retrieval of DeepResearcher against local stub retrievers."""
+import threading
+import time
+
+from agentic_reasoning import deep_research
+from agentic_reasoning.deep_research import DeepResearcher
+
+
+def kb_chunk(chunk_id, content):
+    return {"chunk_id": chunk_id, "kb_id": ["kb"], "doc_id": "doc", "docnm_kwd": "doc.pdf", "content_with_weight": content}
+
+
+def web_chunk(doc_id, content):
+    return {"chunk_id": doc_id, "kb_id": [], "doc_id": doc_id, "docnm_kwd": doc_id, "content_with_weight": content, "url": f"https://{doc_id}"}
+
+
+def kb_stub(delays=None):
+    delays = delays or {}
+
+    def retrieve(question):
+        time.sleep(delays.get(question, 0))
+        return {"total": 2, "chunks": [kb_chunk("shared", "shared"), kb_chunk(question, f"kb {question}")],
+                "doc_aggs": [{"doc_id": "doc", "doc_name": "doc.pdf", "count": 2}]}
+    return retrieve
+
+
+def researcher(**kwargs):
+    return DeepResearcher(None, {"use_kg": "kg_retrieve" in kwargs}, **kwargs)
+
+
+def test_yields_queries_as_their_results_arrive():
+    r = researcher(kb_retrieve=kb_stub({"slow": 0.4, "fast": 0.05}))
+    st = time.monotonic()
+    arrived = [(q, time.monotonic() - st) for q, _ in r._retrieve_concurrently(["slow", "fast"])]
+    assert [q for q, _ in arrived] == ["fast", "slow"]
+    assert arrived[0][1] < 0.3
+
+
+def test_sources_run_concurrently():
+    r = researcher(kb_retrieve=kb_stub({"q1": 0.3, "q2": 0.3}),
+                   web_retrieve=lambda question: time.sleep(0.3) or {"chunks": [], "doc_aggs": []})
+    st = time.monotonic()
+    assert len(list(r._retrieve_concurrently(["q1", "q2"]))) == 2
+    assert time.monotonic() - st < 0.9
+
+
+def test_source_timeout():
+    r = researcher(kb_retrieve=kb_stub(),
+                   web_retrieve=lambda question: time.sleep(2) or {"chunks": [web_chunk("w", "late")], "doc_aggs": []},
+                   source_timeouts={"web": 0.2})
+    st = time.monotonic()
+    [(q, kbinfos)] = list(r._retrieve_concurrently(["q"]))
+    assert time.monotonic() - st < 1
+    assert [c["chunk_id"] for c in kbinfos["chunks"]] == ["shared", "q"]
+
+
+def test_timeout_starts_when_the_retrieval_starts(monkeypatch):
+    monkeypatch.setattr(deep_research, "DEEP_RESEARCH_RETRIEVAL_WORKERS", 2)
+    r = researcher(kb_retrieve=kb_stub({q: 0.3 for q in ("q1", "q2", "q3", "q4")}), source_timeouts={"kb": 0.5})
+    results = dict(r._retrieve_concurrently(["q1", "q2", "q3", "q4"]))
+    # q3 and q4 wait for q1 and q2 in the queue, longer than their timeout, but run within it
+    assert all(len(kbinfos["chunks"]) == 2 for kbinfos in results.values())
+
+
+def test_failing_source():
+    def kg_retrieve(question):
+        raise RuntimeError("knowledge graph down")
+    r = researcher(kb_retrieve=kb_stub(), kg_retrieve=kg_retrieve)
+    [(_, kbinfos)] = list(r._retrieve_concurrently(["q"]))
+    assert [c["chunk_id"] for c in kbinfos["chunks"]] == ["shared", "q"]
+
+
+def test_merge_order_and_dedup_across_sources():
+    kg = {"chunk_id": "kg", "kb_id": ["kb"], "doc_id": "", "docnm_kwd": "Related content in Knowledge Graph",
+          "content_with_weight": "entities"}
+    web = {"chunks": [web_chunk("w1", "kb q"), web_chunk("w2", "web only"), web_chunk("w3", "web only")],
+           "doc_aggs": [{"doc_id": "w1"}, {"doc_id": "w2"}, {"doc_id": "w3"}]}
+    r = researcher(kb_retrieve=kb_stub(), web_retrieve=lambda question: web, kg_retrieve=lambda question: kg)
+    [(_, kbinfos)] = list(r._retrieve_concurrently(["q"]))
+    # the knowledge graph first, then the knowledge base, then the web, the same content once
+    assert [c["chunk_id"] for c in kbinfos["chunks"]] == ["kg", "shared", "q", "w2"]
+    assert [d["doc_id"] for d in kbinfos["doc_aggs"]] == ["doc", "w2"]
+    assert kbinfos["total"] == 2
+
+
+def test_dedup_across_queries():
+    r = researcher(kb_retrieve=kb_stub())
+    chunk_info = {"chunks": [], "doc_aggs": [], "total": 0}
+    for _, kbinfos in r._retrieve_concurrently(["q1", "q2"]):
+        r._update_chunk_info(chunk_info, kbinfos)
+    assert sorted(c["chunk_id"] for c in chunk_info["chunks"]) == ["q1", "q2", "shared"]
+    assert [d["doc_id"] for d in chunk_info["doc_aggs"]] == ["doc"]
+
+
+def test_no_thread_left_waiting_on_a_hung_source():
+    release = threading.Event()
+    r = researcher(kb_retrieve=kb_stub(), web_retrieve=lambda question: release.wait() and {"chunks": [], "doc_aggs": []},
+                   source_timeouts={"web": 0.1})
+    try:
+        assert len(list(r._retrieve_concurrently(["q"]))) == 1
+    finally:
+        release.set()
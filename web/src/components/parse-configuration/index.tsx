@@ -1,7 +1,16 @@
 import { DocumentParserType } from '@/constants/knowledge';
 import { useTranslate } from '@/hooks/common-hooks';
 import { PlusOutlined } from '@ant-design/icons';
-import { Button, Flex, Form, Input, InputNumber, Slider, Switch } from 'antd';
+import {
+  Button,
+  Flex,
+  Form,
+  Input,
+  InputNumber,
+  Select,
+  Slider,
+  Switch,
+} from 'antd';
 import random from 'lodash/random';
 
 export const excludedParseMethods = [
@@ -181,6 +190,22 @@ const ParseConfiguration = () => {
                     </Form.Item>
                   </Flex>
                 </Form.Item>
+                <Form.Item
+                  name={['parser_config', 'raptor', 'cluster_search']}
+                  label={t('clusterSearch')}
+                  tooltip={t('clusterSearchTip')}
+                  initialValue={'exhaustive'}
+                >
+                  <Select
+                    options={[
+                      { value: 'exhaustive', label: t('clusterSearchExhaustive') },
+                      {
+                        value: 'coarse_to_fine',
+                        label: t('clusterSearchCoarseToFine'),
+                      },
+                    ]}
+                  />
+                </Form.Item>
                 <Form.Item label={t('randomSeed')}>
                   <Flex gap={20} align="center">
                     <Flex flex={1}>
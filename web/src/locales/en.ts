@@ -343,6 +343,11 @@ The above is the content you need to summarize.`,
       thresholdMessage: 'Threshold is required',
       maxCluster: 'Max cluster',
       maxClusterTip: 'Maximum cluster number.',
+      clusterSearch: 'Cluster search',
+      clusterSearchTip:
+        'How the cluster number of each layer is chosen. Exhaustive tries every number up to Max cluster; Coarse to fine tries a few and refines around the best, much faster on large documents.',
+      clusterSearchExhaustive: 'Exhaustive',
+      clusterSearchCoarseToFine: 'Coarse to fine',
       maxClusterMessage: 'Max cluster is required',
       randomSeed: 'Random seed',
       randomSeedMessage: 'Random seed is required',
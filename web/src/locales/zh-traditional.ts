@@ -331,6 +331,11 @@ export default {
       maxTokenTip: '用於匯總的最大token數。',
       thresholdTip: '閾值越大，聚類越少。',
       maxClusterTip: '最大聚類數。',
+      clusterSearch: '聚類數搜尋',
+      clusterSearchTip:
+        '每層聚類數的選擇方式。窮舉會嘗試最大聚類數以內的每個值；由粗到細先間隔嘗試再在最優值附近細化，大文件上快得多。',
+      clusterSearchExhaustive: '窮舉',
+      clusterSearchCoarseToFine: '由粗到細',
       entityTypes: '實體類型',
       pageRank: '頁面排名',
       pageRankTip: `這用來提高相關性分數。所有檢索到的區塊的相關性得分將加上該數字。